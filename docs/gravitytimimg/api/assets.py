@@ -0,0 +1,90 @@
+"""
+assets.py — Content-hashed static assets.
+
+At startup every file under web/static is copied to data/assets/ under a
+name that includes a hash of its content (css/style.css →
+css/style.3f9a2c1d7e.css), with precompressed copies next to it. Copies of
+older versions are deleted; data/assets/ is generated, not committed. Templates
+link to them with {{ asset_url('css/style.css') }}, and server.py serves
+/assets with a year-long immutable Cache-Control: a browser fetches a file
+again only when its content, and so its URL, changed.
+
+/static keeps serving the unhashed files (revalidated on every use) for
+anything that isn't rendered through a template.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+from pathlib import Path
+
+from api.static_files import write_variants
+
+logger = logging.getLogger("gravitytiming.assets")
+
+URL_PREFIX = "/assets"
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+HASH_LENGTH = 10
+
+# Worth precompressing; anything else is copied as-is
+COMPRESSIBLE = {".css", ".js", ".html", ".json", ".svg", ".txt"}
+
+
+class AssetManifest:
+    """Maps static paths ("js/admin.js") to their content-hashed copies."""
+
+    def __init__(self, static_dir: Path, out_dir: Path):
+        self.static_dir = static_dir
+        self.out_dir = out_dir
+        self.files: dict[str, str] = {}
+
+    def build(self) -> AssetManifest:
+        """Hash every static file, writing copies that don't exist yet.
+
+        Anything else in out_dir (older versions) is removed.
+        """
+        files = {}
+        for path in sorted(self.static_dir.rglob("*")):
+            if not path.is_file() or path.suffix in (".gz", ".br"):
+                continue
+            data = path.read_bytes()
+            digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+            rel = path.relative_to(self.static_dir)
+            hashed = rel.with_name(f"{rel.stem}.{digest}{rel.suffix}").as_posix()
+            target = self.out_dir / hashed
+            if not target.exists():
+                target.parent.mkdir(parents=True, exist_ok=True)
+                if path.suffix in COMPRESSIBLE:
+                    write_variants(target, data)
+                else:
+                    target.write_bytes(data)
+            files[rel.as_posix()] = hashed
+        self.files = files
+        self._prune(set(files.values()))
+        logger.info("Asset manifest: %d files", len(files))
+        return self
+
+    def _prune(self, keep: set[str]) -> None:
+        """Delete hashed copies (and their .gz/.br) of older file versions."""
+        if not self.out_dir.is_dir():
+            return
+        removed = 0
+        for path in sorted(self.out_dir.rglob("*")):
+            if not path.is_file():
+                continue
+            rel = path.relative_to(self.out_dir)
+            if rel.suffix in (".gz", ".br"):
+                rel = rel.with_suffix("")
+            if rel.as_posix() not in keep:
+                path.unlink()
+                removed += 1
+        if removed:
+            logger.info("Asset manifest: removed %d stale files", removed)
+
+    def url(self, path: str) -> str:
+        """URL of a static file: the hashed copy, or /static/ if unknown."""
+        hashed = self.files.get(path)
+        if hashed is None:
+            return f"/static/{path}"
+        return f"{URL_PREFIX}/{hashed}"
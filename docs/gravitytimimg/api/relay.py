@@ -0,0 +1,131 @@
+"""
+relay.py — Feed a broadcast relay from the timing server.
+
+A relay process (relay.py in the project root) serves spectator /ws
+connections and cached standings, so that load never reaches the process
+that ingests punches. RelayClient subscribes to the timing server's own
+/ws over loopback as one unfiltered, plain-json client and hands every
+message to the relay's ConnectionManager (see relay_message()).
+
+On connect it sends resume=<last seq>: after a short upstream drop the
+timing server replays what the relay missed, and on first start (or when
+too far behind) it sends a snapshot of the active event's standings.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from typing import Optional
+
+logger = logging.getLogger("gravitytiming.relay")
+
+RECONNECT_DELAY = 2.0
+MAX_RECONNECT_DELAY = 30.0
+STATUS_TTL = 10.0  # seconds a fetched upstream /api/status is reused
+
+
+class RelayClient:
+    """Keeps one upstream /ws subscription alive for a relay process."""
+
+    def __init__(self, upstream: str, manager):
+        self.upstream = upstream.rstrip("/")
+        self.manager = manager
+        self.status: Optional[dict] = None   # last GET /api/status upstream
+        self._status_at = 0.0
+        self._upstream = None
+        self.connected = False
+        self.synced = False
+        self.messages = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ws_url(self) -> str:
+        return self.upstream.replace("http", "ws", 1) + "/ws"
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _run(self):
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                await self._follow()
+                delay = RECONNECT_DELAY
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Relay upstream error: %s — retrying in %.0fs", e, delay)
+            self.connected = False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    async def _fetch_status(self) -> dict:
+        import httpx
+
+        async with httpx.AsyncClient(timeout=5.0) as http:
+            self.status = (await http.get(f"{self.upstream}/api/status")).json()
+        self._status_at = time.monotonic()
+        return self.status
+
+    async def current_status(self) -> Optional[dict]:
+        """Upstream status, refreshed every STATUS_TTL seconds.
+
+        If the active event changed, the upstream subscription is dropped
+        so the relay resubscribes (and resyncs) for the new event.
+        """
+        if time.monotonic() - self._status_at > STATUS_TTL:
+            following = (self.status or {}).get("active_event") or {}
+            try:
+                status = await self._fetch_status()
+            except Exception as e:
+                logger.warning("Relay status refresh failed: %s", e)
+                return self.status
+            active = status.get("active_event") or {}
+            if active.get("id") != following.get("id") and self._upstream:
+                self.synced = False
+                await self._upstream.close()
+        return self.status
+
+    async def _follow(self):
+        import websockets
+
+        await self._fetch_status()
+
+        subscribe = {"type": "subscribe", "channels": ["relay"],
+                     "resume": self.manager.seq if self.synced else 0}
+        active = self.status.get("active_event")
+        if active:
+            subscribe["event_id"] = active["id"]
+
+        async with websockets.connect(self.ws_url) as upstream:
+            self._upstream = upstream
+            self.connected = True
+            await upstream.send(json.dumps(subscribe))
+            logger.info("Relay following %s", self.ws_url)
+            async for raw in upstream:
+                message = json.loads(raw)
+                if message.get("type") == "snapshot":
+                    self.synced = True
+                await self.manager.relay_message(message)
+                self.messages += 1
+
+    def get_status(self) -> dict:
+        return {
+            "upstream": self.upstream,
+            "connected": self.connected,
+            "synced": self.synced,
+            "seq": self.manager.seq,
+            "messages": self.messages,
+        }
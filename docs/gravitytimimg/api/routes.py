@@ -12,13 +12,15 @@ from __future__ import annotations
 import tempfile
 import os
 import logging
+import sqlite3
 from typing import Optional
 
 from fastapi import APIRouter, HTTPException, UploadFile, File, Query, Request
+from fastapi.responses import Response
 from pydantic import BaseModel
 
 from core.database import (
-    get_connection,
+    get_pool,
     create_event, get_all_events, get_event, update_event,
     create_control, get_controls, update_control, delete_control,
     create_stage, get_stages, update_stage, delete_stage,
@@ -32,14 +34,22 @@ from core.database import (
     export_event_structure, import_event_structure, clear_event_structure,
     save_event_template, get_event_templates, delete_event_template,
     log_audit, get_audit_log, create_backup, list_backups, restore_backup,
-    get_setting, set_setting,
+    get_setting, set_setting, get_roc_cursor, save_roc_cursor, transaction,
+    commit_and_invalidate,
 )
 from core.timing_engine import (
-    ingest_punch, calculate_overall_results, recalculate_all,
+    ingest_punches_batch, recalculate_all, calculate_overall_results,
     import_startlist_csv, import_chipmapping_csv, import_roc_punches,
     format_elapsed, format_time_behind,
 )
+from core.event_cache import get_structure
+from core.recompute import StaleRecompute, apply_recompute, shadow_recompute
+from core.leaderboard import get_leaderboards, move_entries
+from core import results_cache
+from core.db_executor import run_read, run_write
+from core.ingest_queue import ingest_queue
 from api.websocket import manager as ws_manager, generate_highlights
+from api.snapshots import publisher as snapshot_publisher
 
 logger = logging.getLogger("gravitytiming.api")
 
@@ -65,8 +75,11 @@ def _rows_to_list(rows) -> list[dict]:
     return [dict(r) for r in rows]
 
 
-def _get_conn():
-    return get_connection()
+def _active_event(conn: sqlite3.Connection) -> Optional[sqlite3.Row]:
+    """The newest event with status 'active', or None."""
+    return conn.execute(
+        "SELECT * FROM events WHERE status='active' ORDER BY id DESC LIMIT 1"
+    ).fetchone()
 
 
 # ─── Pydantic models ─────────────────────────────────────────────────
@@ -180,112 +193,91 @@ class TheHubImport(BaseModel):
 
 @router.get("/events")
 async def list_events(include_finished: bool = True):
-    conn = _get_conn()
-    try:
-        return _rows_to_list(get_all_events(conn, include_finished))
-    finally:
-        conn.close()
+    return _rows_to_list(await run_read(get_all_events, include_finished))
 
 
 @router.post("/events")
 async def create_event_endpoint(body: EventCreate):
-    conn = _get_conn()
-    try:
-        event_id = create_event(
-            conn, body.name, body.date, body.location,
-            body.format, body.time_precision, body.roc_competition_id,
-            body.dual_slalom_window,
-        )
-        return {"id": event_id}
-    finally:
-        conn.close()
+    event_id = await run_write(
+        create_event, body.name, body.date, body.location,
+        body.format, body.time_precision, body.roc_competition_id,
+        body.dual_slalom_window,
+    )
+    return {"id": event_id}
 
 
 @router.get("/events/{event_id}")
 async def get_event_endpoint(event_id: int):
-    conn = _get_conn()
-    try:
-        event = get_event(conn, event_id)
-        if not event:
-            raise HTTPException(404, "Event not found")
-        return _row_to_dict(event)
-    finally:
-        conn.close()
+    event = await run_read(get_event, event_id)
+    if not event:
+        raise HTTPException(404, "Event not found")
+    return _row_to_dict(event)
 
 
 @router.delete("/events/{event_id}")
 async def delete_event_endpoint(event_id: int):
-    conn = _get_conn()
-    try:
-        event = get_event(conn, event_id)
-        if not event:
-            raise HTTPException(404, "Event not found")
-        delete_event(conn, event_id)
-        return {"ok": True}
-    finally:
-        conn.close()
+    event = await run_read(get_event, event_id)
+    if not event:
+        raise HTTPException(404, "Event not found")
+    await run_write(delete_event, event_id)
+    return {"ok": True}
 
 
 @router.put("/events/{event_id}")
 async def update_event_endpoint(event_id: int, body: EventUpdate):
-    conn = _get_conn()
-    try:
-        fields = {k: v for k, v in body.model_dump().items() if v is not None}
-        if fields:
-            update_event(conn, event_id, **fields)
-        return {"ok": True}
-    finally:
-        conn.close()
+    fields = {k: v for k, v in body.model_dump().items() if v is not None}
+    if fields:
+        await run_write(update_event, event_id, **fields)
+    return {"ok": True}
 
 
 @router.post("/events/{event_id}/activate")
 async def activate_event(event_id: int):
-    conn = _get_conn()
-    try:
-        event = get_event(conn, event_id)
-        if not event:
-            raise HTTPException(404, "Event not found")
-        if event["status"] != "setup":
-            raise HTTPException(400, "Event is not in setup status")
-
-        # Validate: at least 1 control, 1 stage, 1 class
-        controls = get_controls(conn, event_id)
-        stages = get_stages(conn, event_id)
-        classes = get_classes(conn, event_id)
-        if not controls:
-            raise HTTPException(400, "Minst 1 kontroll krävs")
-        if not stages:
-            raise HTTPException(400, "Minst 1 stage krävs")
-        if not classes:
-            raise HTTPException(400, "Minst 1 klass krävs")
-
+    def load(conn):
+        return (get_event(conn, event_id), get_controls(conn, event_id),
+                get_stages(conn, event_id), get_classes(conn, event_id))
+
+    event, controls, stages, classes = await run_read(load)
+    if not event:
+        raise HTTPException(404, "Event not found")
+    if event["status"] != "setup":
+        raise HTTPException(400, "Event is not in setup status")
+
+    # Validate: at least 1 control, 1 stage, 1 class
+    if not controls:
+        raise HTTPException(400, "Minst 1 kontroll krävs")
+    if not stages:
+        raise HTTPException(400, "Minst 1 stage krävs")
+    if not classes:
+        raise HTTPException(400, "Minst 1 klass krävs")
+
+    def activate(conn):
         update_event(conn, event_id, status="active")
         log_audit(conn, event_id, "activate_event", "event", event_id)
 
-        # Start ROC polling if competition ID is set
-        if event["roc_competition_id"]:
-            from core.roc_poller import RocPoller
-            from fastapi import Request
-            # ROC poller will be started by the caller if needed
-            pass
+    await run_write(activate)
+
+    # Start ROC polling if competition ID is set
+    if event["roc_competition_id"]:
+        from core.roc_poller import RocPoller
+        from fastapi import Request
+        # ROC poller will be started by the caller if needed
+        pass
 
-        return {"ok": True, "status": "active"}
-    finally:
-        conn.close()
+    return {"ok": True, "status": "active"}
 
 
 @router.post("/events/{event_id}/finish")
 async def finish_event(event_id: int):
-    conn = _get_conn()
-    try:
-        event = get_event(conn, event_id)
-        if not event:
-            raise HTTPException(404, "Event not found")
+    event = await run_read(get_event, event_id)
+    if not event:
+        raise HTTPException(404, "Event not found")
+    def finish(conn):
         update_event(conn, event_id, status="finished")
         log_audit(conn, event_id, "finish_event", "event", event_id)
-        return {"ok": True, "status": "finished"}
-    finally:
-        conn.close()
+
+    await run_write(finish)
+    return {"ok": True, "status": "finished"}
 
 
 # ═══════════════════════════════════════════════════════════════════════
@@ -294,47 +286,32 @@ async def finish_event(event_id: int):
 
 @router.get("/events/{event_id}/controls")
 async def list_controls(event_id: int):
-    conn = _get_conn()
-    try:
-        return _rows_to_list(get_controls(conn, event_id))
-    finally:
-        conn.close()
+    return _rows_to_list(await run_read(get_controls, event_id))
 
 
 @router.post("/events/{event_id}/controls")
 async def create_control_endpoint(event_id: int, body: ControlCreate):
-    conn = _get_conn()
     try:
-        cid = create_control(conn, event_id, body.code, body.name, body.type)
+        cid = await run_write(create_control, event_id, body.code, body.name, body.type)
         return {"id": cid}
     except Exception as e:
         raise HTTPException(400, str(e))
-    finally:
-        conn.close()
 
 
 @router.put("/events/{event_id}/controls/{control_id}")
 async def update_control_endpoint(event_id: int, control_id: int, body: ControlUpdate):
-    conn = _get_conn()
-    try:
-        fields = {k: v for k, v in body.model_dump().items() if v is not None}
-        if fields:
-            update_control(conn, control_id, **fields)
-        return {"ok": True}
-    finally:
-        conn.close()
+    fields = {k: v for k, v in body.model_dump().items() if v is not None}
+    if fields:
+        await run_write(update_control, control_id, **fields)
+    return {"ok": True}
 
 
 @router.delete("/events/{event_id}/controls/{control_id}")
 async def delete_control_endpoint(event_id: int, control_id: int):
-    conn = _get_conn()
-    try:
-        ok, msg = delete_control(conn, control_id)
-        if not ok:
-            raise HTTPException(400, msg)
-        return {"ok": True}
-    finally:
-        conn.close()
+    ok, msg = await run_write(delete_control, control_id)
+    if not ok:
+        raise HTTPException(400, msg)
+    return {"ok": True}
 
 
 # ═══════════════════════════════════════════════════════════════════════
@@ -343,61 +320,49 @@ async def delete_control_endpoint(event_id: int, control_id: int):
 
 @router.get("/events/{event_id}/stages")
 async def list_stages(event_id: int):
-    conn = _get_conn()
-    try:
-        stages = _rows_to_list(get_stages(conn, event_id))
-        # Enrich with control codes (not just IDs)
-        controls = get_controls(conn, event_id)
-        ctrl_id_to_code = {c["id"]: c["code"] for c in controls}
-        ctrl_id_to_name = {c["id"]: c["name"] for c in controls}
-        for s in stages:
-            s["start_control_code"] = ctrl_id_to_code.get(s["start_control_id"])
-            s["start_control_name"] = ctrl_id_to_name.get(s["start_control_id"], "?")
-            s["finish_control_code"] = ctrl_id_to_code.get(s["finish_control_id"])
-            s["finish_control_name"] = ctrl_id_to_name.get(s["finish_control_id"], "?")
-        return stages
-    finally:
-        conn.close()
+    def load(conn):
+        return get_stages(conn, event_id), get_controls(conn, event_id)
+
+    rows, controls = await run_read(load)
+    stages = _rows_to_list(rows)
+    # Enrich with control codes (not just IDs)
+    ctrl_id_to_code = {c["id"]: c["code"] for c in controls}
+    ctrl_id_to_name = {c["id"]: c["name"] for c in controls}
+    for s in stages:
+        s["start_control_code"] = ctrl_id_to_code.get(s["start_control_id"])
+        s["start_control_name"] = ctrl_id_to_name.get(s["start_control_id"], "?")
+        s["finish_control_code"] = ctrl_id_to_code.get(s["finish_control_id"])
+        s["finish_control_name"] = ctrl_id_to_name.get(s["finish_control_id"], "?")
+    return stages
 
 
 @router.post("/events/{event_id}/stages")
 async def create_stage_endpoint(event_id: int, body: StageCreate):
-    conn = _get_conn()
     try:
-        sid = create_stage(
-            conn, event_id, body.stage_number, body.name,
+        sid = await run_write(
+            create_stage, event_id, body.stage_number, body.name,
             body.start_control_id, body.finish_control_id,
             body.is_timed, body.runs_to_count, body.max_runs,
         )
         return {"id": sid}
     except Exception as e:
         raise HTTPException(400, str(e))
-    finally:
-        conn.close()
 
 
 @router.put("/events/{event_id}/stages/{stage_id}")
 async def update_stage_endpoint(event_id: int, stage_id: int, body: StageUpdate):
-    conn = _get_conn()
-    try:
-        fields = {k: v for k, v in body.model_dump().items() if v is not None}
-        if fields:
-            update_stage(conn, stage_id, **fields)
-        return {"ok": True}
-    finally:
-        conn.close()
+    fields = {k: v for k, v in body.model_dump().items() if v is not None}
+    if fields:
+        await run_write(update_stage, stage_id, **fields)
+    return {"ok": True}
 
 
 @router.delete("/events/{event_id}/stages/{stage_id}")
 async def delete_stage_endpoint(event_id: int, stage_id: int):
-    conn = _get_conn()
-    try:
-        ok, msg = delete_stage(conn, stage_id)
-        if not ok:
-            raise HTTPException(400, msg)
-        return {"ok": True}
-    finally:
-        conn.close()
+    ok, msg = await run_write(delete_stage, stage_id)
+    if not ok:
+        raise HTTPException(400, msg)
+    return {"ok": True}
 
 
 # ═══════════════════════════════════════════════════════════════════════
@@ -406,80 +371,60 @@ async def delete_stage_endpoint(event_id: int, stage_id: int):
 
 @router.get("/events/{event_id}/courses")
 async def list_courses(event_id: int):
-    conn = _get_conn()
-    try:
-        courses = get_courses(conn, event_id)
+    def load(conn):
         result = []
-        for c in courses:
+        for c in get_courses(conn, event_id):
             d = dict(c)
             d["stages"] = _rows_to_list(get_course_stages(conn, c["id"]))
             result.append(d)
         return result
-    finally:
-        conn.close()
+
+    return await run_read(load)
 
 
 @router.post("/events/{event_id}/courses")
 async def create_course_endpoint(event_id: int, body: CourseCreate):
-    conn = _get_conn()
     try:
-        cid = create_course(
-            conn, event_id, body.name, body.laps,
+        cid = await run_write(
+            create_course, event_id, body.name, body.laps,
             body.stages_any_order, body.allow_repeat,
         )
         return {"id": cid}
     except Exception as e:
         raise HTTPException(400, str(e))
-    finally:
-        conn.close()
 
 
 @router.put("/events/{event_id}/courses/{course_id}")
 async def update_course_endpoint(event_id: int, course_id: int, body: CourseUpdate):
-    conn = _get_conn()
-    try:
-        fields = {k: v for k, v in body.model_dump().items() if v is not None}
-        if fields:
-            update_course(conn, course_id, **fields)
-        return {"ok": True}
-    finally:
-        conn.close()
+    fields = {k: v for k, v in body.model_dump().items() if v is not None}
+    if fields:
+        await run_write(update_course, course_id, **fields)
+    return {"ok": True}
 
 
 @router.delete("/events/{event_id}/courses/{course_id}")
 async def delete_course_endpoint(event_id: int, course_id: int):
-    conn = _get_conn()
-    try:
-        ok, msg = delete_course(conn, course_id)
-        if not ok:
-            raise HTTPException(400, msg)
-        return {"ok": True}
-    finally:
-        conn.close()
+    ok, msg = await run_write(delete_course, course_id)
+    if not ok:
+        raise HTTPException(400, msg)
+    return {"ok": True}
 
 
 @router.post("/events/{event_id}/courses/{course_id}/stages")
 async def link_course_stage_endpoint(event_id: int, course_id: int,
                                      body: CourseStageLinkBody):
-    conn = _get_conn()
     try:
-        link_course_stage(conn, course_id, body.stage_id, body.stage_order)
+        await run_write(link_course_stage, course_id, body.stage_id, body.stage_order)
         return {"ok": True}
     except Exception as e:
         raise HTTPException(400, str(e))
-    finally:
-        conn.close()
 
 
 @router.delete("/events/{event_id}/courses/{course_id}/stages/{stage_id}")
 async def unlink_course_stage_endpoint(event_id: int, course_id: int,
                                        stage_id: int):
-    conn = _get_conn()
-    try:
-        unlink_course_stage(conn, course_id, stage_id)
-        return {"ok": True}
-    finally:
-        conn.close()
+    await run_write(unlink_course_stage, course_id, stage_id)
+    return {"ok": True}
 
 
 # ═══════════════════════════════════════════════════════════════════════
@@ -488,49 +433,34 @@ async def unlink_course_stage_endpoint(event_id: int, course_id: int,
 
 @router.get("/events/{event_id}/classes")
 async def list_classes(event_id: int):
-    conn = _get_conn()
-    try:
-        return _rows_to_list(get_classes(conn, event_id))
-    finally:
-        conn.close()
+    return _rows_to_list(await run_read(get_classes, event_id))
 
 
 @router.post("/events/{event_id}/classes")
 async def create_class_endpoint(event_id: int, body: ClassCreate):
-    conn = _get_conn()
     try:
-        cid = create_class(
-            conn, event_id, body.course_id, body.name, body.mass_start_time,
+        cid = await run_write(
+            create_class, event_id, body.course_id, body.name, body.mass_start_time,
         )
         return {"id": cid}
     except Exception as e:
         raise HTTPException(400, str(e))
-    finally:
-        conn.close()
 
 
 @router.put("/events/{event_id}/classes/{class_id}")
 async def update_class_endpoint(event_id: int, class_id: int, body: ClassUpdate):
-    conn = _get_conn()
-    try:
-        fields = {k: v for k, v in body.model_dump().items() if v is not None}
-        if fields:
-            update_class(conn, class_id, **fields)
-        return {"ok": True}
-    finally:
-        conn.close()
+    fields = {k: v for k, v in body.model_dump().items() if v is not None}
+    if fields:
+        await run_write(update_class, class_id, **fields)
+    return {"ok": True}
 
 
 @router.delete("/events/{event_id}/classes/{class_id}")
 async def delete_class_endpoint(event_id: int, class_id: int):
-    conn = _get_conn()
-    try:
-        ok, msg = delete_class(conn, class_id)
-        if not ok:
-            raise HTTPException(400, msg)
-        return {"ok": True}
-    finally:
-        conn.close()
+    ok, msg = await run_write(delete_class, class_id)
+    if not ok:
+        raise HTTPException(400, msg)
+    return {"ok": True}
 
 
 # ═══════════════════════════════════════════════════════════════════════
@@ -539,43 +469,34 @@ async def delete_class_endpoint(event_id: int, class_id: int):
 
 @router.get("/events/{event_id}/entries")
 async def list_entries(event_id: int):
-    conn = _get_conn()
-    try:
-        return _rows_to_list(get_entries(conn, event_id))
-    finally:
-        conn.close()
+    return _rows_to_list(await run_read(get_entries, event_id))
 
 
 @router.post("/events/{event_id}/entries")
 async def create_entry_endpoint(event_id: int, body: EntryCreate):
-    conn = _get_conn()
     try:
-        eid = create_entry(
-            conn, event_id, body.bib, body.first_name,
+        eid = await run_write(
+            create_entry, event_id, body.bib, body.first_name,
             body.last_name, body.club, body.class_id,
         )
         return {"id": eid}
     except Exception as e:
         raise HTTPException(400, str(e))
-    finally:
-        conn.close()
 
 
 @router.delete("/events/{event_id}/entries/{entry_id}")
 async def delete_entry_endpoint(event_id: int, entry_id: int):
-    conn = _get_conn()
-    try:
+    def delete(conn):
         conn.execute("DELETE FROM entries WHERE id=? AND event_id=?", (entry_id, event_id))
-        conn.commit()
-        return {"ok": True}
-    finally:
-        conn.close()
+        commit_and_invalidate(conn, event_id)
+
+    await run_write(delete)
+    return {"ok": True}
 
 
 @router.post("/events/{event_id}/entries/import")
 async def import_entries_csv(event_id: int, file: UploadFile = File(...)):
     """Import startlist from CSV (BIB;FirstName;LastName;Club;Class)."""
-    conn = _get_conn()
     try:
         # Save uploaded file to temp
         with tempfile.NamedTemporaryFile(mode="wb", suffix=".csv", delete=False) as tmp:
@@ -583,13 +504,11 @@ async def import_entries_csv(event_id: int, file: UploadFile = File(...)):
             tmp.write(content)
             tmp_path = tmp.name
 
-        count, warnings = import_startlist_csv(conn, event_id, tmp_path)
+        count, warnings = await run_write(import_startlist_csv, event_id, tmp_path)
         os.unlink(tmp_path)
         return {"count": count, "warnings": warnings}
     except Exception as e:
         raise HTTPException(400, str(e))
-    finally:
-        conn.close()
 
 
 # ═══════════════════════════════════════════════════════════════════════
@@ -598,53 +517,43 @@ async def import_entries_csv(event_id: int, file: UploadFile = File(...)):
 
 @router.get("/events/{event_id}/chips")
 async def list_chips(event_id: int):
-    conn = _get_conn()
-    try:
-        return _rows_to_list(get_chip_mappings(conn, event_id))
-    finally:
-        conn.close()
+    return _rows_to_list(await run_read(get_chip_mappings, event_id))
 
 
 @router.post("/events/{event_id}/chips")
 async def create_chip_endpoint(event_id: int, body: ChipCreate):
-    conn = _get_conn()
     try:
-        cid = create_chip_mapping(conn, event_id, body.bib, body.siac, body.is_primary)
+        cid = await run_write(create_chip_mapping, event_id, body.bib, body.siac, body.is_primary)
         return {"id": cid}
     except Exception as e:
         raise HTTPException(400, str(e))
-    finally:
-        conn.close()
 
 
 @router.delete("/events/{event_id}/chips/{chip_id}")
 async def delete_chip_endpoint(event_id: int, chip_id: int):
-    conn = _get_conn()
-    try:
-        conn.execute("DELETE FROM chip_mapping WHERE id=? AND event_id=?", (chip_id, event_id))
-        conn.commit()
-        return {"ok": True}
-    finally:
-        conn.close()
+    def delete(conn):
+        conn.execute("DELETE FROM chip_mapping WHERE id=? AND event_id=?",
+                     (chip_id, event_id))
+        commit_and_invalidate(conn, event_id)
+
+    await run_write(delete)
+    return {"ok": True}
 
 
 @router.post("/events/{event_id}/chips/import")
 async def import_chips_csv(event_id: int, file: UploadFile = File(...)):
     """Import chip mapping from CSV (BIB;SIAC1;SIAC2)."""
-    conn = _get_conn()
     try:
         with tempfile.NamedTemporaryFile(mode="wb", suffix=".csv", delete=False) as tmp:
             content = await file.read()
             tmp.write(content)
             tmp_path = tmp.name
 
-        count, warnings = import_chipmapping_csv(conn, event_id, tmp_path)
+        count, warnings = await run_write(import_chipmapping_csv, event_id, tmp_path)
         os.unlink(tmp_path)
         return {"count": count, "warnings": warnings}
     except Exception as e:
         raise HTTPException(400, str(e))
-    finally:
-        conn.close()
 
 
 # ═══════════════════════════════════════════════════════════════════════
@@ -657,8 +566,7 @@ async def list_punches(event_id: int,
                        siac: Optional[int] = None,
                        control: Optional[int] = None,
                        dup: Optional[bool] = None):
-    conn = _get_conn()
-    try:
+    def query_punches(conn):
         query = "SELECT * FROM punches WHERE event_id=?"
         params: list = [event_id]
 
@@ -676,47 +584,78 @@ async def list_punches(event_id: int,
             params.append(int(dup))
 
         query += " ORDER BY punch_time DESC, id DESC"
-        rows = conn.execute(query, params).fetchall()
-        return _rows_to_list(rows)
-    finally:
-        conn.close()
+        return _rows_to_list(conn.execute(query, params).fetchall())
+
+    return await run_read(query_punches)
 
 
 @router.post("/events/{event_id}/punches")
 async def create_punch_endpoint(event_id: int, body: PunchCreate):
     """Manual punch entry. Processes punch through timing engine."""
-    conn = _get_conn()
-    try:
-        if get_setting(conn, "ingest_paused", "false") == "true":
-            raise HTTPException(503, "Ingest is paused")
-        punch_id = ingest_punch(
-            conn, event_id, body.siac, body.control_code,
-            body.punch_time, body.source,
+    if await run_read(get_setting, "ingest_paused", "false") == "true":
+        raise HTTPException(503, "Ingest is paused")
+    punch = {"siac": body.siac, "control_code": body.control_code,
+             "punch_time": body.punch_time}
+    punch_ids, batch, highlights = await ingest_queue.submit(
+        "manual", _apply_punches, event_id, [punch], body.source
+    )
+    await _broadcast_applied(event_id, batch, highlights)
+    return {"id": punch_ids[0] if punch_ids else None}
+
+
+def _apply_punches(conn, event_id: int, punches: list[dict],
+                   source: str) -> tuple[list[int], list[dict], list[dict]]:
+    """Writer-thread half of punch ingestion.
+
+    Ingests the punches (one transaction, overall updated once), then builds
+    the broadcast payloads and highlights while still on the worker thread.
+    Returns (punch_ids, punch broadcasts, highlights).
+    """
+    punch_ids = ingest_punches_batch(conn, event_id, punches, source=source)
+    batch = []
+    highlight_keys = []
+    for punch_id in punch_ids:
+        punch_data = _build_punch_broadcast(conn, event_id, punch_id)
+        if not punch_data:
+            continue
+        batch.append(punch_data)
+        key = (punch_data.get("entry_id"), punch_data.get("stage_id"))
+        if all(key) and key not in highlight_keys:
+            highlight_keys.append(key)
+
+    highlights = []
+    for entry_id, stage_id in highlight_keys:
+        highlights.extend(generate_highlights(conn, event_id, entry_id, stage_id))
+    return punch_ids, batch, highlights
+
+
+def _apply_roc_page(conn, event_id: int, competition_id: str,
+                    punches: list[dict]) -> tuple[list[int], list[dict], list[dict]]:
+    """_apply_punches for a ROC page; the cursor advances in the same transaction."""
+    with transaction(conn):
+        result = _apply_punches(conn, event_id, punches, "roc")
+        save_roc_cursor(conn, event_id, competition_id,
+                        max(p["roc_punch_id"] for p in punches))
+    return result
+
+
+async def _broadcast_applied(event_id: int, batch: list[dict],
+                             highlights: list[dict]) -> None:
+    """Send the result of _apply_punches to WebSocket clients."""
+    if len(batch) == 1:
+        await ws_manager.broadcast_punch(event_id, batch[0])
+    else:
+        await ws_manager.broadcast_punches(event_id, batch)
+
+    classes = {p["class"] for p in batch if p.get("class")}
+    if classes:
+        ws_manager.mark_standings_dirty(event_id, classes)
+
+    for h in highlights:
+        await ws_manager.broadcast_highlight(
+            event_id, h["category"], h["text"],
+            h["bib"], h.get("stage_number"), h.get("priority", "normal"),
         )
-        if punch_id:
-            calculate_overall_results(conn, event_id)
-
-            # Build broadcast data
-            punch_data = _build_punch_broadcast(conn, event_id, punch_id)
-            if punch_data:
-                await ws_manager.broadcast_punch(event_id, punch_data)
-
-                # Generate and broadcast highlights
-                if punch_data.get("entry_id"):
-                    stage_id = punch_data.get("stage_id")
-                    if stage_id:
-                        highlights = generate_highlights(
-                            conn, event_id, punch_data["entry_id"], stage_id
-                        )
-                        for h in highlights:
-                            await ws_manager.broadcast_highlight(
-                                event_id, h["category"], h["text"],
-                                h["bib"], h.get("stage_number"), h.get("priority", "normal"),
-                            )
-
-        return {"id": punch_id}
-    finally:
-        conn.close()
 
 
 def _build_punch_broadcast(conn, event_id: int, punch_id: int) -> dict:
@@ -725,22 +664,14 @@ def _build_punch_broadcast(conn, event_id: int, punch_id: int) -> dict:
     if not punch:
         return {}
 
-    # Resolve BIB
-    chip = conn.execute(
-        "SELECT bib, is_primary FROM chip_mapping WHERE event_id=? AND siac=?",
-        (event_id, punch["siac"])
-    ).fetchone()
-    if not chip:
+    # Resolve BIB → entry via the cached event structure
+    structure = get_structure(conn, event_id)
+    bib = structure.bib_by_siac.get(punch["siac"])
+    if bib is None:
         return {"siac": punch["siac"], "control_code": punch["control_code"],
                 "punch_time": punch["punch_time"], "source": punch["source"]}
 
-    bib = chip["bib"]
-    entry = conn.execute(
-        """SELECT e.*, c.name as class_name FROM entries e
-           JOIN classes c ON e.class_id = c.id
-           WHERE e.event_id=? AND e.bib=?""",
-        (event_id, bib)
-    ).fetchone()
+    entry = structure.entry_by_bib.get(bib)
     if not entry:
         return {"bib": bib, "siac": punch["siac"],
                 "control_code": punch["control_code"],
@@ -753,6 +684,8 @@ def _build_punch_broadcast(conn, event_id: int, punch_id: int) -> dict:
     result = {
         "bib": bib,
         "name": f"{entry['first_name']} {entry['last_name']}",
+        "first_name": entry["first_name"],
+        "last_name": entry["last_name"],
         "class": entry["class_name"],
         "club": entry["club"] or "",
         "control_code": punch["control_code"],
@@ -761,23 +694,14 @@ def _build_punch_broadcast(conn, event_id: int, punch_id: int) -> dict:
         "entry_id": entry["id"],
     }
 
-    # Find control type
-    ctrl = conn.execute(
-        "SELECT type FROM controls WHERE event_id=? AND code=?",
-        (event_id, punch["control_code"])
-    ).fetchone()
-    result["control_type"] = ctrl["type"] if ctrl else "unknown"
-
-    # Find stage result
-    stage = conn.execute(
-        """SELECT s.* FROM stages s
-           JOIN controls c ON (c.id = s.start_control_id OR c.id = s.finish_control_id)
-           WHERE s.event_id=? AND c.code=? LIMIT 1""",
-        (event_id, punch["control_code"])
-    ).fetchone()
+    # Find control type and stage
+    result["control_type"] = structure.control_type_by_code.get(
+        punch["control_code"], "unknown")
+    stage = structure.stage_by_code.get(punch["control_code"])
 
     if stage:
         result["stage_id"] = stage["id"]
+        result["stage_number"] = stage["stage_number"]
         sr = conn.execute(
             """SELECT * FROM stage_results
                WHERE event_id=? AND entry_id=? AND stage_id=?
@@ -786,22 +710,25 @@ def _build_punch_broadcast(conn, event_id: int, punch_id: int) -> dict:
         ).fetchone()
 
         if sr and sr["status"] == "ok":
-            # Get position for this stage
-            all_ok = conn.execute(
-                """SELECT sr.entry_id, sr.elapsed_seconds FROM stage_results sr
-                   WHERE sr.event_id=? AND sr.stage_id=? AND sr.status='ok'
-                   ORDER BY sr.elapsed_seconds ASC""",
-                (event_id, stage["id"])
-            ).fetchall()
-
-            position = 1
-            leader_time = all_ok[0]["elapsed_seconds"] if all_ok else sr["elapsed_seconds"]
-            for r in all_ok:
-                if r["entry_id"] == entry["id"]:
-                    break
-                position += 1
-
-            behind = sr["elapsed_seconds"] - leader_time
+            # Position from the materialized leaderboards (binary search)
+            boards = get_leaderboards(conn, event_id)
+            standing = boards.stage(stage["id"]).standing(entry["id"])
+            class_standing = boards.for_class(
+                stage["id"], entry["class_id"]).standing(entry["id"])
+
+            # Position, gap and neighbours all refer to the entry's best valid
+            # time; a run that isn't valid has no position
+            position = standing["position"] if standing else None
+            behind = standing["gap"] if standing else None
+
+            def neighbour(entry_id: int, seconds: float) -> dict:
+                other = structure.entry_by_id.get(entry_id, {})
+                return {
+                    "bib": other.get("bib"),
+                    "name": f"{other.get('first_name', '')} {other.get('last_name', '')}".strip(),
+                    "elapsed": format_elapsed(seconds, precision),
+                    "diff": round(seconds - standing["seconds"], 3),
+                }
 
             result["stage_result"] = {
                 "stage_id": stage["id"],
@@ -813,6 +740,12 @@ def _build_punch_broadcast(conn, event_id: int, punch_id: int) -> dict:
                 "behind": format_time_behind(behind, precision),
                 "is_leader": position == 1,
                 "is_new_leader": position == 1,
+                "class_position": class_standing["position"] if class_standing else None,
+                "finished": standing["size"] if standing else 1,
+                "neighbours": {
+                    "ahead": [neighbour(e, t) for e, t in standing["ahead"]] if standing else [],
+                    "behind": [neighbour(e, t) for e, t in standing["behind"]] if standing else [],
+                },
             }
 
     # Overall
@@ -822,7 +755,7 @@ def _build_punch_broadcast(conn, event_id: int, punch_id: int) -> dict:
     ).fetchone()
 
     if overall and overall["total_seconds"] is not None:
-        stages_total = len(get_stages(conn, event_id))
+        stages_total = len(structure.stages)
         stages_done = conn.execute(
             """SELECT COUNT(DISTINCT stage_id) as cnt FROM stage_results
                WHERE event_id=? AND entry_id=? AND status='ok'""",
@@ -845,77 +778,111 @@ def _build_punch_broadcast(conn, event_id: int, punch_id: int) -> dict:
 # RESULTS
 # ═══════════════════════════════════════════════════════════════════════
 
+async def _cached_results(request: Request, event_id: int, key: tuple,
+                          loader) -> Response:
+    """Serve a result list from core/results_cache.py, honouring If-None-Match.
+
+    While the event's results version is unchanged the cached JSON is sent
+    without touching the database; a matching ETag gets 304 with no body.
+    """
+    cached = results_cache.lookup(get_pool().db_key, event_id, key)
+    if cached is None:
+        cached = await run_read(results_cache.load, event_id, key, loader)
+    etag, body = cached
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in (t.strip() for t in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
 @router.get("/events/{event_id}/stages/{stage_id}/results")
-async def get_stage_results_endpoint(event_id: int, stage_id: int,
+async def get_stage_results_endpoint(request: Request, event_id: int, stage_id: int,
                                      class_name: Optional[str] = Query(None, alias="class")):
-    conn = _get_conn()
-    try:
-        results = get_stage_results(conn, event_id, stage_id)
-        rows = _rows_to_list(results)
-        if class_name:
-            rows = [r for r in rows if r.get("class_name") == class_name]
-        return rows
-    finally:
-        conn.close()
+    return await _cached_results(
+        request, event_id, ("stage", stage_id, class_name),
+        lambda conn: _rows_to_list(get_stage_results(conn, event_id, stage_id, class_name)),
+    )
 
 
 @router.get("/events/{event_id}/overall")
-async def get_overall_endpoint(event_id: int,
+async def get_overall_endpoint(request: Request, event_id: int,
                                class_name: Optional[str] = Query(None, alias="class")):
-    conn = _get_conn()
-    try:
-        results = get_overall_results(conn, event_id)
-        rows = _rows_to_list(results)
-        if class_name:
-            rows = [r for r in rows if r.get("class_name") == class_name]
-        return rows
-    finally:
-        conn.close()
+    return await _cached_results(
+        request, event_id, ("overall", class_name),
+        lambda conn: _rows_to_list(get_overall_results(conn, event_id, class_name)),
+    )
 
 
 @router.post("/events/{event_id}/recalculate")
 async def recalculate_endpoint(event_id: int):
-    conn = _get_conn()
-    try:
+    """Full replay on the writer thread — live clients keep updating meanwhile."""
+    def recalc(conn):
         recalculate_all(conn, event_id)
         log_audit(conn, event_id, "recalculate_all", "event", event_id)
-        return {"ok": True}
-    finally:
-        conn.close()
+
+    await run_write(recalc)
+    ws_manager.mark_standings_dirty(event_id)
+    return {"ok": True}
+
+
+@router.post("/events/{event_id}/recalculate/shadow")
+async def shadow_recalculate_endpoint(event_id: int, apply: bool = Query(False)):
+    """Recompute on a reader and report differences to the live results.
+
+    Live results are untouched unless apply=true; then the recomputed
+    results replace them in one transaction (409 if punches or results
+    changed while it ran).
+    """
+    computed, diffs = await run_read(shadow_recompute, event_id)
+    if not apply:
+        return {"ok": True, "diffs": diffs, "applied": False}
+
+    def swap(conn):
+        apply_recompute(conn, computed)
+        log_audit(conn, event_id, "recalculate_all", "event", event_id,
+                  details=f"shadow, {len(diffs)} diffs")
+
+    try:
+        await run_write(swap)
+    except StaleRecompute:
+        raise HTTPException(409, "Resultaten ändrades under omräkningen — försök igen")
+    ws_manager.mark_standings_dirty(event_id)
+    return {"ok": True, "diffs": diffs, "applied": True}
 
 
 @router.get("/events/{event_id}/export/csv")
 async def export_csv_endpoint(event_id: int):
     """Export overall results as CSV download."""
     from fastapi.responses import StreamingResponse
+    from core.timing_engine import export_overall_results_csv
     import io
 
-    conn = _get_conn()
-    try:
+    def export(conn) -> Optional[str]:
         event = get_event(conn, event_id)
         if not event:
-            raise HTTPException(404, "Event not found")
-
-        precision = event["time_precision"]
+            return None
 
         with tempfile.NamedTemporaryFile(mode="w", suffix=".csv", delete=False,
                                          encoding="utf-8") as tmp:
             tmp_path = tmp.name
 
-        from core.timing_engine import export_overall_results_csv
-        export_overall_results_csv(conn, event_id, tmp_path, precision)
+        export_overall_results_csv(conn, event_id, tmp_path, event["time_precision"])
 
         with open(tmp_path, "r", encoding="utf-8") as f:
             content = f.read()
         os.unlink(tmp_path)
+        return content
 
-        return StreamingResponse(
-            io.StringIO(content),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename=results_{event_id}.csv"},
-        )
-    finally:
-        conn.close()
+    content = await run_read(export)
+    if content is None:
+        raise HTTPException(404, "Event not found")
+
+    return StreamingResponse(
+        io.StringIO(content),
+        media_type="text/csv",
+        headers={"Content-Disposition": f"attachment; filename=results_{event_id}.csv"},
+    )
 
 
 # ═══════════════════════════════════════════════════════════════════════
@@ -937,34 +904,22 @@ async def list_templates():
             "format": tpl.get("format", "enduro") if tpl else "enduro",
         })
 
-    conn = _get_conn()
-    try:
-        user_templates = get_event_templates(conn)
-        user = [{"id": t["id"], "name": t["name"], "type": "user"} for t in user_templates]
-        return {"builtin": builtin, "user": user}
-    finally:
-        conn.close()
+    user_templates = await run_read(get_event_templates)
+    user = [{"id": t["id"], "name": t["name"], "type": "user"} for t in user_templates]
+    return {"builtin": builtin, "user": user}
 
 
 @router.post("/templates")
 async def save_template_endpoint(body: TemplateCreate):
     """Save a user template."""
-    conn = _get_conn()
-    try:
-        tid = save_event_template(conn, body.name, body.data_json)
-        return {"id": tid}
-    finally:
-        conn.close()
+    tid = await run_write(save_event_template, body.name, body.data_json)
+    return {"id": tid}
 
 
 @router.delete("/templates/{template_id}")
 async def delete_template_endpoint(template_id: int):
-    conn = _get_conn()
-    try:
-        delete_event_template(conn, template_id)
-        return {"ok": True}
-    finally:
-        conn.close()
+    await run_write(delete_event_template, template_id)
+    return {"ok": True}
 
 
 @router.post("/events/{event_id}/apply-template")
@@ -973,65 +928,64 @@ async def apply_template(event_id: int, name: str = Query(...)):
     import json
     from core.templates import get_template
 
-    conn = _get_conn()
-    try:
-        # Try built-in first
-        tpl = get_template(name)
-        if tpl is None:
-            # Try user template
-            user_tpl = conn.execute(
-                "SELECT data_json FROM event_templates WHERE name=?", (name,)
-            ).fetchone()
-            if user_tpl:
-                tpl = json.loads(user_tpl["data_json"])
-            else:
-                raise HTTPException(404, f"Template '{name}' not found")
-
-        # Clear existing structure before importing new template
+    # Try built-in first
+    tpl = get_template(name)
+    if tpl is None:
+        # Try user template
+        user_tpl = await run_read(lambda conn: conn.execute(
+            "SELECT data_json FROM event_templates WHERE name=?", (name,)
+        ).fetchone())
+        if user_tpl:
+            tpl = json.loads(user_tpl["data_json"])
+        else:
+            raise HTTPException(404, f"Template '{name}' not found")
+
+    # Clear existing structure before importing new template
+    def apply(conn):
         clear_event_structure(conn, event_id)
-        count, warnings = import_event_structure(conn, event_id, tpl)
-        return {"count": count, "warnings": warnings}
-    finally:
-        conn.close()
+        return import_event_structure(conn, event_id, tpl)
+
+    count, warnings = await run_write(apply)
+    return {"count": count, "warnings": warnings}
 
 
 @router.get("/events/{event_id}/structure")
 async def get_event_structure(event_id: int):
     """Export event structure as JSON (portable format)."""
-    conn = _get_conn()
-    try:
-        structure = export_event_structure(conn, event_id)
-        if not structure:
-            raise HTTPException(404, "Event not found")
-        return structure
-    finally:
-        conn.close()
+    structure = await run_read(export_event_structure, event_id)
+    if not structure:
+        raise HTTPException(404, "Event not found")
+    return structure
 
 
 @router.post("/events/{event_id}/structure")
 async def import_event_structure_endpoint(event_id: int, structure: dict):
     """Import event structure from JSON."""
-    conn = _get_conn()
-    try:
-        count, warnings = import_event_structure(conn, event_id, structure)
-        return {"count": count, "warnings": warnings}
-    finally:
-        conn.close()
+    count, warnings = await run_write(import_event_structure, event_id, structure)
+    return {"count": count, "warnings": warnings}
 
 
 # ═══════════════════════════════════════════════════════════════════════
 # RACE-DAY CONTROLS
 # ═══════════════════════════════════════════════════════════════════════
 
+def _race_state(conn) -> dict:
+    return {
+        "ingest_paused": get_setting(conn, "ingest_paused", "false") == "true",
+        "standings_frozen": get_setting(conn, "standings_frozen", "false") == "true",
+    }
+
+
+def _set_race_state(conn, key: str, value: str, action: str, details: str) -> None:
+    """Writer-thread half of the race-day switches: setting plus audit entry."""
+    set_setting(conn, key, value)
+    log_audit(conn, None, action, details=details)
+
+
 @router.post("/race/pause-ingest")
 async def pause_ingest():
     """Pause all punch ingestion (ROC, USB, manual)."""
-    conn = _get_conn()
-    try:
-        set_setting(conn, "ingest_paused", "true")
-        log_audit(conn, None, "pause_ingest", details="Ingest paused")
-    finally:
-        conn.close()
+    await run_write(_set_race_state, "ingest_paused", "true", "pause_ingest", "Ingest paused")
     await ws_manager.broadcast({"type": "race_control", "action": "ingest_paused"})
     return {"ok": True, "ingest_paused": True}
 
@@ -1039,12 +993,7 @@ async def pause_ingest():
 @router.post("/race/resume-ingest")
 async def resume_ingest():
     """Resume punch ingestion."""
-    conn = _get_conn()
-    try:
-        set_setting(conn, "ingest_paused", "false")
-        log_audit(conn, None, "resume_ingest", details="Ingest resumed")
-    finally:
-        conn.close()
+    await run_write(_set_race_state, "ingest_paused", "false", "resume_ingest", "Ingest resumed")
     await ws_manager.broadcast({"type": "race_control", "action": "ingest_resumed"})
     return {"ok": True, "ingest_paused": False}
 
@@ -1052,12 +1001,7 @@ async def resume_ingest():
 @router.post("/race/freeze-standings")
 async def freeze_standings():
     """Freeze public standings (displays stop updating, punches still logged)."""
-    conn = _get_conn()
-    try:
-        set_setting(conn, "standings_frozen", "true")
-        log_audit(conn, None, "freeze_standings", details="Standings frozen")
-    finally:
-        conn.close()
+    await run_write(_set_race_state, "standings_frozen", "true", "freeze_standings", "Standings frozen")
     await ws_manager.broadcast({"type": "race_control", "action": "standings_frozen"})
     return {"ok": True, "standings_frozen": True}
 
@@ -1065,27 +1009,16 @@ async def freeze_standings():
 @router.post("/race/unfreeze-standings")
 async def unfreeze_standings():
     """Unfreeze public standings."""
-    conn = _get_conn()
-    try:
-        set_setting(conn, "standings_frozen", "false")
-        log_audit(conn, None, "unfreeze_standings", details="Standings unfrozen")
-    finally:
-        conn.close()
+    await run_write(_set_race_state, "standings_frozen", "false", "unfreeze_standings", "Standings unfrozen")
     await ws_manager.broadcast({"type": "race_control", "action": "standings_unfrozen"})
+    ws_manager.schedule_standings()  # publish what changed while frozen
     return {"ok": True, "standings_frozen": False}
 
 
 @router.get("/race/state")
 async def get_race_state():
     """Get current race-day control state."""
-    conn = _get_conn()
-    try:
-        return {
-            "ingest_paused": get_setting(conn, "ingest_paused", "false") == "true",
-            "standings_frozen": get_setting(conn, "standings_frozen", "false") == "true",
-        }
-    finally:
-        conn.close()
+    return await run_read(_race_state)
 
 
 # ═══════════════════════════════════════════════════════════════════════
@@ -1095,21 +1028,13 @@ async def get_race_state():
 @router.get("/events/{event_id}/audit")
 async def get_event_audit(event_id: int, limit: int = 100):
     """Get audit log for an event."""
-    conn = _get_conn()
-    try:
-        return _rows_to_list(get_audit_log(conn, event_id, limit))
-    finally:
-        conn.close()
+    return _rows_to_list(await run_read(get_audit_log, event_id, limit))
 
 
 @router.get("/audit")
 async def get_all_audit(limit: int = 100):
     """Get full audit log."""
-    conn = _get_conn()
-    try:
-        return _rows_to_list(get_audit_log(conn, limit=limit))
-    finally:
-        conn.close()
+    return _rows_to_list(await run_read(get_audit_log, limit=limit))
 
 
 # ═══════════════════════════════════════════════════════════════════════
@@ -1120,11 +1045,7 @@ async def get_all_audit(limit: int = 100):
 async def create_backup_endpoint(label: str = ""):
     """Create a database backup."""
     path = create_backup(label)
-    conn = _get_conn()
-    try:
-        log_audit(conn, None, "backup_created", details=f"Backup: {path.name}")
-    finally:
-        conn.close()
+    await run_write(log_audit, None, "backup_created", details=f"Backup: {path.name}")
     return {"ok": True, "filename": path.name, "path": str(path)}
 
 
@@ -1137,13 +1058,12 @@ async def list_backups_endpoint():
 @router.post("/restore/{filename}")
 async def restore_backup_endpoint(filename: str):
     """Restore database from a backup. WARNING: replaces current data."""
-    conn = _get_conn()
-    try:
+    def restore(conn) -> bool:
+        # Queued like any other write, so the copy never lands mid-transaction
         log_audit(conn, None, "restore_started", details=f"Restoring from: {filename}")
-    finally:
-        conn.close()
+        return restore_backup(filename)
 
-    ok = restore_backup(filename)
+    ok = await run_write(restore)
     if not ok:
         raise HTTPException(404, f"Backup '{filename}' not found")
     return {"ok": True, "restored_from": filename}
@@ -1169,65 +1089,43 @@ async def download_backup():
 @router.post("/roc/start")
 async def roc_start(request: Request):
     """Start ROC polling for the active event."""
-    conn = _get_conn()
-    try:
-        active = conn.execute(
-            "SELECT * FROM events WHERE status='active' ORDER BY id DESC LIMIT 1"
-        ).fetchone()
-        if not active:
-            raise HTTPException(400, "Inget aktivt event")
-        if not active["roc_competition_id"]:
-            raise HTTPException(400, "Inget ROC tävlings-ID konfigurerat")
-
-        # Stop existing poller if running
-        if request.app.state.roc_poller and request.app.state.roc_poller.is_running:
-            await request.app.state.roc_poller.stop()
-
-        event_id = active["id"]
-
-        async def handle_roc_punch(punch: dict):
-            c = _get_conn()
-            try:
-                if get_setting(c, "ingest_paused", "false") == "true":
-                    return
-                punch_id = ingest_punch(
-                    c, event_id, punch["siac"], punch["control_code"],
-                    punch["punch_time"], source="roc",
-                    roc_punch_id=punch.get("roc_punch_id"),
-                )
-                if punch_id:
-                    calculate_overall_results(c, event_id)
-                    punch_data = _build_punch_broadcast(c, event_id, punch_id)
-                    if punch_data:
-                        await ws_manager.broadcast_punch(event_id, punch_data)
-                        if punch_data.get("entry_id"):
-                            stage_id = punch_data.get("stage_id")
-                            if stage_id:
-                                highlights = generate_highlights(
-                                    c, event_id, punch_data["entry_id"], stage_id
-                                )
-                                for h in highlights:
-                                    await ws_manager.broadcast_highlight(
-                                        event_id, h["category"], h["text"],
-                                        h["bib"], h.get("stage_number"),
-                                        h.get("priority", "normal"),
-                                    )
-            finally:
-                c.close()
-
-        from core.roc_poller import RocPoller
-        poller = RocPoller(
-            competition_id=active["roc_competition_id"],
-            on_punch=handle_roc_punch,
+    active = await run_read(_active_event)
+    if not active:
+        raise HTTPException(400, "Inget aktivt event")
+    if not active["roc_competition_id"]:
+        raise HTTPException(400, "Inget ROC tävlings-ID konfigurerat")
+
+    # Stop existing poller if running
+    if request.app.state.roc_poller and request.app.state.roc_poller.is_running:
+        await request.app.state.roc_poller.stop()
+
+    event_id = active["id"]
+    competition_id = active["roc_competition_id"]
+
+    async def handle_roc_batch(punches: list[dict]) -> bool:
+        if await run_read(get_setting, "ingest_paused", "false") == "true":
+            return False  # the poller keeps its cursor and fetches the page again
+        # Whole page and the cursor in one transaction, queued behind earlier writes
+        _, batch, highlights = await ingest_queue.submit(
+            "roc", _apply_roc_page, event_id, competition_id, punches
         )
-        request.app.state.roc_poller = poller
-        await poller.start()
+        await _broadcast_applied(event_id, batch, highlights)
+        return True
+
+    from core.roc_poller import RocPoller
+    poller = RocPoller(
+        competition_id=competition_id,
+        on_batch=handle_roc_batch,
+        load_cursor=lambda: run_read(get_roc_cursor, event_id, competition_id),
+    )
+    # Resume after the last stored page instead of re-downloading from id 0
+    poller.set_last_id(await run_read(get_roc_cursor, event_id, competition_id))
+    request.app.state.roc_poller = poller
+    await poller.start()
 
-        log_audit(conn, event_id, "roc_start", "connection",
-                  f"ROC polling started, ID={active['roc_competition_id']}")
-        return {"ok": True, "competition_id": active["roc_competition_id"]}
-    finally:
-        conn.close()
+    await run_write(log_audit, event_id, "roc_start", "connection",
+                    f"ROC polling started, ID={competition_id}, lastId={poller.last_id}")
+    return {"ok": True, "competition_id": active["roc_competition_id"]}
 
 
 @router.post("/roc/stop")
@@ -1252,6 +1150,8 @@ async def roc_status(request: Request):
         "error_count": 0,
         "last_poll": None,
         "last_id": 0,
+        "poll_lag": None,
+        "poll_interval": None,
         "competition_id": None,
     }
 
@@ -1259,17 +1159,11 @@ async def roc_status(request: Request):
 @router.put("/roc/config")
 async def roc_update_config(body: RocConfig):
     """Update ROC competition ID on the active event."""
-    conn = _get_conn()
-    try:
-        active = conn.execute(
-            "SELECT * FROM events WHERE status='active' ORDER BY id DESC LIMIT 1"
-        ).fetchone()
-        if not active:
-            raise HTTPException(400, "Inget aktivt event")
-        update_event(conn, active["id"], roc_competition_id=body.competition_id)
-        return {"ok": True, "competition_id": body.competition_id}
-    finally:
-        conn.close()
+    active = await run_read(_active_event)
+    if not active:
+        raise HTTPException(400, "Inget aktivt event")
+    await run_write(update_event, active["id"], roc_competition_id=body.competition_id)
+    return {"ok": True, "competition_id": body.competition_id}
 
 
 # ═══════════════════════════════════════════════════════════════════════
@@ -1327,132 +1221,148 @@ async def usb_stop(request: Request):
 @router.post("/events/{event_id}/import-thehub")
 async def import_from_thehub(event_id: int, body: TheHubImport):
     """Import startlist from TheHUB API."""
-    conn = _get_conn()
+    event = await run_read(get_event, event_id)
+    if not event:
+        raise HTTPException(404, "Event not found")
+
+    from core.hub_client import fetch_startlist
     try:
-        event = get_event(conn, event_id)
-        if not event:
-            raise HTTPException(404, "Event not found")
+        entries = await fetch_startlist(body.base_url, body.competition_id)
+    except Exception as e:
+        raise HTTPException(502, f"Kunde inte hämta från TheHUB: {e}")
 
-        from core.hub_client import fetch_startlist
-        try:
-            entries = await fetch_startlist(body.base_url, body.competition_id)
-        except Exception as e:
-            raise HTTPException(502, f"Kunde inte hämta från TheHUB: {e}")
+    if not entries:
+        return {"count": 0, "warnings": ["Inga deltagare hittades"]}
 
-        if not entries:
-            return {"count": 0, "warnings": ["Inga deltagare hittades"]}
+    count, warnings = await run_write(_import_hub_entries, event_id, entries,
+                                      body.competition_id)
+    return {"count": count, "warnings": warnings}
 
-        # Get existing classes and courses
-        classes = get_classes(conn, event_id)
+
+def _import_hub_entries(conn, event_id: int, entries: list[dict],
+                        competition_id: str) -> tuple[int, list[str]]:
+    """Writer-thread half of the TheHUB import: upsert entries, create classes."""
+    # Get existing classes and courses
+    classes = get_classes(conn, event_id)
+    courses = get_courses(conn, event_id)
+
+    # Create default course if none exists
+    if not courses:
+        from core.database import create_course
+        create_course(conn, event_id, "Huvudbana")
         courses = get_courses(conn, event_id)
 
-        # Create default course if none exists
-        if not courses:
-            from core.database import create_course
-            create_course(conn, event_id, "Huvudbana")
-            courses = get_courses(conn, event_id)
-
-        default_course_id = courses[0]["id"]
-        class_map = {c["name"]: c["id"] for c in classes}
-
-        count = 0
-        warnings = []
-        for entry in entries:
-            bib = entry.get("bib")
-            first_name = entry.get("first_name", "").strip()
-            last_name = entry.get("last_name", "").strip()
-            club = entry.get("club", "").strip()
-            class_name = entry.get("class_name", "Open").strip()
-
-            if not bib or not first_name:
-                warnings.append(f"Hoppar över rad utan BIB/namn: {entry}")
-                continue
-
-            # Create class if not exists
-            if class_name not in class_map:
-                from core.database import create_class
-                cls_id = create_class(conn, event_id, class_name, default_course_id)
-                class_map[class_name] = cls_id
-
-            # Upsert entry
-            existing = conn.execute(
-                "SELECT id FROM entries WHERE event_id=? AND bib=?",
-                (event_id, bib)
-            ).fetchone()
-
-            if existing:
-                conn.execute(
-                    """UPDATE entries SET first_name=?, last_name=?, club=?, class_id=?
-                       WHERE id=?""",
-                    (first_name, last_name, club, class_map[class_name], existing["id"])
-                )
-            else:
-                create_entry(conn, event_id, bib, first_name, last_name,
-                             club, class_map[class_name])
-            count += 1
-
-        conn.commit()
-        log_audit(conn, event_id, "import_thehub", "entries",
-                  f"Importerade {count} deltagare från TheHUB (competition {body.competition_id})")
-        return {"count": count, "warnings": warnings}
-    finally:
-        conn.close()
+    default_course_id = courses[0]["id"]
+    class_map = {c["name"]: c["id"] for c in classes}
+
+    count = 0
+    warnings = []
+    moved: dict[int, int] = {}   # entry_id → class it left
+    for entry in entries:
+        bib = entry.get("bib")
+        first_name = entry.get("first_name", "").strip()
+        last_name = entry.get("last_name", "").strip()
+        club = entry.get("club", "").strip()
+        class_name = entry.get("class_name", "Open").strip()
+
+        if not bib or not first_name:
+            warnings.append(f"Hoppar över rad utan BIB/namn: {entry}")
+            continue
+
+        # Create class if not exists
+        if class_name not in class_map:
+            from core.database import create_class
+            cls_id = create_class(conn, event_id, class_name, default_course_id)
+            class_map[class_name] = cls_id
+
+        # Upsert entry
+        existing = conn.execute(
+            "SELECT id, class_id FROM entries WHERE event_id=? AND bib=?",
+            (event_id, bib)
+        ).fetchone()
+
+        if existing:
+            conn.execute(
+                """UPDATE entries SET first_name=?, last_name=?, club=?, class_id=?
+                   WHERE id=?""",
+                (first_name, last_name, club, class_map[class_name], existing["id"])
+            )
+            if existing["class_id"] != class_map[class_name]:
+                moved[existing["id"]] = existing["class_id"]
+        else:
+            create_entry(conn, event_id, bib, first_name, last_name,
+                         club, class_map[class_name])
+        count += 1
+
+    if moved:
+        move_entries(conn, event_id, list(moved))
+    commit_and_invalidate(conn, event_id)
+    if moved:
+        calculate_overall_results(conn, event_id, list(moved), set(moved.values()))
+    log_audit(conn, event_id, "import_thehub", "entries",
+              f"Importerade {count} deltagare från TheHUB (competition {competition_id})")
+    return count, warnings
 
 
 @router.post("/events/{event_id}/preview-thehub")
 async def preview_thehub(event_id: int, body: TheHubImport):
     """Preview startlist from TheHUB without importing."""
-    conn = _get_conn()
-    try:
-        event = get_event(conn, event_id)
-        if not event:
-            raise HTTPException(404, "Event not found")
+    event = await run_read(get_event, event_id)
+    if not event:
+        raise HTTPException(404, "Event not found")
 
-        from core.hub_client import fetch_startlist
-        try:
-            entries = await fetch_startlist(body.base_url, body.competition_id)
-        except Exception as e:
-            raise HTTPException(502, f"Kunde inte hämta från TheHUB: {e}")
+    from core.hub_client import fetch_startlist
+    try:
+        entries = await fetch_startlist(body.base_url, body.competition_id)
+    except Exception as e:
+        raise HTTPException(502, f"Kunde inte hämta från TheHUB: {e}")
 
-        return {"entries": entries, "count": len(entries)}
-    finally:
-        conn.close()
+    return {"entries": entries, "count": len(entries)}
 
 
 # ═══════════════════════════════════════════════════════════════════════
 # SYSTEM STATUS
 # ═══════════════════════════════════════════════════════════════════════
 
+@router.get("/ingest/status")
+async def ingest_status():
+    """Single-writer queue depth, throughput and latency."""
+    return ingest_queue.stats()
+
+
+@router.get("/ws/status")
+async def ws_status():
+    """WebSocket clients with their send-queue depth and drop counters."""
+    return ws_manager.stats()
+
+
 @router.get("/status")
 async def system_status(request: Request):
-    conn = _get_conn()
-    try:
+    def load(conn):
         # Active event
-        active = conn.execute(
-            "SELECT * FROM events WHERE status='active' ORDER BY id DESC LIMIT 1"
-        ).fetchone()
-
+        active = _active_event(conn)
         punch_count = 0
         if active:
             punch_count = conn.execute(
                 "SELECT COUNT(*) as cnt FROM punches WHERE event_id=?",
                 (active["id"],)
             ).fetchone()["cnt"]
+        return active, punch_count, _race_state(conn)
 
-        roc_poller = request.app.state.roc_poller
-        return {
-            "server": "GravityTiming",
-            "version": "2.0",
-            "active_event": _row_to_dict(active) if active else None,
-            "punch_count": punch_count,
-            "ws_connections": ws_manager.connection_count,
-            "race_state": {
-                "ingest_paused": get_setting(conn, "ingest_paused", "false") == "true",
-                "standings_frozen": get_setting(conn, "standings_frozen", "false") == "true",
-            },
-            "roc_status": roc_poller.get_status() if roc_poller else {
-                "is_running": False, "status": "Stoppad"
-            },
-        }
-    finally:
-        conn.close()
+    active, punch_count, race_state = await run_read(load)
+
+    roc_poller = request.app.state.roc_poller
+    return {
+        "server": "GravityTiming",
+        "version": "2.0",
+        "active_event": _row_to_dict(active) if active else None,
+        "punch_count": punch_count,
+        "ws_connections": ws_manager.connection_count,
+        "ingest_queue_depth": ingest_queue.depth,
+        "db_pool": get_pool().stats(),
+        "snapshots": snapshot_publisher.get_status(),
+        "race_state": race_state,
+        "roc_status": roc_poller.get_status() if roc_poller else {
+            "is_running": False, "status": "Stoppad"
+        },
+    }
@@ -0,0 +1,171 @@
+"""
+snapshots.py — Pre-rendered standings pages for spectator traffic.
+
+A background task checks once per CHECK_INTERVAL whether any results
+changed (event_cache.results_generation()). If so it loads the active
+event's overall standings once and writes, under data/snapshots/<event_id>/:
+
+    standings.html / standings.json        all classes
+    class-<class_id>.html / .json          one class
+
+each with a .gz copy (and .br when the brotli package is installed).
+server.py serves the directory at /snapshots with PrecompressedStaticFiles
+and answers /standings with the active event's standings.html, so a
+spectator page load costs no query and no template rendering. Files whose
+content did not change are not rewritten (their ETag stays valid).
+
+While standings are frozen nothing is published; the last files stay up.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+from pathlib import Path
+from typing import Optional
+
+from core import database
+from core.database import get_classes, get_overall_results, get_setting
+from core.db_executor import run_read
+from core.event_cache import results_generation
+from core.timing_engine import format_elapsed, format_time_behind
+from api.static_files import brotli, write_variants
+
+logger = logging.getLogger("gravitytiming.snapshots")
+
+CHECK_INTERVAL = 1.0
+URL_PREFIX = "/snapshots"
+
+
+def load_snapshot(conn: sqlite3.Connection) -> Optional[dict]:
+    """Standings of the active event (None: no active event)."""
+    if get_setting(conn, "standings_frozen", "false") == "true":
+        return {"frozen": True}
+    active = conn.execute(
+        "SELECT * FROM events WHERE status='active' ORDER BY id DESC LIMIT 1"
+    ).fetchone()
+    if active is None:
+        return None
+    event_id = active["id"]
+    return {
+        "frozen": False,
+        "event": {"id": event_id, "name": active["name"],
+                  "time_precision": active["time_precision"]},
+        "classes": [{"id": c["id"], "name": c["name"]}
+                    for c in get_classes(conn, event_id)],
+        "rows": [dict(r) for r in get_overall_results(conn, event_id)],
+    }
+
+
+def _script_json(text: str) -> str:
+    """JSON that is safe inside a <script> element."""
+    return text.replace("<", "\\u003c")
+
+
+class SnapshotPublisher:
+    """Writes standings snapshots when results change."""
+
+    def __init__(self):
+        self.templates = None          # Jinja2Templates, set by start()
+        self.event_id: Optional[int] = None
+        self._generation: Optional[int] = None
+        self._digests: dict[Path, bytes] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.publishes = 0
+        self.files_written = 0
+
+    @property
+    def directory(self) -> Path:
+        return database.DB_DIR / "snapshots"
+
+    def page_path(self) -> Optional[str]:
+        """Path of the active event's standings page, relative to directory."""
+        if self.event_id is None:
+            return None
+        return f"{self.event_id}/standings.html"
+
+    def start(self, templates) -> None:
+        self.templates = templates
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.publish()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Standings snapshot failed: %s", e)
+            await asyncio.sleep(CHECK_INTERVAL)
+
+    async def publish(self, force: bool = False) -> int:
+        """Write changed snapshot files. Returns the number of pages written."""
+        generation = results_generation()
+        if generation == self._generation and not force:
+            return 0
+        snapshot = await run_read(load_snapshot)
+        if snapshot is not None and snapshot["frozen"]:
+            return 0   # generation kept → published after unfreeze
+        self._generation = generation
+        if snapshot is None:
+            self.event_id = None
+            return 0
+        written = await asyncio.to_thread(self._write, snapshot)
+        self.event_id = snapshot["event"]["id"]
+        self.publishes += 1
+        return written
+
+    def _write(self, snapshot: dict) -> int:
+        event = snapshot["event"]
+        out = self.directory / str(event["id"])
+        out.mkdir(parents=True, exist_ok=True)
+        base = f"{URL_PREFIX}/{event['id']}"
+        classes = [{**c, "url": f"{base}/class-{c['id']}.json"}
+                   for c in snapshot["classes"]]
+
+        pages = [("standings", None, snapshot["rows"])]
+        for c in classes:
+            pages.append((f"class-{c['id']}", c["name"],
+                          [r for r in snapshot["rows"] if r["class_name"] == c["name"]]))
+
+        written = 0
+        for name, class_name, rows in pages:
+            data = {"event": event, "url": f"{base}/standings.json",
+                    "classes": classes, "class": class_name, "rows": rows}
+            body = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+            digest = hashlib.sha1(body.encode("utf-8")).digest()
+            if self._digests.get(out / name) == digest:
+                continue
+            html = self.templates.get_template("standings.html").render(
+                snapshot=data, snapshot_json=_script_json(body),
+                format_elapsed=format_elapsed, format_time_behind=format_time_behind,
+            )
+            write_variants(out / f"{name}.json", body.encode("utf-8"))
+            write_variants(out / f"{name}.html", html.encode("utf-8"))
+            self._digests[out / name] = digest
+            self.files_written += 2
+            written += 1
+        return written
+
+    def get_status(self) -> dict:
+        return {
+            "event_id": self.event_id,
+            "publishes": self.publishes,
+            "files_written": self.files_written,
+            "brotli": brotli is not None,
+        }
+
+
+publisher = SnapshotPublisher()
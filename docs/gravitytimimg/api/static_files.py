@@ -0,0 +1,82 @@
+"""
+static_files.py — StaticFiles that serves precompressed variants.
+
+Next to a file, "<name>.br" and "<name>.gz" hold compressed copies written
+ahead of time by write_variants() (standings snapshots, hashed assets). When
+the browser accepts the encoding the compressed copy is sent as-is with
+Content-Encoding, so nothing is compressed per request.
+"""
+
+from __future__ import annotations
+
+import gzip
+import mimetypes
+import os
+from pathlib import Path
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+try:
+    import brotli
+except ImportError:  # optional — gzip only
+    brotli = None
+
+# Preferred first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def write_variants(path: Path, data: bytes) -> None:
+    """Write a file plus its precompressed copies (compressed ones first)."""
+    if brotli is not None:
+        _write_atomic(path.with_name(path.name + ".br"), brotli.compress(data))
+    _write_atomic(path.with_name(path.name + ".gz"), gzip.compress(data, 9, mtime=0))
+    _write_atomic(path, data)
+
+
+def _accepts(accept_encoding: str, encoding: str) -> bool:
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip() == encoding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles with precompressed variants and a fixed Cache-Control."""
+
+    def __init__(self, *args, cache_control: str = "no-cache", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = cache_control
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        accept = Headers(scope=scope).get("accept-encoding", "")
+        response = None
+        for encoding, suffix in ENCODINGS:
+            if not _accepts(accept, encoding):
+                continue
+            try:
+                response = await super().get_response(path + suffix, scope)
+            except HTTPException:
+                continue
+            response.headers["content-encoding"] = encoding
+            media_type, _ = mimetypes.guess_type(path)
+            if media_type:
+                if media_type.startswith("text/") or media_type.endswith("json"):
+                    media_type += "; charset=utf-8"
+                response.headers["content-type"] = media_type
+            break
+        if response is None:
+            response = await super().get_response(path, scope)
+        response.headers["vary"] = "Accept-Encoding"
+        response.headers["cache-control"] = self.cache_control
+        return response
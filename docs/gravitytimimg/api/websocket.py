@@ -2,8 +2,28 @@
 websocket.py — WebSocket manager and broadcast for GravityTiming.
 
 Protocol from MEMORY.md §8:
-- Server → Client: punch, standings, highlight, stage_status
-- Client → Server: subscribe (channel selection)
+- Server → Client: punch, punches (batch), standings, standings_diff,
+  highlight, stage_status
+- Client → Server: subscribe (channel selection + topic filters)
+
+Every broadcast carries a seq. A reconnecting client sends the last seq it
+saw ({"type": "subscribe", ..., "resume": 1234}) and gets the missed
+messages from a ring buffer followed by "resumed", or a "snapshot" of the
+current standings if the buffer no longer reaches back that far.
+
+Frames are encoded once per encoding (api/ws_codec.py): plain json, or
+"compact" with rider metadata sent once per session.
+
+Subscribe filters (all optional, a missing or empty filter means "any"):
+    {"type": "subscribe", "channels": ["finish"], "types": ["punch"],
+     "event_id": 1, "stages": [3], "classes": ["Herr"], "bibs": [12]}
+stages are stage numbers, as in /finish?stage=3. A filter only excludes
+messages that carry a different value: race_control has no stage, so a
+stage-filtered screen still gets it (unless filtered out by type).
+
+Standings are coalesced: punch handlers only mark classes dirty, and one
+publish per STANDINGS_DEBOUNCE window sends the rows that changed per class
+(standings_diff) instead of every client reloading the full list.
 
 Single endpoint: ws://{host}:8080/ws
 """
@@ -13,51 +33,543 @@ from __future__ import annotations
 import asyncio
 import json
 import logging
+import time
+from collections import deque
 from typing import Optional
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
+from api.ws_codec import ENCODINGS, Frame, encode, entries_frame
+from core.database import get_overall_results, get_setting
+from core.db_executor import run_read
+from core.event_cache import get_structure
+from core.leaderboard import get_leaderboards
+
 logger = logging.getLogger("gravitytiming.ws")
 
 router = APIRouter()
 
+STANDINGS_DEBOUNCE = 0.25  # seconds of punches coalesced into one publish
+
+# Row fields sent in standings_diff (same names as GET /overall)
+STANDINGS_FIELDS = ("entry_id", "bib", "first_name", "last_name", "club",
+                    "class_name", "status", "position", "total_seconds",
+                    "time_behind")
+
+
+def standings_by_class(conn, event_id: int) -> dict[str, dict[int, dict]]:
+    """Current overall standings as {class_name: {entry_id: row}}."""
+    by_class: dict[str, dict[int, dict]] = {}
+    for r in get_overall_results(conn, event_id):
+        row = {k: r[k] for k in STANDINGS_FIELDS}
+        by_class.setdefault(row["class_name"], {})[row["entry_id"]] = row
+    return by_class
+
+
+def _standings_order(row: dict) -> tuple:
+    """Sort key matching get_overall_results (status, then time, NULL first)."""
+    return (row["status"], row["total_seconds"] is not None,
+            row["total_seconds"] or 0)
+
+
+def diff_standings(old: dict[int, dict],
+                   new: dict[int, dict]) -> tuple[list[dict], list[int]]:
+    """Rows added, moved or changed in new, and entry_ids gone from it."""
+    changed = [row for entry_id, row in new.items() if old.get(entry_id) != row]
+    removed = [entry_id for entry_id in old if entry_id not in new]
+    return changed, removed
+
+
+# ─── Subscriptions ────────────────────────────────────────────────────
+
+# Topic keys a socket can filter on, and the subscribe-message field for each
+TOPIC_FIELDS = {
+    "type": ("types", str),
+    "event_id": ("event_id", int),
+    "stage": ("stages", int),
+    "class": ("classes", str),
+    "bib": ("bibs", int),
+}
+
+
+def parse_subscription(msg: dict) -> dict[str, frozenset]:
+    """Topic filters from a subscribe message (invalid fields are ignored)."""
+    filters = {}
+    for key, (field, cast) in TOPIC_FIELDS.items():
+        values = msg.get(field)
+        if values is None:
+            continue
+        if not isinstance(values, list):
+            values = [values]
+        try:
+            values = frozenset(cast(v) for v in values)
+        except (TypeError, ValueError):
+            logger.debug("WS subscribe: ignoring %s=%r", field, values)
+            continue
+        if values:
+            filters[key] = values
+    # A punch subscriber also wants punch batches
+    if "punch" in filters.get("type", ()):
+        filters["type"] = filters["type"] | {"punches"}
+    return filters
+
+
+def message_topic(msg: dict) -> dict:
+    """Topic values carried by an outgoing message (None = not applicable)."""
+    stage_result = msg.get("stage_result") or {}
+    return {
+        "type": msg.get("type"),
+        "event_id": msg.get("event_id"),
+        "stage": msg.get("stage_number", stage_result.get("stage_number")),
+        "class": msg.get("class"),
+        "bib": msg.get("bib"),
+    }
+
+
+class SubscriptionIndex:
+    """Which sockets want which topics.
+
+    Per topic key, sockets are indexed by value, plus one set of sockets
+    with no filter on that key. recipients() intersects those sets for the
+    keys a message carries, so a broadcast never walks every socket's
+    filters.
+    """
+
+    def __init__(self):
+        self._any: dict[str, set] = {key: set() for key in TOPIC_FIELDS}
+        self._by_value: dict[str, dict] = {key: {} for key in TOPIC_FIELDS}
+        self._filters: dict = {}
+
+    def __len__(self) -> int:
+        return len(self._filters)
+
+    def __contains__(self, ws) -> bool:
+        return ws in self._filters
+
+    def filters(self, ws) -> dict[str, frozenset]:
+        return self._filters.get(ws, {})
+
+    def add(self, ws, filters: Optional[dict[str, frozenset]] = None) -> None:
+        """Add (or re-subscribe) a socket."""
+        self.remove(ws)
+        filters = filters or {}
+        self._filters[ws] = filters
+        for key in TOPIC_FIELDS:
+            if key in filters:
+                for value in filters[key]:
+                    self._by_value[key].setdefault(value, set()).add(ws)
+            else:
+                self._any[key].add(ws)
+
+    def remove(self, ws) -> None:
+        filters = self._filters.pop(ws, None)
+        if filters is None:
+            return
+        for key in TOPIC_FIELDS:
+            if key in filters:
+                for value in filters[key]:
+                    sockets = self._by_value[key].get(value)
+                    if sockets is not None:
+                        sockets.discard(ws)
+                        if not sockets:
+                            del self._by_value[key][value]
+            else:
+                self._any[key].discard(ws)
+
+    def accepts(self, ws, topic: dict) -> bool:
+        """Whether one socket's filters accept a message with this topic."""
+        if ws not in self._filters:
+            return False
+        filters = self._filters[ws]
+        return all(value is None or key not in filters or value in filters[key]
+                   for key, value in topic.items())
+
+    def recipients(self, topic: dict) -> set:
+        """Sockets whose filters accept a message with these topic values."""
+        result = None
+        for key, value in topic.items():
+            if value is None or key not in TOPIC_FIELDS:
+                continue
+            matching = self._any[key] | self._by_value[key].get(value, set())
+            result = matching if result is None else result & matching
+            if not result:
+                return set()
+        return set(self._filters) if result is None else result
+
+
+# ─── Per-client send queues ───────────────────────────────────────────
+
+SEND_QUEUE_SIZE = 256   # frames buffered per client; the oldest is dropped beyond
+SEND_TIMEOUT = 10.0     # seconds one send may block before the client is dropped
+REPLAY_BUFFER = 2000    # recent broadcasts kept for clients resuming after a drop
+
+
+class _Client:
+    """One socket's bounded outgoing queue and its sender task."""
+
+    def __init__(self, ws: WebSocket):
+        self.ws = ws
+        self.pending: deque[tuple[str, bool]] = deque()  # (frame, pinned)
+        self.wakeup = asyncio.Event()
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.task: Optional[asyncio.Task] = None
+        self.channels: list = []
+        self.encoding = "json"
+        self.known_entries: set[int] = set()
+        self.sent = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    def offer(self, data: str, pinned: bool = False) -> None:
+        """Queue a frame without waiting.
+
+        A full queue drops its oldest frame that isn't pinned (entries
+        metadata is pinned: later frames depend on it).
+        """
+        if len(self.pending) >= SEND_QUEUE_SIZE:
+            for i, (_, is_pinned) in enumerate(self.pending):
+                if not is_pinned:
+                    del self.pending[i]
+                    self.dropped += 1
+                    break
+        self.pending.append((data, pinned))
+        self.max_depth = max(self.max_depth, len(self.pending))
+        self.idle.clear()
+        self.wakeup.set()
+
+    def discard_pending(self) -> None:
+        self.pending.clear()
+        self.idle.set()
+
+    def stats(self) -> dict:
+        address = getattr(self.ws, "client", None)
+        return {
+            "client": f"{address.host}:{address.port}" if address else None,
+            "channels": self.channels,
+            "encoding": self.encoding,
+            "depth": len(self.pending),
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+        }
+
 
 class ConnectionManager:
-    """Manages WebSocket connections and message broadcasting."""
+    """Manages WebSocket connections and message broadcasting.
+
+    Every socket has its own bounded send queue drained by its own task, so
+    broadcast() only enqueues: a phone on bad Wi-Fi fills (and then drops
+    from) its own queue without delaying the overlay or finish screens. A
+    send that blocks longer than SEND_TIMEOUT disconnects that client.
+    """
 
     def __init__(self):
         self.active: list[WebSocket] = []
+        self.subscriptions = SubscriptionIndex()
+        self._clients: dict[WebSocket, _Client] = {}
+        self.slow_disconnects = 0
+        # Sequence numbers start at the current time in ms, so a client
+        # resuming with a seq from before a restart is always older than
+        # anything in the new history and gets a snapshot.
+        self.seq = int(time.time() * 1000)
+        self._history: deque[dict] = deque(maxlen=REPLAY_BUFFER)
+        self.relay_mode = False  # set by relay.py
+        # event_id → (seq, pending standings read) shared by snapshot requests
+        self._snapshot_cache: dict[int, tuple[int, asyncio.Future]] = {}
         self._standings_task: Optional[asyncio.Task] = None
+        # event_id → dirty class names (None = every class)
+        self._standings_dirty: dict[int, Optional[set[str]]] = {}
+        # (event_id, class_name) → last published {entry_id: row}
+        self._standings_sent: dict[tuple[int, str], dict[int, dict]] = {}
 
     async def connect(self, ws: WebSocket):
         await ws.accept()
         self.active.append(ws)
+        self.subscriptions.add(ws)  # everything until it subscribes
+        client = _Client(ws)
+        client.task = asyncio.create_task(self._sender(client))
+        self._clients[ws] = client
         logger.info("WS connected (%d total)", len(self.active))
 
     def disconnect(self, ws: WebSocket):
-        if ws in self.active:
-            self.active.remove(ws)
+        client = self._unregister(ws)
+        if client:
+            client.task.cancel()
+
+    def _unregister(self, ws: WebSocket) -> Optional[_Client]:
+        if ws not in self.active:
+            return None
+        self.active.remove(ws)
+        self.subscriptions.remove(ws)
+        client = self._clients.pop(ws, None)
+        if client:
+            client.discard_pending()
         logger.info("WS disconnected (%d total)", len(self.active))
+        return client
 
-    async def broadcast(self, message: dict):
-        """Send message to all connected clients."""
-        if not self.active:
+    def subscribe(self, ws: WebSocket, msg: dict) -> None:
+        """Replace a socket's topic filters from a subscribe message."""
+        if ws not in self.subscriptions:
             return
-        data = json.dumps(message, ensure_ascii=False)
-        disconnected = []
-        for ws in self.active:
+        filters = parse_subscription(msg)
+        self.subscriptions.add(ws, filters)
+        client = self._clients.get(ws)
+        if client:
+            client.channels = msg.get("channels") or []
+            encoding = msg.get("encoding", "json")
+            if encoding in ENCODINGS and encoding != client.encoding:
+                client.encoding = encoding
+                client.known_entries.clear()
+        logger.debug("WS subscribe %s: %s", msg.get("channels"), filters)
+
+    async def _send(self, sockets, message: dict):
+        """Queue the message for each socket (never waits on a client).
+
+        The message is encoded once per encoding in use; clients share the
+        frame string. Compact sessions first get the entry metadata they
+        haven't seen (see api/ws_codec.py).
+        """
+        frames: dict[str, Frame] = {}
+        for ws in sockets:
+            client = self._clients.get(ws)
+            if not client:
+                continue
+            frame = frames.get(client.encoding)
+            if frame is None:
+                frame = frames[client.encoding] = encode(message, client.encoding)
+            missing = frame.entries.keys() - client.known_entries
+            if missing:
+                client.offer(entries_frame({i: frame.entries[i] for i in missing}),
+                             pinned=True)
+                client.known_entries.update(missing)
+            client.offer(frame.data)
+
+    async def _sender(self, client: _Client):
+        """Drain one client's queue; a failed or stalled send drops the client."""
+        while True:
+            if not client.pending:
+                client.idle.set()
+                client.wakeup.clear()
+                await client.wakeup.wait()
+                continue
+            data, _ = client.pending.popleft()
             try:
-                await ws.send_text(data)
+                await asyncio.wait_for(client.ws.send_text(data), SEND_TIMEOUT)
+                client.sent += 1
+            except asyncio.TimeoutError:
+                logger.warning("WS client stalled for %gs — disconnecting",
+                               SEND_TIMEOUT)
+                self.slow_disconnects += 1
+                await self._drop(client)
+                return
             except Exception:
-                disconnected.append(ws)
-        for ws in disconnected:
-            self.disconnect(ws)
+                await self._drop(client)
+                return
+
+    async def _drop(self, client: _Client):
+        self._unregister(client.ws)  # called from its own sender task
+        try:
+            await client.ws.close(code=1013)  # "try again later"
+        except Exception:
+            pass
+
+    async def flush(self):
+        """Wait until every queued frame has been sent (or dropped)."""
+        await asyncio.gather(*(c.idle.wait() for c in list(self._clients.values())))
+
+    def stats(self) -> dict:
+        """Per-client queue depth and counters (GET /api/ws/status)."""
+        clients = [c.stats() for c in self._clients.values()]
+        return {
+            "connections": len(clients),
+            "queued": sum(c["depth"] for c in clients),
+            "dropped": sum(c["dropped"] for c in clients),
+            "slow_disconnects": self.slow_disconnects,
+            "clients": clients,
+        }
+
+    # ─── Sequence numbers and replay ─────────────────────────────────
+
+    def _stamp(self, message: dict) -> dict:
+        """Give a broadcast the next seq and keep it for resuming clients.
+
+        Stamped even with no one connected: that is exactly when every
+        screen is about to come back and ask for it.
+        """
+        self.seq += 1
+        message = {**message, "seq": self.seq}
+        self._history.append(message)
+        return message
+
+    def _filtered_for(self, ws: WebSocket, message: dict) -> Optional[dict]:
+        """The part of a stored broadcast this socket subscribes to."""
+        if message["type"] == "punches":
+            punches = [
+                p for p in message["punches"]
+                if self.subscriptions.accepts(ws, message_topic(
+                    {"type": "punches", "event_id": message["event_id"], **p}))
+            ]
+            return {**message, "punches": punches} if punches else None
+        if self.subscriptions.accepts(ws, message_topic(message)):
+            return message
+        return None
+
+    async def resume(self, ws: WebSocket, last_seq: int) -> None:
+        """Replay what a reconnecting client missed after last_seq.
+
+        If the history no longer reaches back that far, send a snapshot
+        instead: current standings per subscribed class, from memory.
+        Ends with a "resumed" or "snapshot" message carrying the current seq.
+        """
+        oldest = self._history[0]["seq"] if self._history else self.seq + 1
+        if last_seq < oldest - 1 or last_seq > self.seq:
+            seq = self.seq
+            standings = await self._snapshot_standings(ws)
+            await self._send([ws], {"type": "snapshot", "seq": seq,
+                                    "standings": standings})
+            return
+
+        count = 0
+        for message in list(self._history):
+            if message["seq"] <= last_seq:
+                continue
+            filtered = self._filtered_for(ws, message)
+            if filtered is not None:
+                await self._send([ws], filtered)
+                count += 1
+        await self._send([ws], {"type": "resumed", "seq": self.seq, "count": count})
+
+    async def _snapshot_standings(self, ws: WebSocket) -> dict:
+        """{event_id: {class: rows}} for the events/classes a socket follows.
+
+        One query per event and seq, however many clients reconnect at once.
+        While frozen, the last published standings are used instead.
+        """
+        events = (self.subscriptions.filters(ws).get("event_id")
+                  or {e for e, _ in self._standings_sent})
+        # A relay has no database: its mirror is the current state
+        frozen = self.relay_mode or await run_read(
+            get_setting, "standings_frozen", "false") == "true"
+        standings: dict[str, dict] = {}
+        for event_id in events:
+            if frozen:
+                by_class = {c: rows for (e, c), rows in self._standings_sent.items()
+                            if e == event_id}
+            else:
+                cached = self._snapshot_cache.get(event_id)
+                if cached is None or cached[0] != self.seq:
+                    cached = (self.seq, asyncio.ensure_future(
+                        run_read(standings_by_class, event_id)))
+                    self._snapshot_cache[event_id] = cached
+                by_class = await cached[1]
+            for class_name, rows in by_class.items():
+                topic = {"type": "standings_diff", "event_id": event_id,
+                         "class": class_name}
+                if self.subscriptions.accepts(ws, topic):
+                    standings.setdefault(str(event_id), {})[class_name] = sorted(
+                        rows.values(), key=_standings_order)
+        return standings
+
+    async def broadcast(self, message: dict):
+        """Send message to every client subscribed to its topic."""
+        await self._fan_out(self._stamp(message))
+
+    async def _fan_out(self, message: dict):
+        """Deliver an already stamped message to matching clients."""
+        if not self.active:
+            return
+        if message["type"] == "punches":
+            await self._fan_out_punches(message)
+            return
+        sockets = self.subscriptions.recipients(message_topic(message))
+        if sockets:
+            await self._send(sockets, message)
 
     async def broadcast_punch(self, event_id: int, punch_data: dict):
         """Broadcast a processed punch with stage result and overall."""
         msg = {"type": "punch", "event_id": event_id, **punch_data}
         await self.broadcast(msg)
 
+    async def broadcast_punches(self, event_id: int, punches: list[dict]):
+        """Broadcast a page of processed punches as one message.
+
+        Each client gets the punches matching its filters, one message per
+        distinct subset. Clients expand it into individual punch events
+        (ws-client.js).
+        """
+        if not punches:
+            return
+        await self._fan_out(self._stamp(
+            {"type": "punches", "event_id": event_id, "punches": punches}))
+
+    async def _fan_out_punches(self, message: dict):
+        event_id, punches = message["event_id"], message["punches"]
+        wanted: dict = {}
+        for i, punch in enumerate(punches):
+            topic = message_topic({"type": "punches", "event_id": event_id, **punch})
+            for ws in self.subscriptions.recipients(topic):
+                wanted.setdefault(ws, []).append(i)
+
+        groups: dict[tuple, list] = {}
+        for ws, indexes in wanted.items():
+            groups.setdefault(tuple(indexes), []).append(ws)
+        for indexes, sockets in groups.items():
+            msg = {**message, "punches": [punches[i] for i in indexes]}
+            await self._send(sockets, msg)
+
+    # ─── Relay mode ──────────────────────────────────────────────────
+
+    async def relay_message(self, message: dict):
+        """Relay mode: apply one message from the timing server's stream.
+
+        Messages keep the timing server's seq, so clients can resume
+        against any relay. Standings are mirrored from snapshots and
+        standings_diff and serve the relay's snapshots and REST reads.
+        """
+        kind = message.get("type")
+        if kind == "snapshot":
+            # (Re)synced from scratch: the history has a gap, so resuming
+            # clients and anyone connected now get a snapshot instead
+            self.seq = message["seq"]
+            self._history.clear()
+            self._standings_sent = {
+                (int(event_id), class_name): {r["entry_id"]: r for r in rows}
+                for event_id, classes in message.get("standings", {}).items()
+                for class_name, rows in classes.items()
+            }
+            for ws in list(self.active):
+                await self._send([ws], {"type": "snapshot", "seq": self.seq,
+                                        "standings": await self._snapshot_standings(ws)})
+            return
+        if kind == "resumed":
+            return
+        if message.get("seq") is None or message["seq"] <= self.seq:
+            return  # duplicates
+
+        if kind == "standings_diff":
+            key = (message["event_id"], message["class"])
+            rows = dict(self._standings_sent.get(key, {}))
+            for entry_id in message["removed"]:
+                rows.pop(entry_id, None)
+            rows.update((r["entry_id"], r) for r in message["changed"])
+            if rows:
+                self._standings_sent[key] = rows
+            else:
+                self._standings_sent.pop(key, None)
+
+        self.seq = message["seq"]
+        self._history.append(message)
+        await self._fan_out(message)
+
+    def mirrored_standings(self, event_id: int,
+                           class_name: Optional[str] = None) -> list[dict]:
+        """Relay mode: standings rows from the mirror, in API order."""
+        rows = [row for (e, c), by_entry in self._standings_sent.items()
+                if e == event_id and (class_name is None or c == class_name)
+                for row in by_entry.values()]
+        return sorted(rows, key=lambda r: (r["class_name"], *_standings_order(r)))
+
     async def broadcast_standings(self, event_id: int, class_name: str,
                                   standings: list[dict]):
         """Broadcast standings update for a class."""
@@ -69,6 +581,80 @@ class ConnectionManager:
         }
         await self.broadcast(msg)
 
+    # ─── Coalesced standings ─────────────────────────────────────────
+
+    def mark_standings_dirty(self, event_id: int,
+                             classes: Optional[set[str]] = None) -> None:
+        """Note changed classes (None = all) and schedule a publish."""
+        if classes is None or self._standings_dirty.get(event_id, set()) is None:
+            self._standings_dirty[event_id] = None
+        else:
+            self._standings_dirty.setdefault(event_id, set()).update(classes)
+        self.schedule_standings()
+
+    def schedule_standings(self) -> None:
+        """Publish pending standings after STANDINGS_DEBOUNCE (one at a time)."""
+        if not self._standings_dirty:
+            return
+        if self._standings_task and not self._standings_task.done():
+            return  # the pending publish picks up the new marks
+        self._standings_task = asyncio.get_running_loop().create_task(
+            self._publish_standings_later()
+        )
+
+    async def _publish_standings_later(self):
+        await asyncio.sleep(STANDINGS_DEBOUNCE)
+        pending = self._standings_dirty
+        try:
+            await self.publish_standings()
+        except Exception as e:
+            logger.error("Standings publish failed: %s", e)
+        finally:
+            self._standings_task = None
+        # Marks that arrived while publishing. If the marks were kept
+        # (frozen), wait for the next punch or unfreeze instead of spinning.
+        if self._standings_dirty is not pending:
+            self.schedule_standings()
+
+    async def publish_standings(self) -> int:
+        """Send standings_diff for every dirty class. Returns messages sent.
+
+        Nothing is sent (and the marks are kept) while standings are frozen.
+        """
+        if not self._standings_dirty:
+            return 0
+        if await run_read(get_setting, "standings_frozen", "false") == "true":
+            return 0
+
+        dirty, self._standings_dirty = self._standings_dirty, {}
+        sent = 0
+        for event_id, classes in dirty.items():
+            current = await run_read(standings_by_class, event_id)
+            if classes is None:
+                classes = set(current) | {
+                    c for (e, c) in self._standings_sent if e == event_id
+                }
+            for class_name in sorted(classes):
+                key = (event_id, class_name)
+                new = current.get(class_name, {})
+                changed, removed = diff_standings(
+                    self._standings_sent.get(key, {}), new)
+                if new:
+                    self._standings_sent[key] = new
+                else:
+                    self._standings_sent.pop(key, None)
+                if not changed and not removed:
+                    continue
+                await self.broadcast({
+                    "type": "standings_diff",
+                    "event_id": event_id,
+                    "class": class_name,
+                    "changed": changed,
+                    "removed": removed,
+                })
+                sent += 1
+        return sent
+
     async def broadcast_highlight(self, event_id: int, category: str,
                                   text: str, bib: int,
                                   stage_number: Optional[int] = None,
@@ -89,12 +675,14 @@ class ConnectionManager:
                                      stage_name: str, status: str,
                                      riders_on_course: int = 0,
                                      riders_finished: int = 0,
-                                     leader: Optional[dict] = None):
+                                     leader: Optional[dict] = None,
+                                     stage_number: Optional[int] = None):
         """Broadcast stage status change."""
         msg = {
             "type": "stage_status",
             "event_id": event_id,
             "stage_id": stage_id,
+            "stage_number": stage_number,
             "stage_name": stage_name,
             "status": status,
             "riders_on_course": riders_on_course,
@@ -122,57 +710,34 @@ def generate_highlights(conn, event_id: int, entry_id: int,
     """
     highlights = []
 
-    entry = conn.execute(
-        "SELECT e.bib, e.first_name, e.last_name FROM entries e WHERE e.id=?",
-        (entry_id,)
-    ).fetchone()
+    structure = get_structure(conn, event_id)
+    entry = structure.entry_by_id.get(entry_id)
     if not entry:
         return highlights
 
     bib = entry["bib"]
     name = f"{entry['first_name'][0]}.{entry['last_name']}"
-    stage = conn.execute("SELECT * FROM stages WHERE id=?", (stage_id,)).fetchone()
+    stage = next((s for s in structure.stages if s["id"] == stage_id), None)
     if not stage:
         return highlights
 
     stage_num = stage["stage_number"]
 
-    # Get this entry's latest OK result for this stage
-    result = conn.execute(
-        """SELECT * FROM stage_results
-           WHERE event_id=? AND entry_id=? AND stage_id=? AND status='ok'
-           ORDER BY elapsed_seconds ASC LIMIT 1""",
-        (event_id, entry_id, stage_id)
-    ).fetchone()
-
-    if not result:
+    # This entry's best valid time and the stage leader, from the leaderboard
+    board = get_leaderboards(conn, event_id).stage(stage_id)
+    elapsed = board.best(entry_id)
+    if elapsed is None:
         return highlights
 
-    elapsed = result["elapsed_seconds"]
-
-    # Find leader time for this stage (best OK result across all entries)
-    leader = conn.execute(
-        """SELECT sr.elapsed_seconds, sr.entry_id, e.bib as leader_bib
-           FROM stage_results sr
-           JOIN entries e ON sr.entry_id = e.id
-           WHERE sr.event_id=? AND sr.stage_id=? AND sr.status='ok'
-           ORDER BY sr.elapsed_seconds ASC LIMIT 1""",
-        (event_id, stage_id)
-    ).fetchone()
+    leader = board.leader()
 
     if leader:
-        leader_time = leader["elapsed_seconds"]
+        leader_entry_id, leader_time = leader
 
         # New leader
-        if leader["entry_id"] == entry_id:
-            # Check if there are other OK results (meaning we beat someone)
-            others = conn.execute(
-                """SELECT COUNT(*) as cnt FROM stage_results
-                   WHERE event_id=? AND stage_id=? AND status='ok'
-                   AND entry_id != ?""",
-                (event_id, stage_id, entry_id)
-            ).fetchone()
-            if others["cnt"] > 0:
+        if leader_entry_id == entry_id:
+            # Other finishers on the stage (meaning we beat someone)
+            if len(board) > 1:
                 highlights.append({
                     "category": "new_leader",
                     "text": f"🏆 #{bib} {name} tar ledningen på Stage {stage_num}!",
@@ -219,12 +784,15 @@ async def websocket_endpoint(ws: WebSocket):
     try:
         while True:
             data = await ws.receive_text()
-            # Client can send subscribe messages (ignored for now — all get everything)
             try:
                 msg = json.loads(data)
-                if msg.get("type") == "subscribe":
-                    logger.debug("WS subscribe: %s", msg.get("channels"))
             except json.JSONDecodeError:
-                pass
+                continue
+            if isinstance(msg, dict) and msg.get("type") == "subscribe":
+                manager.subscribe(ws, msg)
+                if isinstance(msg.get("resume"), int):
+                    await manager.resume(ws, msg["resume"])
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(ws)
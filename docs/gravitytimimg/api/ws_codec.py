@@ -0,0 +1,91 @@
+"""
+ws_codec.py — Frame encodings for /ws.
+
+A broadcast is encoded once per encoding, and every client that uses that
+encoding gets the same frame string. A client picks its encoding in the
+subscribe message ({"type": "subscribe", "encoding": "compact"}).
+
+- json     the full message (default, used by anything that doesn't ask)
+- compact  rider metadata (names, club, class) is replaced by entry_id.
+           Before the first frame that references an entry, the session
+           gets one "entries" frame with the metadata it hasn't seen:
+               {"type": "entries", "entries": {"12": {"bib": 7, ...}}}
+           ws-client.js fills the fields back in before dispatching, so
+           page code sees the same messages as with json.
+
+Frames are also deflated per message when the browser supports it
+(permessage-deflate, enabled in uvicorn's websocket config).
+"""
+
+from __future__ import annotations
+
+import json
+from typing import NamedTuple
+
+ENCODINGS = ("json", "compact")
+
+# Sent once per entry and session in compact mode
+ENTRY_FIELDS = ("bib", "first_name", "last_name", "club", "class_name")
+
+# Derived from ENTRY_FIELDS on the client (punch messages)
+_PUNCH_DERIVED = ("name", "class", "club", "first_name", "last_name")
+_ROW_DERIVED = ("first_name", "last_name", "club", "class_name")
+
+
+class Frame(NamedTuple):
+    data: str
+    entries: dict[int, dict]   # metadata of entries the frame references
+
+
+def dumps(message: dict) -> str:
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+
+def _punch_entry(punch: dict) -> dict:
+    return {
+        "bib": punch.get("bib"),
+        "first_name": punch.get("first_name"),
+        "last_name": punch.get("last_name"),
+        "club": punch.get("club") or "",
+        "class_name": punch.get("class"),
+    }
+
+
+def _compact_punch(punch: dict, entries: dict[int, dict]) -> dict:
+    entry_id = punch.get("entry_id")
+    if entry_id is None or punch.get("first_name") is None:
+        return punch
+    entries[entry_id] = _punch_entry(punch)
+    return {k: v for k, v in punch.items() if k not in _PUNCH_DERIVED}
+
+
+def _compact_row(row: dict, entries: dict[int, dict]) -> dict:
+    entries[row["entry_id"]] = {k: row.get(k) for k in ENTRY_FIELDS}
+    return {k: v for k, v in row.items() if k not in _ROW_DERIVED}
+
+
+def _compact(message: dict) -> tuple[dict, dict[int, dict]]:
+    entries: dict[int, dict] = {}
+    kind = message.get("type")
+    if kind == "punch":
+        message = _compact_punch(message, entries)
+    elif kind == "punches":
+        message = {**message,
+                   "punches": [_compact_punch(p, entries) for p in message["punches"]]}
+    elif kind == "standings_diff":
+        message = {**message,
+                   "changed": [_compact_row(r, entries) for r in message["changed"]]}
+    return message, entries
+
+
+def encode(message: dict, encoding: str = "json") -> Frame:
+    """Encode a message for every client using this encoding."""
+    if encoding == "compact":
+        message, entries = _compact(message)
+        return Frame(dumps(message), entries)
+    return Frame(dumps(message), {})
+
+
+def entries_frame(entries: dict[int, dict]) -> str:
+    """Metadata frame for entries a compact session hasn't seen yet."""
+    return dumps({"type": "entries", "entries": entries})
@@ -8,9 +8,17 @@ Schema from MEMORY.md §7, extended with multi-run, dual slalom, templates.
 from __future__ import annotations
 
 import json
+import logging
+import queue
 import sqlite3
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
+
+from core import event_cache
+
+logger = logging.getLogger("gravitytiming.database")
 
 DB_DIR = Path(__file__).parent.parent / "data"
 DB_NAME = "gravitytiming.db"
@@ -21,17 +29,196 @@ def get_db_path() -> Path:
     return DB_DIR / DB_NAME
 
 
-def get_connection(db_path: Optional[Path] = None) -> sqlite3.Connection:
+class TimingConnection(sqlite3.Connection):
+    """sqlite3.Connection that remembers which database file it points to.
+
+    event_cache uses db_key to keep caches of different databases apart.
+    """
+    db_key: Optional[str] = None
+    after_commit_hooks: Optional[list] = None  # set inside transaction()
+
+
+def get_connection(db_path: Optional[Path] = None,
+                   check_same_thread: bool = True,
+                   cached_statements: int = 128) -> sqlite3.Connection:
     """Return a new connection with WAL mode and foreign keys enabled."""
     if db_path is None:
         db_path = get_db_path()
-    conn = sqlite3.connect(str(db_path), timeout=10)
+    conn = sqlite3.connect(str(db_path), timeout=10, factory=TimingConnection,
+                           check_same_thread=check_same_thread,
+                           cached_statements=cached_statements)
+    conn.db_key = str(Path(db_path).resolve())
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA journal_mode=WAL")
     conn.execute("PRAGMA foreign_keys=ON")
     return conn
 
 
+class ConnectionPool:
+    """Long-lived connections for request handlers and readers.
+
+    Connections are opened once (pragmas applied once, large prepared
+    statement cache) and handed out one caller at a time. Up to `size` idle
+    connections are kept; when all are busy an extra one is opened and
+    closed again on release. Connections may move between threads
+    (check_same_thread=False) but are never shared concurrently.
+
+    Pooled connections are read-only (PRAGMA query_only) unless the pool is
+    created with read_only=False: every write goes through the single writer
+    in core/ingest_queue.py, so a stray write here fails instead of waiting
+    on the SQLite write lock.
+    """
+
+    STATEMENT_CACHE = 256
+
+    def __init__(self, db_path: Path, size: int = 8, read_only: bool = True):
+        self.db_path = db_path
+        self.read_only = read_only
+        self.db_key = str(Path(db_path).resolve())  # same as conn.db_key
+        self.size = size
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            self._opened += 1
+        conn = get_connection(self.db_path, check_same_thread=False,
+                              cached_statements=self.STATEMENT_CACHE)
+        if self.read_only:
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        # Never hand out a connection with someone else's open transaction
+        if conn.in_transaction:
+            conn.rollback()
+        if self._idle.qsize() < self.size:
+            self._idle.put(conn)
+            return
+        conn.close()
+        with self._lock:
+            self._opened -= 1
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self) -> None:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+    def stats(self) -> dict:
+        return {"idle": self._idle.qsize(), "open": self._opened, "size": self.size}
+
+
+_pools: dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Pool for the current database file (one pool per path)."""
+    path = get_db_path()
+    key = str(path.resolve())
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(path)
+        return pool
+
+
+def close_pools() -> None:
+    """Close every idle pooled connection (server shutdown)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """Run a block as one write transaction: commit on success, roll back on error.
+
+    Starts with BEGIN IMMEDIATE so the write lock is taken up front. If the
+    connection already has an open transaction the block joins it and the
+    outer owner commits (after_commit() refuses to run in a joined implicit
+    transaction, which has no owner to run it). On rollback the in-memory event caches for this
+    database are dropped, since they may hold state from the failed block.
+    """
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    conn.after_commit_hooks = []
+    try:
+        yield conn
+    except BaseException:
+        conn.after_commit_hooks = None
+        conn.rollback()
+        event_cache.invalidate(conn)
+        raise
+    hooks, conn.after_commit_hooks = conn.after_commit_hooks, None
+    conn.commit()
+    for hook in hooks:
+        hook()
+
+
+def after_commit(conn: sqlite3.Connection, fn) -> None:
+    """Run fn once the enclosing transaction() commits (now if there is none).
+
+    Inside a transaction that transaction() did not start (sqlite3's implicit
+    one) there is no commit to wait for, and running fn now would publish
+    uncommitted changes — that is a bug in the caller, so it raises.
+    """
+    hooks = getattr(conn, "after_commit_hooks", None)
+    if hooks is not None:
+        hooks.append(fn)
+    elif conn.in_transaction:
+        raise RuntimeError("after_commit() inside a transaction not started by "
+                           "transaction() — commit first or use transaction()")
+    else:
+        fn()
+
+
+def commit_and_invalidate(conn: sqlite3.Connection,
+                          event_id: Optional[int] = None) -> None:
+    """Commit a change to event data, then drop the event caches it affects.
+
+    Dropping them before the commit would let a reader rebuild a cache from
+    the pre-commit snapshot in between and keep it. Inside transaction() the
+    commit is left to the block's owner and the caches go after it.
+    """
+    if getattr(conn, "after_commit_hooks", None) is not None:
+        after_commit(conn, lambda: event_cache.invalidate(conn, event_id))
+        return
+    conn.commit()
+    event_cache.invalidate(conn, event_id)
+
+
+def results_changed(conn: sqlite3.Connection, event_id: int) -> None:
+    """Bump the event's results version when the current transaction commits.
+
+    Bumping after the commit means a reader can never cache pre-commit rows
+    under the new version.
+    """
+    after_commit(conn, lambda: event_cache.bump_results(conn, event_id))
+
+
 SCHEMA_SQL = """
 CREATE TABLE IF NOT EXISTS events (
     id                  INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -133,7 +320,8 @@ CREATE TABLE IF NOT EXISTS punches (
     source          TEXT NOT NULL DEFAULT 'roc',
     roc_punch_id    INTEGER,
     is_duplicate    INTEGER NOT NULL DEFAULT 0,
-    received_at     TEXT DEFAULT (datetime('now'))
+    received_at     TEXT DEFAULT (datetime('now')),
+    punch_ms        INTEGER             -- punch_time as epoch milliseconds
 );
 
 CREATE TABLE IF NOT EXISTS stage_results (
@@ -150,6 +338,8 @@ CREATE TABLE IF NOT EXISTS stage_results (
     status          TEXT NOT NULL DEFAULT 'pending',
     run_state       TEXT NOT NULL DEFAULT 'valid',
     penalty_seconds REAL DEFAULT 0,
+    start_ms        INTEGER,            -- start_time / finish_time as epoch ms
+    finish_ms       INTEGER,
     UNIQUE(event_id, entry_id, stage_id, attempt)
 );
 
@@ -208,6 +398,20 @@ CREATE TABLE IF NOT EXISTS settings (
     key   TEXT PRIMARY KEY,
     value TEXT NOT NULL
 );
+
+-- Best valid time per entry and stage (see core/leaderboard.py)
+CREATE TABLE IF NOT EXISTS stage_leaderboard (
+    event_id        INTEGER NOT NULL,
+    stage_id        INTEGER NOT NULL,
+    entry_id        INTEGER NOT NULL,
+    class_id        INTEGER NOT NULL,
+    best_seconds    REAL NOT NULL,
+    PRIMARY KEY (event_id, stage_id, entry_id)
+);
+CREATE INDEX IF NOT EXISTS idx_stage_leaderboard_rank
+    ON stage_leaderboard(event_id, stage_id, best_seconds);
+CREATE INDEX IF NOT EXISTS idx_stage_leaderboard_class
+    ON stage_leaderboard(event_id, stage_id, class_id, best_seconds);
 """
 
 
@@ -216,6 +420,72 @@ def init_db(conn: sqlite3.Connection) -> None:
     conn.executescript(SCHEMA_SQL)
 
 
+# Versioned migrations, applied by migrate_db() after the column upgrades.
+# PRAGMA user_version holds the last version applied, so each step runs once
+# per database. Append new steps; never edit or reorder applied ones.
+# TEST 37 checks that the hot-path queries use these indexes.
+MIGRATIONS: list[tuple[int, str, list[str]]] = [
+    (1, "indexes for hot-path queries", [
+        # import_roc_punches: already-stored check by roc_punch_id
+        "CREATE INDEX IF NOT EXISTS idx_punches_roc "
+        "ON punches(event_id, roc_punch_id) WHERE roc_punch_id IS NOT NULL",
+        # stage result lists, leaderboard and highlight ranking
+        "CREATE INDEX IF NOT EXISTS idx_stage_results_rank "
+        "ON stage_results(event_id, stage_id, status, run_state, elapsed_seconds)",
+        # dual slalom start grouping
+        "CREATE INDEX IF NOT EXISTS idx_stage_results_start_punch "
+        "ON stage_results(start_punch_id) WHERE start_punch_id IS NOT NULL",
+        # per-entry timed stages (overall results)
+        "CREATE INDEX IF NOT EXISTS idx_course_stages_course "
+        "ON course_stages(course_id, stage_order)",
+        "CREATE INDEX IF NOT EXISTS idx_classes_event ON classes(event_id, name)",
+        "CREATE INDEX IF NOT EXISTS idx_courses_event ON courses(event_id, name)",
+        # sync journal: unsynced rows of an event, in id order
+        "CREATE INDEX IF NOT EXISTS idx_sync_queue_pending ON sync_queue(event_id, synced)",
+        # active event lookup (standings snapshots, race state)
+        "CREATE INDEX IF NOT EXISTS idx_events_status ON events(status)",
+    ]),
+    (2, "millisecond timestamps for existing punches and results", [
+        # julianday() keeps milliseconds exactly; 2440587.5 is 1970-01-01
+        "UPDATE punches SET punch_ms = CAST(ROUND("
+        "(julianday(punch_time) - 2440587.5) * 86400000) AS INTEGER) "
+        "WHERE punch_ms IS NULL",
+        "UPDATE stage_results SET "
+        "start_ms = CAST(ROUND((julianday(start_time) - 2440587.5) * 86400000) AS INTEGER), "
+        "finish_ms = CAST(ROUND((julianday(finish_time) - 2440587.5) * 86400000) AS INTEGER) "
+        "WHERE (start_time IS NOT NULL AND start_ms IS NULL) "
+        "OR (finish_time IS NOT NULL AND finish_ms IS NULL)",
+    ]),
+    (3, "one punch row per ROC punch id", [
+        # Re-downloaded ROC pages used to store the same punch again (as a
+        # duplicate); later copies keep their row but lose the ROC id
+        "UPDATE punches SET roc_punch_id = NULL "
+        "WHERE roc_punch_id IS NOT NULL AND id NOT IN ("
+        "SELECT MIN(id) FROM punches WHERE roc_punch_id IS NOT NULL "
+        "GROUP BY event_id, roc_punch_id)",
+        "DROP INDEX IF EXISTS idx_punches_roc",
+        "CREATE UNIQUE INDEX idx_punches_roc "
+        "ON punches(event_id, roc_punch_id) WHERE roc_punch_id IS NOT NULL",
+    ]),
+]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _apply_migrations(conn: sqlite3.Connection) -> None:
+    current = schema_version(conn)
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        for sql in statements:
+            conn.execute(sql)
+        conn.execute(f"PRAGMA user_version = {version}")
+        conn.commit()
+        logger.info("Schema migration %d applied: %s", version, description)
+
+
 def migrate_db(conn: sqlite3.Connection) -> None:
     """Add new columns to existing tables (idempotent for upgrades)."""
     def _has_column(table: str, column: str) -> bool:
@@ -276,7 +546,41 @@ def migrate_db(conn: sqlite3.Connection) -> None:
     if not _has_column("stage_results", "run_state"):
         conn.execute("ALTER TABLE stage_results ADD COLUMN run_state TEXT NOT NULL DEFAULT 'valid'")
 
+    # integer millisecond timestamps (backfilled by migration 2)
+    if not _has_column("punches", "punch_ms"):
+        conn.execute("ALTER TABLE punches ADD COLUMN punch_ms INTEGER")
+    if not _has_column("stage_results", "start_ms"):
+        conn.execute("ALTER TABLE stage_results ADD COLUMN start_ms INTEGER")
+        conn.execute("ALTER TABLE stage_results ADD COLUMN finish_ms INTEGER")
+
+    # stage_leaderboard: materialized best times (backfilled once for old databases)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stage_leaderboard (
+            event_id        INTEGER NOT NULL,
+            stage_id        INTEGER NOT NULL,
+            entry_id        INTEGER NOT NULL,
+            class_id        INTEGER NOT NULL,
+            best_seconds    REAL NOT NULL,
+            PRIMARY KEY (event_id, stage_id, entry_id)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_stage_leaderboard_rank "
+                 "ON stage_leaderboard(event_id, stage_id, best_seconds)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_stage_leaderboard_class "
+                 "ON stage_leaderboard(event_id, stage_id, class_id, best_seconds)")
+    if conn.execute("SELECT 1 FROM stage_leaderboard LIMIT 1").fetchone() is None:
+        conn.execute("""
+            INSERT INTO stage_leaderboard (event_id, stage_id, entry_id, class_id, best_seconds)
+            SELECT sr.event_id, sr.stage_id, sr.entry_id, e.class_id, MIN(sr.elapsed_seconds)
+            FROM stage_results sr
+            JOIN entries e ON sr.entry_id = e.id
+            WHERE sr.status='ok' AND sr.run_state='valid'
+              AND sr.elapsed_seconds IS NOT NULL
+            GROUP BY sr.event_id, sr.stage_id, sr.entry_id
+        """)
+
     conn.commit()
+    _apply_migrations(conn)
 
 
 # ======================================================================
@@ -298,12 +602,36 @@ def set_setting(conn: sqlite3.Connection, key: str, value: str) -> None:
     conn.commit()
 
 
+def _roc_cursor_key(event_id: int, competition_id: str) -> str:
+    return f"roc_last_id:{event_id}:{competition_id}"
+
+
+def get_roc_cursor(conn: sqlite3.Connection, event_id: int,
+                   competition_id: str) -> int:
+    """Highest ROC punch id already stored for an event's competition (0: none)."""
+    return int(get_setting(conn, _roc_cursor_key(event_id, competition_id), "0"))
+
+
+def save_roc_cursor(conn: sqlite3.Connection, event_id: int,
+                    competition_id: str, last_id: int) -> None:
+    """Advance the persisted ROC cursor (never moves it back).
+
+    Does not commit — call in the transaction that stores the punches.
+    """
+    conn.execute(
+        """INSERT INTO settings (key, value) VALUES (?, ?)
+           ON CONFLICT(key) DO UPDATE SET value=excluded.value
+           WHERE CAST(settings.value AS INTEGER) < CAST(excluded.value AS INTEGER)""",
+        (_roc_cursor_key(event_id, competition_id), str(last_id))
+    )
+
+
 # ======================================================================
 # SYNC JOURNAL (outbound event log for TheHUB sync)
 # ======================================================================
 
 def journal_event(conn: sqlite3.Connection, event_id: int,
-                  data_type: str, data: dict) -> int:
+                  data_type: str, data: dict, commit: bool = True) -> int:
     """Record an event in the sync journal (sync_queue).
 
     Each mutation creates a journal entry. TheHUB sync (Phase 3) reads:
@@ -313,13 +641,17 @@ def journal_event(conn: sqlite3.Connection, event_id: int,
         run_created, run_superseded, chip_changed,
         status_changed, penalty_added, manual_punch
 
+    commit=False leaves the row in the caller's open transaction (used by
+    the timing engine so a punch and its journal rows commit together).
+
     Returns the journal entry id.
     """
     cur = conn.execute(
         "INSERT INTO sync_queue (event_id, data_type, data_json) VALUES (?, ?, ?)",
         (event_id, data_type, json.dumps(data))
     )
-    conn.commit()
+    if commit:
+        conn.commit()
     return cur.lastrowid
 
 
@@ -366,7 +698,7 @@ def create_control(conn: sqlite3.Connection, event_id: int, code: int,
         "INSERT INTO controls (event_id, code, name, type) VALUES (?, ?, ?, ?)",
         (event_id, code, name, ctrl_type)
     )
-    conn.commit()
+    commit_and_invalidate(conn, event_id)
     return cur.lastrowid
 
 
@@ -381,7 +713,7 @@ def create_stage(conn: sqlite3.Connection, event_id: int, stage_number: int,
         (event_id, stage_number, name, start_control_id, finish_control_id,
          is_timed, runs_to_count, max_runs)
     )
-    conn.commit()
+    commit_and_invalidate(conn, event_id)
     return cur.lastrowid
 
 
@@ -393,7 +725,7 @@ def create_course(conn: sqlite3.Connection, event_id: int, name: str,
            VALUES (?, ?, ?, ?, ?)""",
         (event_id, name, laps, stages_any_order, allow_repeat)
     )
-    conn.commit()
+    commit_and_invalidate(conn, event_id)
     return cur.lastrowid
 
 
@@ -403,7 +735,7 @@ def link_course_stage(conn: sqlite3.Connection, course_id: int,
         "INSERT INTO course_stages (course_id, stage_id, stage_order) VALUES (?, ?, ?)",
         (course_id, stage_id, stage_order)
     )
-    conn.commit()
+    commit_and_invalidate(conn)
 
 
 def unlink_course_stage(conn: sqlite3.Connection, course_id: int,
@@ -412,7 +744,7 @@ def unlink_course_stage(conn: sqlite3.Connection, course_id: int,
         "DELETE FROM course_stages WHERE course_id=? AND stage_id=?",
         (course_id, stage_id)
     )
-    conn.commit()
+    commit_and_invalidate(conn)
 
 
 def reorder_course_stages(conn: sqlite3.Connection, course_id: int,
@@ -424,7 +756,7 @@ def reorder_course_stages(conn: sqlite3.Connection, course_id: int,
             "INSERT INTO course_stages (course_id, stage_id, stage_order) VALUES (?, ?, ?)",
             (course_id, sid, i)
         )
-    conn.commit()
+    commit_and_invalidate(conn)
 
 
 def create_class(conn: sqlite3.Connection, event_id: int, course_id: int,
@@ -433,7 +765,7 @@ def create_class(conn: sqlite3.Connection, event_id: int, course_id: int,
         "INSERT INTO classes (event_id, course_id, name, mass_start_time) VALUES (?, ?, ?, ?)",
         (event_id, course_id, name, mass_start_time)
     )
-    conn.commit()
+    commit_and_invalidate(conn, event_id)
     return cur.lastrowid
 
 
@@ -445,7 +777,7 @@ def create_entry(conn: sqlite3.Connection, event_id: int, bib: int,
            VALUES (?, ?, ?, ?, ?, ?)""",
         (event_id, bib, first_name, last_name, club, class_id)
     )
-    conn.commit()
+    commit_and_invalidate(conn, event_id)
     return cur.lastrowid
 
 
@@ -455,7 +787,7 @@ def create_chip_mapping(conn: sqlite3.Connection, event_id: int, bib: int,
         "INSERT INTO chip_mapping (event_id, bib, siac, is_primary) VALUES (?, ?, ?, ?)",
         (event_id, bib, siac, is_primary)
     )
-    conn.commit()
+    commit_and_invalidate(conn, event_id)
     return cur.lastrowid
 
 
@@ -504,6 +836,7 @@ def delete_event(conn: sqlite3.Connection, event_id: int) -> None:
     # 1. Results (depend on entries, stages, punches)
     conn.execute("DELETE FROM overall_results WHERE event_id=?", (event_id,))
     conn.execute("DELETE FROM stage_results WHERE event_id=?", (event_id,))
+    conn.execute("DELETE FROM stage_leaderboard WHERE event_id=?", (event_id,))
 
     # 2. Auxiliary tables
     conn.execute("DELETE FROM sync_queue WHERE event_id=?", (event_id,))
@@ -538,7 +871,7 @@ def delete_event(conn: sqlite3.Connection, event_id: int) -> None:
 
     # 12. Event itself
     conn.execute("DELETE FROM events WHERE id=?", (event_id,))
-    conn.commit()
+    commit_and_invalidate(conn, event_id)
 
 
 def get_stages(conn: sqlite3.Connection, event_id: int) -> list[sqlite3.Row]:
@@ -575,38 +908,47 @@ def get_punches(conn: sqlite3.Connection, event_id: int) -> list[sqlite3.Row]:
 
 
 def get_stage_results(conn: sqlite3.Connection, event_id: int,
-                      stage_id: Optional[int] = None) -> list:
+                      stage_id: Optional[int] = None,
+                      class_name: Optional[str] = None) -> list:
+    where, params = "sr.event_id=?", [event_id]
+    if class_name:
+        where += " AND cl.name=?"
+        params.append(class_name)
     if stage_id:
         return conn.execute(
-            """SELECT sr.*, e.bib, e.first_name, e.last_name, e.club, cl.name as class_name
+            f"""SELECT sr.*, e.bib, e.first_name, e.last_name, e.club, cl.name as class_name
                FROM stage_results sr
                JOIN entries e ON sr.entry_id = e.id
                JOIN classes cl ON e.class_id = cl.id
-               WHERE sr.event_id=? AND sr.stage_id=?
+               WHERE {where} AND sr.stage_id=?
                ORDER BY sr.status ASC, sr.elapsed_seconds ASC""",
-            (event_id, stage_id)
+            (*params, stage_id)
         ).fetchall()
     return conn.execute(
-        """SELECT sr.*, e.bib, e.first_name, e.last_name, e.club, cl.name as class_name
+        f"""SELECT sr.*, e.bib, e.first_name, e.last_name, e.club, cl.name as class_name
            FROM stage_results sr
            JOIN entries e ON sr.entry_id = e.id
            JOIN classes cl ON e.class_id = cl.id
-           WHERE sr.event_id=?
+           WHERE {where}
            ORDER BY sr.stage_id, sr.status ASC, sr.elapsed_seconds ASC""",
-        (event_id,)
+        params
     ).fetchall()
 
 
-def get_overall_results(conn: sqlite3.Connection,
-                        event_id: int) -> list[sqlite3.Row]:
+def get_overall_results(conn: sqlite3.Connection, event_id: int,
+                        class_name: Optional[str] = None) -> list[sqlite3.Row]:
+    where, params = "o.event_id=?", [event_id]
+    if class_name:
+        where += " AND cl.name=?"
+        params.append(class_name)
     return conn.execute(
-        """SELECT o.*, e.bib, e.first_name, e.last_name, e.club, cl.name as class_name
+        f"""SELECT o.*, e.bib, e.first_name, e.last_name, e.club, cl.name as class_name
            FROM overall_results o
            JOIN entries e ON o.entry_id = e.id
            JOIN classes cl ON e.class_id = cl.id
-           WHERE o.event_id=?
+           WHERE {where}
            ORDER BY cl.name, o.status ASC, o.total_seconds ASC""",
-        (event_id,)
+        params
     ).fetchall()
 
 
@@ -644,7 +986,7 @@ def update_event(conn: sqlite3.Connection, event_id: int, **kwargs) -> None:
     sets = ", ".join(f"{k}=?" for k in kwargs)
     vals = list(kwargs.values()) + [event_id]
     conn.execute(f"UPDATE events SET {sets}, updated_at=datetime('now') WHERE id=?", vals)
-    conn.commit()
+    commit_and_invalidate(conn, event_id)
 
 
 def update_control(conn: sqlite3.Connection, control_id: int, **kwargs) -> None:
@@ -653,7 +995,7 @@ def update_control(conn: sqlite3.Connection, control_id: int, **kwargs) -> None:
     sets = ", ".join(f"{k}=?" for k in kwargs)
     vals = list(kwargs.values()) + [control_id]
     conn.execute(f"UPDATE controls SET {sets} WHERE id=?", vals)
-    conn.commit()
+    commit_and_invalidate(conn)
 
 
 def update_stage(conn: sqlite3.Connection, stage_id: int, **kwargs) -> None:
@@ -662,7 +1004,7 @@ def update_stage(conn: sqlite3.Connection, stage_id: int, **kwargs) -> None:
     sets = ", ".join(f"{k}=?" for k in kwargs)
     vals = list(kwargs.values()) + [stage_id]
     conn.execute(f"UPDATE stages SET {sets} WHERE id=?", vals)
-    conn.commit()
+    commit_and_invalidate(conn)
 
 
 def update_course(conn: sqlite3.Connection, course_id: int, **kwargs) -> None:
@@ -671,7 +1013,7 @@ def update_course(conn: sqlite3.Connection, course_id: int, **kwargs) -> None:
     sets = ", ".join(f"{k}=?" for k in kwargs)
     vals = list(kwargs.values()) + [course_id]
     conn.execute(f"UPDATE courses SET {sets} WHERE id=?", vals)
-    conn.commit()
+    commit_and_invalidate(conn)
 
 
 def update_class(conn: sqlite3.Connection, class_id: int, **kwargs) -> None:
@@ -680,7 +1022,7 @@ def update_class(conn: sqlite3.Connection, class_id: int, **kwargs) -> None:
     sets = ", ".join(f"{k}=?" for k in kwargs)
     vals = list(kwargs.values()) + [class_id]
     conn.execute(f"UPDATE classes SET {sets} WHERE id=?", vals)
-    conn.commit()
+    commit_and_invalidate(conn)
 
 
 # ======================================================================
@@ -696,7 +1038,7 @@ def delete_control(conn: sqlite3.Connection, control_id: int) -> tuple[bool, str
     if ref:
         return False, "Kontrollen används av en stage — ta bort stagen först"
     conn.execute("DELETE FROM controls WHERE id=?", (control_id,))
-    conn.commit()
+    commit_and_invalidate(conn)
     return True, ""
 
 
@@ -710,7 +1052,7 @@ def delete_stage(conn: sqlite3.Connection, stage_id: int) -> tuple[bool, str]:
     # Remove from course_stages
     conn.execute("DELETE FROM course_stages WHERE stage_id=?", (stage_id,))
     conn.execute("DELETE FROM stages WHERE id=?", (stage_id,))
-    conn.commit()
+    commit_and_invalidate(conn)
     return True, ""
 
 
@@ -723,7 +1065,7 @@ def delete_course(conn: sqlite3.Connection, course_id: int) -> tuple[bool, str]:
         return False, "Banan har klasser kopplade — ta bort klasserna först"
     conn.execute("DELETE FROM course_stages WHERE course_id=?", (course_id,))
     conn.execute("DELETE FROM courses WHERE id=?", (course_id,))
-    conn.commit()
+    commit_and_invalidate(conn)
     return True, ""
 
 
@@ -735,7 +1077,7 @@ def delete_class(conn: sqlite3.Connection, class_id: int) -> tuple[bool, str]:
     if ref:
         return False, "Klassen har anmälda åkare — kan inte tas bort"
     conn.execute("DELETE FROM classes WHERE id=?", (class_id,))
-    conn.commit()
+    commit_and_invalidate(conn)
     return True, ""
 
 
@@ -743,12 +1085,12 @@ def delete_class(conn: sqlite3.Connection, class_id: int) -> tuple[bool, str]:
 
 def delete_controls_for_event(conn: sqlite3.Connection, event_id: int) -> None:
     conn.execute("DELETE FROM controls WHERE event_id=?", (event_id,))
-    conn.commit()
+    commit_and_invalidate(conn, event_id)
 
 
 def delete_stages_for_event(conn: sqlite3.Connection, event_id: int) -> None:
     conn.execute("DELETE FROM stages WHERE event_id=?", (event_id,))
-    conn.commit()
+    commit_and_invalidate(conn, event_id)
 
 
 def delete_courses_for_event(conn: sqlite3.Connection, event_id: int) -> None:
@@ -758,12 +1100,12 @@ def delete_courses_for_event(conn: sqlite3.Connection, event_id: int) -> None:
     for cid in course_ids:
         conn.execute("DELETE FROM course_stages WHERE course_id=?", (cid,))
     conn.execute("DELETE FROM courses WHERE event_id=?", (event_id,))
-    conn.commit()
+    commit_and_invalidate(conn, event_id)
 
 
 def delete_classes_for_event(conn: sqlite3.Connection, event_id: int) -> None:
     conn.execute("DELETE FROM classes WHERE event_id=?", (event_id,))
-    conn.commit()
+    commit_and_invalidate(conn, event_id)
 
 
 def clear_event_structure(conn: sqlite3.Connection, event_id: int) -> None:
@@ -913,6 +1255,7 @@ def restore_backup(backup_filename: str) -> bool:
     dst_conn.close()
     src_conn.close()
 
+    event_cache.invalidate_all()
     return True
 
 
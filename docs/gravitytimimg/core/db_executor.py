@@ -0,0 +1,56 @@
+"""
+db_executor.py — Run blocking SQLite / timing-engine work off the event loop.
+
+All FastAPI routes are async, but sqlite3 and the timing engine are
+synchronous. Heavy calls (punch ingestion, overall recompute, recalculate
+all, exports, result lists) are handed to one of two thread pools:
+
+- writer: the single-writer ingestion queue (core/ingest_queue.py), so
+  writes from every source are applied in order on one connection and
+  never fight over the SQLite write lock
+- readers: a small thread pool for read-only queries (WAL lets them run
+  while the writer is busy), using pooled connections from get_pool(),
+  which refuse writes
+
+The callable receives the connection as its first argument.
+
+Usage:
+    rows = await run_read(get_overall_results, event_id)
+    await run_write(recalculate_all, event_id)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from core.database import get_pool
+from core.ingest_queue import ingest_queue
+
+T = TypeVar("T")
+
+READ_WORKERS = 4
+
+_readers = ThreadPoolExecutor(max_workers=READ_WORKERS,
+                              thread_name_prefix="gt-db-reader")
+
+
+def _call_with_connection(fn: Callable[..., T], args: tuple, kwargs: dict) -> T:
+    with get_pool().connection() as conn:
+        return fn(conn, *args, **kwargs)
+
+
+async def run_write(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Queue fn(conn, *args, **kwargs) on the single writer (source "admin")."""
+    return await ingest_queue.submit("admin", fn, *args, **kwargs)
+
+
+async def run_read(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run fn(conn, *args, **kwargs) on the reader pool (no writes!)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _readers, functools.partial(_call_with_connection, fn, args, kwargs)
+    )
+
@@ -0,0 +1,81 @@
+"""
+dedup.py — In-memory index for punch deduplication.
+
+A punch is a duplicate when the same BIB (or, for an unmapped chip, the
+same SIAC) already has a non-duplicate punch on the same control within
+±DEDUP_WINDOW_MS, unless the new punch comes from a higher-priority source.
+For every (BIB-or-SIAC, control code) the index keeps the non-duplicate
+punches as a sorted list of (punch_ms, source priority), so the check is a
+binary search whatever the size of the event.
+
+- Built from the punches table on first use (event_cache slot "dedup") and
+  warmed for active events at startup.
+- The timing engine calls add() right after inserting a non-duplicate punch,
+  in the same transaction. Chip mapping changes and rollbacks drop the
+  event's caches, so keys never outlive the BIB mapping they were built for.
+"""
+
+from __future__ import annotations
+
+import bisect
+import sqlite3
+import threading
+
+from core.event_cache import EventStructure, cached, get_structure
+
+SLOT = "dedup"
+
+Key = tuple[str, int, int]   # ("bib" | "siac", number, control_code)
+
+
+def dedup_key(structure: EventStructure, siac: int, control_code: int) -> Key:
+    """Punches of every chip of a BIB share a key; unmapped chips are per SIAC."""
+    bib = structure.bib_by_siac.get(siac)
+    if bib is None:
+        return "siac", siac, control_code
+    return "bib", bib, control_code
+
+
+class DedupIndex:
+    """Non-duplicate punch times per key, sorted. Lookups are O(log n)."""
+
+    def __init__(self, punches: dict[Key, list[tuple[int, int]]] | None = None):
+        self.lock = threading.Lock()
+        self._punches = punches or {}   # key → sorted [(punch_ms, priority)]
+
+    def add(self, key: Key, punch_ms: int, priority: int) -> None:
+        with self.lock:
+            bisect.insort(self._punches.setdefault(key, []), (punch_ms, priority))
+
+    def best_priority(self, key: Key, start_ms: int, end_ms: int) -> int | None:
+        """Best (lowest) source priority in [start_ms, end_ms], None if no punch."""
+        with self.lock:
+            punches = self._punches.get(key)
+            if not punches:
+                return None
+            lo = bisect.bisect_left(punches, (start_ms,))
+            hi = bisect.bisect_left(punches, (end_ms + 1,))
+            return min((p for _, p in punches[lo:hi]), default=None)
+
+
+def load_dedup_index(conn: sqlite3.Connection, event_id: int) -> DedupIndex:
+    from core.timing_engine import SOURCE_PRIORITY
+
+    structure = get_structure(conn, event_id)
+    punches: dict[Key, list[tuple[int, int]]] = {}
+    for r in conn.execute(
+        "SELECT siac, control_code, punch_ms, source FROM punches "
+        "WHERE event_id=? AND is_duplicate=0",
+        (event_id,)
+    ):
+        key = dedup_key(structure, r["siac"], r["control_code"])
+        punches.setdefault(key, []).append(
+            (r["punch_ms"], SOURCE_PRIORITY.get(r["source"], 99)))
+    for times in punches.values():
+        times.sort()
+    return DedupIndex(punches)
+
+
+def get_dedup_index(conn: sqlite3.Connection, event_id: int) -> DedupIndex:
+    """Cached dedup index for an event."""
+    return cached(conn, event_id, SLOT, load_dedup_index)
@@ -0,0 +1,222 @@
+"""
+event_cache.py — Per-event in-memory caches for the timing engine hot path.
+
+Caches are keyed by database file + event id, so separate databases (tests,
+restored backups) never share entries. Each event holds named slots; the
+"structure" slot holds chip→BIB→entry maps and the control code→stage map
+that every punch needs.
+
+CRUD functions in database.py call invalidate() whenever the data behind a
+slot changes, once the change is committed (database.commit_and_invalidate).
+This module must not import database.py (it is imported by it).
+
+Results versions: a counter per event that moves whenever its stage or
+overall results may have changed (bump_results(), called by the timing
+engine after commit, and any full invalidate()). results_cache.py keys
+the serialized results endpoints on it.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+from typing import Any, Callable, Optional
+
+_lock = threading.RLock()
+_caches: dict[tuple[str, int], dict[str, Any]] = {}
+
+# (db, event_id) → counter value of its last invalidate(); event_id None is
+# the whole database and ("", None) invalidate_all(). A build that started
+# before one of these moved is not stored.
+_invalidated: dict[tuple[str, Optional[int]], int] = {}
+_invalidation_counter = 0
+
+# (db, event_id) → version; event_id None is a bump for the whole database
+_results_versions: dict[tuple[str, Optional[int]], int] = {}
+_results_counter = 0
+
+
+def db_key(conn: sqlite3.Connection) -> str:
+    """Stable identity for the database file behind a connection."""
+    key = getattr(conn, "db_key", None)
+    if key is not None:
+        return key
+    row = conn.execute("PRAGMA database_list").fetchone()
+    path = row[2] if row else ""
+    # In-memory databases have no file — scope them to the connection
+    return path or f"memory:{id(conn)}"
+
+
+def _generation(dbk: str, event_id: int) -> int:
+    return max(_invalidated.get((dbk, event_id), 0),
+               _invalidated.get((dbk, None), 0),
+               _invalidated.get(("", None), 0))
+
+
+def cached(conn: sqlite3.Connection, event_id: int, slot: str,
+           build: Callable[[sqlite3.Connection, int], Any]) -> Any:
+    """Return the cached value for (db, event, slot), building it on a miss.
+
+    The build runs outside the lock. If another thread stored the slot in
+    the meantime, that value wins (it may have been updated in place since);
+    if the event was invalidated in the meantime, the build may predate the
+    change and is returned without being stored.
+    """
+    dbk = db_key(conn)
+    key = (dbk, event_id)
+    with _lock:
+        slots = _caches.get(key)
+        if slots is not None and slot in slots:
+            return slots[slot]
+        generation = _generation(dbk, event_id)
+    value = build(conn, event_id)
+    with _lock:
+        if _generation(dbk, event_id) != generation:
+            return value
+        return _caches.setdefault(key, {}).setdefault(slot, value)
+
+
+def invalidate(conn: sqlite3.Connection, event_id: Optional[int] = None,
+               slot: Optional[str] = None) -> None:
+    """Drop cached data for one event (or every event in this database).
+
+    slot: only drop this slot; None drops all slots of the matched events.
+    """
+    global _invalidation_counter
+    dbk = db_key(conn)
+    with _lock:
+        _invalidation_counter += 1
+        _invalidated[(dbk, event_id)] = _invalidation_counter
+        for key in list(_caches):
+            if key[0] != dbk or (event_id is not None and key[1] != event_id):
+                continue
+            if slot is None:
+                del _caches[key]
+            else:
+                _caches[key].pop(slot, None)
+        if slot is None:
+            _bump(dbk, event_id)
+
+
+def invalidate_all() -> None:
+    """Drop every cache (e.g. after a database restore)."""
+    global _invalidation_counter
+    with _lock:
+        _caches.clear()
+        _results_versions.clear()
+        _invalidation_counter += 1
+        _invalidated.clear()
+        _invalidated[("", None)] = _invalidation_counter
+        _bump("", None)
+
+
+# ---------------------------------------------------------------------------
+# Results versions
+# ---------------------------------------------------------------------------
+
+def _bump(dbk: str, event_id: Optional[int]) -> None:
+    global _results_counter
+    with _lock:
+        _results_counter += 1
+        _results_versions[(dbk, event_id)] = _results_counter
+
+
+def bump_results(conn: sqlite3.Connection, event_id: Optional[int] = None) -> None:
+    """Mark the results of one event (or the whole database) as changed."""
+    _bump(db_key(conn), event_id)
+
+
+def results_generation() -> int:
+    """Moves on every results bump in any database (cheap "anything new?" check)."""
+    return _results_counter
+
+
+def results_version(dbk: str, event_id: int) -> int:
+    """Current results version of an event; changes on every bump that covers it."""
+    with _lock:
+        return max(_results_versions.get((dbk, event_id), 0),
+                   _results_versions.get((dbk, None), 0),
+                   _results_versions.get(("", None), 0))
+
+
+# ---------------------------------------------------------------------------
+# Event structure
+# ---------------------------------------------------------------------------
+
+class EventStructure:
+    """Snapshot of the lookups needed to process one punch (treat as read-only).
+
+    Stages are plain dicts with the same keys as the `stages` table.
+    """
+
+    def __init__(self):
+        self.bib_by_siac: dict[int, int] = {}
+        self.chips_by_bib: dict[int, list[dict]] = {}
+        self.entry_by_bib: dict[int, dict] = {}
+        self.entry_by_id: dict[int, dict] = {}
+        self.stage_by_code: dict[int, dict] = {}
+        self.stage_codes: dict[int, tuple[int, int]] = {}
+        self.control_type_by_code: dict[int, str] = {}
+        self.stages: list[dict] = []
+
+    def siacs_for_bib(self, bib: int) -> list[int]:
+        """All SIACs of a BIB, primary chip first."""
+        return [c["siac"] for c in self.chips_by_bib.get(bib, [])]
+
+    def entry_for_siac(self, siac: int) -> Optional[dict]:
+        bib = self.bib_by_siac.get(siac)
+        if bib is None:
+            return None
+        return self.entry_by_bib.get(bib)
+
+
+def load_structure(conn: sqlite3.Connection, event_id: int) -> EventStructure:
+    """Build an EventStructure with one query per table."""
+    s = EventStructure()
+
+    for r in conn.execute(
+        "SELECT siac, bib, is_primary FROM chip_mapping WHERE event_id=? "
+        "ORDER BY is_primary DESC, id ASC",
+        (event_id,)
+    ).fetchall():
+        s.bib_by_siac[r["siac"]] = r["bib"]
+        s.chips_by_bib.setdefault(r["bib"], []).append(
+            {"siac": r["siac"], "is_primary": r["is_primary"]}
+        )
+
+    for r in conn.execute(
+        """SELECT e.*, c.name as class_name FROM entries e
+           JOIN classes c ON e.class_id = c.id
+           WHERE e.event_id=?""",
+        (event_id,)
+    ).fetchall():
+        entry = dict(r)
+        s.entry_by_bib[r["bib"]] = entry
+        s.entry_by_id[r["id"]] = entry
+
+    code_by_control_id = {}
+    for r in conn.execute(
+        "SELECT id, code, type FROM controls WHERE event_id=?", (event_id,)
+    ).fetchall():
+        code_by_control_id[r["id"]] = r["code"]
+        s.control_type_by_code[r["code"]] = r["type"]
+
+    for r in conn.execute(
+        "SELECT * FROM stages WHERE event_id=? ORDER BY id", (event_id,)
+    ).fetchall():
+        stage = dict(r)
+        s.stages.append(stage)
+        start_code = code_by_control_id.get(stage["start_control_id"])
+        finish_code = code_by_control_id.get(stage["finish_control_id"])
+        s.stage_codes[stage["id"]] = (start_code, finish_code)
+        # First stage using a code wins (same as the old LIMIT 1 lookup)
+        for code in (start_code, finish_code):
+            if code is not None and code not in s.stage_by_code:
+                s.stage_by_code[code] = stage
+
+    return s
+
+
+def get_structure(conn: sqlite3.Connection, event_id: int) -> EventStructure:
+    """Cached EventStructure for an event."""
+    return cached(conn, event_id, "structure", load_structure)
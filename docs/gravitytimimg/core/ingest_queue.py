@@ -0,0 +1,204 @@
+"""
+ingest_queue.py — Single-writer ingestion queue.
+
+Every write to the timing database goes through one asyncio queue: punches
+from the ROC poller, manual punches, (later) USB/SIRAP, and admin jobs
+(every mutating API route, imports, recalculate-all) via run_write(). One
+consumer task takes jobs in arrival order and runs them on one writer
+thread that holds the only write connection; pooled connections are
+read-only (PRAGMA query_only), so sources never fight over the SQLite
+write lock and the event loop never waits on it.
+
+Depth and latency are exposed through stats() (GET /api/ingest/status).
+
+Usage:
+    result = await ingest_queue.submit("roc", apply_fn, event_id, punches)
+    # apply_fn(conn, event_id, punches) runs on the writer thread
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from core import event_cache
+from core.database import get_connection, get_db_path
+
+logger = logging.getLogger("gravitytiming.ingest")
+
+LATENCY_WINDOW = 500  # recent jobs kept for avg / p95
+
+
+@dataclass
+class _Job:
+    source: str
+    fn: Callable[..., Any]
+    args: tuple
+    kwargs: dict
+    future: asyncio.Future
+    enqueued: float = field(default_factory=time.perf_counter)
+
+
+class IngestQueue:
+    """Ordered single-writer job queue (see module docstring)."""
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1,
+                                            thread_name_prefix="gt-db-writer")
+        self._conn = None  # only touched on the writer thread
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self._submitted = 0
+        self._processed = 0
+        self._failed = 0
+        self._max_depth = 0
+        self._by_source: dict[str, int] = {}
+        self._latency_ms: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._wait_ms: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._last_latency_ms: Optional[float] = None
+
+    # ─── Lifecycle ───────────────────────────────────────────────────
+
+    def start(self) -> None:
+        """Start the consumer on the running event loop (idempotent)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task and not self._task.done():
+            return
+        self._queue = asyncio.Queue()
+        self._loop = loop
+        self._task = loop.create_task(self._consume())
+
+    async def stop(self) -> None:
+        """Finish queued jobs, then stop the consumer and close the connection."""
+        if self._task and not self._task.done():
+            await self._queue.join()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._close_connection
+        )
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    # ─── Submitting ──────────────────────────────────────────────────
+
+    async def submit(self, source: str, fn: Callable[..., Any],
+                     *args: Any, **kwargs: Any) -> Any:
+        """Queue fn(conn, *args, **kwargs) and wait for its result.
+
+        source labels the job in stats ("roc", "manual", "usb", "admin").
+        Exceptions raised by fn are re-raised here.
+        """
+        self.start()
+        job = _Job(source, fn, args, kwargs, self._loop.create_future())
+        self._submitted += 1
+        self._by_source[source] = self._by_source.get(source, 0) + 1
+        self._queue.put_nowait(job)
+        self._max_depth = max(self._max_depth, self._queue.qsize())
+        return await job.future
+
+    # ─── Consumer ────────────────────────────────────────────────────
+
+    async def _consume(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            started = time.perf_counter()
+            try:
+                result = await loop.run_in_executor(
+                    self._executor, self._run, job.fn, job.args, job.kwargs
+                )
+            except Exception as e:
+                self._failed += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+                else:
+                    logger.error("Ingest job (%s) failed: %s", job.source, e)
+            else:
+                if not job.future.done():
+                    job.future.set_result(result)
+            finally:
+                done = time.perf_counter()
+                self._processed += 1
+                self._wait_ms.append((started - job.enqueued) * 1000)
+                self._last_latency_ms = (done - job.enqueued) * 1000
+                self._latency_ms.append(self._last_latency_ms)
+                self._queue.task_done()
+
+    def _run(self, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        conn = self._writer_connection()
+        try:
+            return fn(conn, *args, **kwargs)
+        finally:
+            # Same outcome as closing a per-request connection: uncommitted
+            # work is discarded instead of blocking every later job
+            if conn.in_transaction:
+                logger.warning("Ingest job left a transaction open — rolled back")
+                conn.rollback()
+                # As transaction() does: caches may hold rows that were rolled back
+                event_cache.invalidate(conn)
+
+    def _writer_connection(self):
+        """The long-lived write connection (reopened if the db path changed)."""
+        path = str(Path(get_db_path()).resolve())
+        if self._conn is not None and self._conn.db_key != path:
+            self._close_connection()
+        if self._conn is None:
+            self._conn = get_connection()
+        return self._conn
+
+    def _close_connection(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # ─── Metrics ─────────────────────────────────────────────────────
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latency_ms)
+        waits = list(self._wait_ms)
+
+        def p95(values: list[float]) -> Optional[float]:
+            if not values:
+                return None
+            return round(values[min(len(values) - 1, int(len(values) * 0.95))], 2)
+
+        return {
+            "is_running": self.is_running,
+            "depth": self.depth,
+            "max_depth": self._max_depth,
+            "submitted": self._submitted,
+            "processed": self._processed,
+            "failed": self._failed,
+            "by_source": dict(self._by_source),
+            "latency_ms": {
+                "last": round(self._last_latency_ms, 2)
+                        if self._last_latency_ms is not None else None,
+                "avg": round(sum(latencies) / len(latencies), 2) if latencies else None,
+                "p95": p95(latencies),
+                "max": round(latencies[-1], 2) if latencies else None,
+            },
+            "wait_ms_avg": round(sum(waits) / len(waits), 2) if waits else None,
+        }
+
+
+# Singleton queue (one writer per process)
+ingest_queue = IngestQueue()
@@ -0,0 +1,305 @@
+"""
+leaderboard.py — Materialized per-stage leaderboards.
+
+For every stage, and every (stage, class), the best valid time per entry is
+kept in a sorted list. A finish punch gets its position, gap to the leader
+and neighbours through a binary search instead of scanning every result of
+the stage.
+
+- In memory: event_cache slot "leaderboards", built on first use from the
+  stage_leaderboard table.
+- Persisted: stage_leaderboard holds one row per (event, stage, entry) with
+  the best time. The timing engine calls refresh_entry() in the same
+  transaction as the stage result; the in-memory boards are updated once
+  that transaction commits, so readers never see uncommitted standings.
+
+Ties share a position (two riders on 45.0s are both 3rd).
+
+Overall standings (event_cache slot "standings") keep the ok totals of
+overall_results per class in the same sorted lists, so re-ranking after a
+punch touches only the places that moved. Only the writer uses them: they
+are updated in place inside the transaction, like the dedup index, and
+rollbacks drop the event's caches. Overall positions are sequential, ties
+ordered by entry id.
+"""
+
+from __future__ import annotations
+
+import bisect
+import sqlite3
+import threading
+from typing import Optional
+
+from core.database import after_commit
+from core.event_cache import cached, invalidate
+
+SLOT = "leaderboards"
+STANDINGS_SLOT = "standings"
+
+
+class Leaderboard:
+    """Entries sorted by best time. Lookups are O(log n).
+
+    Inserts use bisect.insort, so the search is logarithmic and the list
+    shift is a single memmove.
+    """
+
+    def __init__(self):
+        self._keys: list[tuple[float, int]] = []   # (seconds, entry_id), sorted
+        self._best: dict[int, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, entry_id: int) -> bool:
+        return entry_id in self._best
+
+    def best(self, entry_id: int) -> Optional[float]:
+        return self._best.get(entry_id)
+
+    def set(self, entry_id: int, seconds: Optional[float]) -> None:
+        """Insert, move or (seconds=None) remove an entry."""
+        old = self._best.get(entry_id)
+        if old == seconds:
+            return
+        if old is not None:
+            i = bisect.bisect_left(self._keys, (old, entry_id))
+            del self._keys[i]
+            del self._best[entry_id]
+        if seconds is not None:
+            bisect.insort(self._keys, (seconds, entry_id))
+            self._best[entry_id] = seconds
+
+    def rank(self, entry_id: int) -> Optional[int]:
+        """1-based position (shared on ties), None if the entry has no time."""
+        seconds = self._best.get(entry_id)
+        if seconds is None:
+            return None
+        return bisect.bisect_left(self._keys, (seconds,)) + 1
+
+    def index(self, entry_id: int) -> Optional[int]:
+        """0-based place in the sorted list (ties ordered by entry id)."""
+        seconds = self._best.get(entry_id)
+        if seconds is None:
+            return None
+        return bisect.bisect_left(self._keys, (seconds, entry_id))
+
+    def entries(self, start: int = 0, stop: Optional[int] = None) -> list[tuple[int, float]]:
+        """(entry_id, seconds) of the places start..stop-1."""
+        return [(e, s) for s, e in self._keys[start:stop]]
+
+    def leader(self) -> Optional[tuple[int, float]]:
+        """(entry_id, seconds) of the fastest entry."""
+        if not self._keys:
+            return None
+        seconds, entry_id = self._keys[0]
+        return entry_id, seconds
+
+    def standing(self, entry_id: int, neighbours: int = 1) -> Optional[dict]:
+        """Position, gap to leader and the nearest entries ahead / behind.
+
+        ahead / behind are lists of (entry_id, seconds), closest first.
+        """
+        seconds = self._best.get(entry_id)
+        if seconds is None:
+            return None
+        i = bisect.bisect_left(self._keys, (seconds, entry_id))
+        ahead = self._keys[max(0, i - neighbours):i]
+        behind = self._keys[i + 1:i + 1 + neighbours]
+        return {
+            "position": bisect.bisect_left(self._keys, (seconds,)) + 1,
+            "seconds": seconds,
+            "gap": seconds - self._keys[0][0],
+            "size": len(self._keys),
+            "ahead": [(e, s) for s, e in reversed(ahead)],
+            "behind": [(e, s) for s, e in behind],
+        }
+
+
+class EventLeaderboards:
+    """All leaderboards of one event: per stage and per (stage, class)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._stages: dict[int, Leaderboard] = {}
+        self._classes: dict[tuple[int, int], Leaderboard] = {}
+
+    def apply(self, stage_id: int, entry_id: int, class_id: int,
+              seconds: Optional[float]) -> None:
+        with self.lock:
+            self._stages.setdefault(stage_id, Leaderboard()).set(entry_id, seconds)
+            self._classes.setdefault((stage_id, class_id), Leaderboard()).set(
+                entry_id, seconds)
+
+    def stage(self, stage_id: int) -> Leaderboard:
+        return self._stages.get(stage_id) or Leaderboard()
+
+    def for_class(self, stage_id: int, class_id: int) -> Leaderboard:
+        return self._classes.get((stage_id, class_id)) or Leaderboard()
+
+
+class ClassStandings:
+    """Overall standings of one event: ok totals per class."""
+
+    def __init__(self):
+        self._classes: dict[int, Leaderboard] = {}
+        self._class_of: dict[int, int] = {}
+
+    def board(self, class_id: int) -> Leaderboard:
+        return self._classes.setdefault(class_id, Leaderboard())
+
+    def update(self, changes: list[tuple[int, int, Optional[float]]]
+               ) -> tuple[list[tuple[int, int, float]], list[int]]:
+        """Apply (entry_id, class_id, total or None) changes.
+
+        Returns (ranked, cleared): (entry_id, position, time_behind) of the
+        places that may have moved, and the entries that dropped out. Those
+        are the places between the old and new places of the changed
+        entries — to the end of the class when its size changes — or the
+        whole class when the leader's time changes.
+        """
+        changes = [(e, c, s) for e, c, s in changes
+                   if self._class_of.get(e, c) != c or self.board(c).best(e) != s]
+        before: dict[int, tuple[Optional[tuple[int, float]], int, list[int]]] = {}
+        for entry_id, class_id, _ in changes:
+            for cid in (self._class_of.get(entry_id), class_id):
+                if cid is None:
+                    continue
+                board = self.board(cid)
+                if cid not in before:
+                    before[cid] = (board.leader(), len(board), [])
+                i = board.index(entry_id)
+                if i is not None:
+                    before[cid][2].append(i)
+
+        cleared = []
+        for entry_id, class_id, seconds in changes:
+            previous = self._class_of.pop(entry_id, None)
+            if previous is not None:
+                self._classes[previous].set(entry_id, None)
+            if seconds is not None:
+                self.board(class_id).set(entry_id, seconds)
+                self._class_of[entry_id] = class_id
+            elif previous is not None:
+                cleared.append(entry_id)
+
+        ranked = []
+        for cid, (leader, size, places) in before.items():
+            board = self._classes[cid]
+            places += [board.index(e) for e, _, _ in changes
+                       if self._class_of.get(e) == cid]
+            new_leader = board.leader()
+            if not places or new_leader is None:
+                continue
+            if leader is None or leader[1] != new_leader[1]:
+                start, stop = 0, len(board)
+            else:
+                start = min(places)
+                stop = max(places) + 1 if len(board) == size else len(board)
+            ranked.extend((e, pos, s - new_leader[1])
+                          for pos, (e, s) in enumerate(board.entries(start, stop), start + 1))
+        return ranked, cleared
+
+
+def load_standings(conn: sqlite3.Connection, event_id: int) -> ClassStandings:
+    standings = ClassStandings()
+    for r in conn.execute(
+        """SELECT o.entry_id, e.class_id, o.total_seconds FROM overall_results o
+           JOIN entries e ON o.entry_id = e.id
+           WHERE o.event_id=? AND o.status='ok' AND o.total_seconds IS NOT NULL""",
+        (event_id,)
+    ).fetchall():
+        standings.board(r["class_id"]).set(r["entry_id"], r["total_seconds"])
+        standings._class_of[r["entry_id"]] = r["class_id"]
+    return standings
+
+
+def get_standings(conn: sqlite3.Connection, event_id: int) -> ClassStandings:
+    """Cached overall standings for an event (writer only, see module docstring)."""
+    return cached(conn, event_id, STANDINGS_SLOT, load_standings)
+
+
+def load_leaderboards(conn: sqlite3.Connection, event_id: int) -> EventLeaderboards:
+    boards = EventLeaderboards()
+    for r in conn.execute(
+        "SELECT stage_id, entry_id, class_id, best_seconds FROM stage_leaderboard "
+        "WHERE event_id=?",
+        (event_id,)
+    ).fetchall():
+        boards.apply(r["stage_id"], r["entry_id"], r["class_id"], r["best_seconds"])
+    return boards
+
+
+def get_leaderboards(conn: sqlite3.Connection, event_id: int) -> EventLeaderboards:
+    """Cached leaderboards for an event."""
+    return cached(conn, event_id, SLOT, load_leaderboards)
+
+
+def refresh_entry(conn: sqlite3.Connection, event_id: int, entry_id: int,
+                  stage_id: int, class_id: int) -> None:
+    """Re-read one entry's best valid time on a stage and update both copies.
+
+    Does not commit — call inside the caller's transaction. The row is always
+    written (the cached boards may predate a rebuild in this transaction);
+    the in-memory boards follow once the transaction has committed.
+    """
+    best = conn.execute(
+        """SELECT MIN(elapsed_seconds) FROM stage_results
+           WHERE event_id=? AND entry_id=? AND stage_id=?
+             AND status='ok' AND run_state='valid'""",
+        (event_id, entry_id, stage_id)
+    ).fetchone()[0]
+
+    if best is None:
+        conn.execute(
+            "DELETE FROM stage_leaderboard WHERE event_id=? AND stage_id=? AND entry_id=?",
+            (event_id, stage_id, entry_id)
+        )
+    else:
+        conn.execute(
+            """INSERT INTO stage_leaderboard (event_id, stage_id, entry_id, class_id, best_seconds)
+               VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(event_id, stage_id, entry_id)
+               DO UPDATE SET class_id=excluded.class_id, best_seconds=excluded.best_seconds""",
+            (event_id, stage_id, entry_id, class_id, best)
+        )
+    after_commit(conn, lambda: get_leaderboards(conn, event_id).apply(
+        stage_id, entry_id, class_id, best))
+
+
+def move_entries(conn: sqlite3.Connection, event_id: int,
+                 entry_ids: list[int]) -> None:
+    """Follow class changes of entries into the persisted leaderboards.
+
+    Call after UPDATE entries SET class_id. Does not commit; commit with
+    commit_and_invalidate(conn, event_id), which drops the cached boards
+    once the change is committed.
+    """
+    conn.executemany(
+        """UPDATE stage_leaderboard
+           SET class_id=(SELECT class_id FROM entries WHERE id=?)
+           WHERE event_id=? AND entry_id=?""",
+        [(entry_id, event_id, entry_id) for entry_id in entry_ids]
+    )
+
+
+REBUILD_SQL = """
+    INSERT INTO stage_leaderboard (event_id, stage_id, entry_id, class_id, best_seconds)
+    SELECT sr.event_id, sr.stage_id, sr.entry_id, e.class_id, MIN(sr.elapsed_seconds)
+    FROM stage_results sr
+    JOIN entries e ON sr.entry_id = e.id
+    WHERE sr.event_id=? AND sr.status='ok' AND sr.run_state='valid'
+      AND sr.elapsed_seconds IS NOT NULL
+    GROUP BY sr.stage_id, sr.entry_id
+"""
+
+
+def rebuild(conn: sqlite3.Connection, event_id: int) -> None:
+    """Recreate the persisted leaderboards of an event from stage_results.
+
+    Used after bulk changes (recalculate-all, dual slalom grouping).
+    Does not commit.
+    """
+    conn.execute("DELETE FROM stage_leaderboard WHERE event_id=?", (event_id,))
+    conn.execute(REBUILD_SQL, (event_id,))
+    after_commit(conn, lambda: invalidate(conn, event_id, SLOT))
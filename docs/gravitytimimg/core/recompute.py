@@ -0,0 +1,640 @@
+"""
+recompute.py — Bulk recompute of all results of an event (recalculate-all).
+
+The replay in timing_engine runs every punch through _process_punch, about
+a dozen queries per punch. Here the event is loaded once — punches, chips,
+entries, stages and courses — and the same rules are applied to plain
+dicts in punch order:
+
+    _update_stage_result / _check_source_override / _finalize_result
+    _try_cross_chip_fill, group_dual_slalom_starts,
+    _calc_entry_total and _calculate_rankings
+
+Results, journal rows and leaderboards are then written with executemany.
+Stage result ids are assigned in creation order (continuing the
+AUTOINCREMENT sequence), so journal rows that reference a run id match what
+the replay would have written.
+
+Every rule above only looks at punches of one bib, so large events are
+replayed in parallel: the punches are partitioned by bib and each partition
+runs in a ProcessPoolExecutor worker (replay_partition). Runs and journal
+rows carry the index of the punch that created them, which puts the merged
+partitions back in replay order. Dual slalom grouping and the overall
+results need the whole event and run on the merged result.
+
+compute_event() only reads, so the same computation also runs as a shadow
+recompute (shadow_recompute): on a reader connection, inside one read
+transaction (a consistent WAL snapshot while ingestion goes on), diffed
+against the live tables without touching them. apply_recompute() later
+swaps the computed results in with one write transaction — unless the
+event's results version moved in between, in which case it raises
+StaleRecompute rather than overwrite newer punches.
+
+Any change to the per-punch rules in timing_engine must be made here too;
+TEST 35 compares both paths on the same punches.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import multiprocessing
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import repeat
+from typing import NamedTuple, Optional
+
+from core import leaderboard
+from core.database import results_changed, transaction
+from core.event_cache import (
+    EventStructure, db_key, get_structure, invalidate, results_version,
+)
+from core.timing_engine import (
+    SOURCE_PRIORITY, diff_results, elapsed_seconds, results_snapshot,
+)
+
+logger = logging.getLogger("gravitytiming.recompute")
+
+_STATUS_RANK = {"ok": 0, "pending": 1}
+
+# workers=None: go parallel from this many punches, with up to MAX_WORKERS
+# processes (starting them costs more than replaying a small event)
+PARALLEL_MIN_PUNCHES = 20000
+MAX_WORKERS = 8
+
+
+class Punch(NamedTuple):
+    """A non-duplicate punch; index is its position in replay order."""
+    index: int
+    id: int
+    siac: int
+    control_code: int
+    punch_time: str
+    punch_ms: int
+    source: str
+
+
+class _Replay:
+    """Stage results built punch by punch, for a whole event or some bibs.
+
+    Runs are dicts with the stage_results columns except id (assigned when
+    written) plus "order", and journal rows are (order, data_type, data,
+    superseded_run). "order" is (punch index, sequence within the punch) —
+    the position the replay would have created them in.
+    """
+
+    def __init__(self, structure: EventStructure, punches: list[Punch]):
+        self.structure = structure
+        self.punches = punches
+        self.source_by_punch = {p.id: p.source for p in punches}
+
+        # (siac, control_code) → punches in time order, for cross-chip
+        self.by_chip_code: dict[tuple[int, int], list[Punch]] = {}
+        for p in punches:
+            self.by_chip_code.setdefault((p.siac, p.control_code), []).append(p)
+
+        self.runs: dict[tuple[int, int], list[dict]] = {}   # (entry, stage) → runs
+        self.rows: list[dict] = []                          # creation order
+        self.journal: list[tuple] = []
+        self._index = 0
+        self._seq = 0
+
+    # ── helpers ──────────────────────────────────────────────────────
+
+    def _order(self) -> tuple[int, int]:
+        self._seq += 1
+        return self._index, self._seq
+
+    def _log(self, data_type: str, data: dict, run: Optional[dict] = None) -> None:
+        self.journal.append((self._order(), data_type, data, run))
+
+    def _new_run(self, entry_id: int, stage_id: int, attempt: int, **fields) -> dict:
+        run = {"entry_id": entry_id, "stage_id": stage_id,
+               "start_punch_id": None, "start_time": None, "start_ms": None,
+               "finish_punch_id": None, "finish_time": None, "finish_ms": None,
+               "elapsed_seconds": None, "attempt": attempt,
+               "status": "pending", "run_state": "pending",
+               "order": self._order()}
+        run.update(fields)
+        self.runs.setdefault((entry_id, stage_id), []).append(run)
+        self.rows.append(run)
+        return run
+
+    @staticmethod
+    def _start(p: Punch) -> dict:
+        return {"start_punch_id": p.id, "start_time": p.punch_time, "start_ms": p.punch_ms}
+
+    @staticmethod
+    def _finish(p: Punch) -> dict:
+        return {"finish_punch_id": p.id, "finish_time": p.punch_time, "finish_ms": p.punch_ms}
+
+    @staticmethod
+    def _latest(runs: list[dict]) -> Optional[dict]:
+        live = [r for r in runs if r["run_state"] != "superseded"]
+        return max(live, key=lambda r: r["attempt"]) if live else None
+
+    # ── per punch (mirrors timing_engine._process_punch) ─────────────
+
+    def run(self) -> _Replay:
+        for p in self.punches:
+            self.process(p)
+        return self
+
+    def process(self, p: Punch) -> None:
+        self._index, self._seq = p.index, 0
+        bib = self.structure.bib_by_siac.get(p.siac)
+        if bib is None:
+            return
+        entry = self.structure.entry_by_bib.get(bib)
+        if entry is None:
+            return
+        stage = self.structure.stage_by_code.get(p.control_code)
+        if stage is None:
+            return
+        self._update_stage_result(entry["id"], stage, p)
+        self._cross_chip_fill(entry["id"], stage, bib)
+
+    def _finalize(self, run: dict) -> None:
+        if run["start_time"] and run["finish_time"] and run["status"] != "ok":
+            elapsed = elapsed_seconds(run["start_ms"], run["finish_ms"])
+            if elapsed >= 0:
+                run.update(elapsed_seconds=elapsed, status="ok", run_state="valid")
+                self._log("run_created", {
+                    "entry_id": run["entry_id"],
+                    "stage_id": run["stage_id"],
+                    "attempt": run["attempt"],
+                    "elapsed": elapsed,
+                })
+
+    def _source_override(self, entry_id: int, stage: dict, p: Punch) -> bool:
+        start_code, finish_code = self.structure.stage_codes[stage["id"]]
+        is_start = p.control_code == start_code
+        is_finish = p.control_code == finish_code
+        if not is_start and not is_finish:
+            return False
+
+        runs = self.runs.get((entry_id, stage["id"]), [])
+        done = [r for r in runs if r["status"] == "ok" and r["run_state"] == "valid"]
+        if not done:
+            return False
+        existing = max(done, key=lambda r: r["attempt"])
+
+        if is_start and existing["start_punch_id"]:
+            existing_source = self.source_by_punch.get(existing["start_punch_id"])
+        elif is_finish and existing["finish_punch_id"]:
+            existing_source = self.source_by_punch.get(existing["finish_punch_id"])
+        else:
+            return False
+        if existing_source is None:
+            return False
+        if SOURCE_PRIORITY.get(p.source, 99) >= SOURCE_PRIORITY.get(existing_source, 99):
+            return False
+
+        existing["run_state"] = "superseded"
+        self._log("run_superseded", {
+            "old_run_id": None,   # existing's id, filled in when written
+            "entry_id": entry_id,
+            "stage_id": stage["id"],
+            "reason": f"{p.source}_override",
+        }, existing)
+        attempt = max(r["attempt"] for r in runs) + 1
+        if is_start:
+            run = self._new_run(entry_id, stage["id"], attempt, **self._start(p),
+                                finish_punch_id=existing["finish_punch_id"],
+                                finish_time=existing["finish_time"],
+                                finish_ms=existing["finish_ms"])
+        else:
+            run = self._new_run(entry_id, stage["id"], attempt, **self._finish(p),
+                                start_punch_id=existing["start_punch_id"],
+                                start_time=existing["start_time"],
+                                start_ms=existing["start_ms"])
+        self._finalize(run)
+        return True
+
+    def _update_stage_result(self, entry_id: int, stage: dict, p: Punch) -> None:
+        if self._source_override(entry_id, stage, p):
+            return
+        start_code, finish_code = self.structure.stage_codes[stage["id"]]
+        is_start = p.control_code == start_code
+        is_finish = p.control_code == finish_code
+        if not is_start and not is_finish:
+            return
+
+        latest = self._latest(self.runs.get((entry_id, stage["id"]), []))
+        if latest is None:
+            fields = self._start(p) if is_start else self._finish(p)
+            self._finalize(self._new_run(entry_id, stage["id"], 1, **fields))
+            return
+
+        if is_start:
+            if latest["status"] == "ok":
+                max_runs = stage["max_runs"]
+                if max_runs is not None and latest["attempt"] >= max_runs:
+                    return
+                run = self._new_run(entry_id, stage["id"], latest["attempt"] + 1,
+                                    **self._start(p))
+                self._finalize(run)
+                return
+            if latest["start_time"] and p.punch_ms <= latest["start_ms"]:
+                return
+            latest.update(self._start(p), elapsed_seconds=None,
+                          status="pending", run_state="pending")
+            self._finalize(latest)
+            return
+
+        if latest["status"] == "ok":
+            return
+        if latest["start_time"]:
+            elapsed = elapsed_seconds(latest["start_ms"], p.punch_ms)
+            if elapsed < 0:
+                return
+            latest.update(self._finish(p), elapsed_seconds=elapsed,
+                          status="ok", run_state="valid")
+            self._log("run_created", {
+                "entry_id": entry_id, "stage_id": stage["id"],
+                "attempt": latest["attempt"], "elapsed": elapsed,
+            })
+        else:
+            if latest["finish_time"] and p.punch_ms <= latest["finish_ms"]:
+                return
+            latest.update(self._finish(p))
+            self._finalize(latest)
+
+    def _cross_chip_fill(self, entry_id: int, stage: dict, bib: int) -> None:
+        """Like the replay, this sees every punch of the event, not only earlier ones."""
+        siacs = self.structure.siacs_for_bib(bib)
+        if len(siacs) < 2:
+            return
+        latest = self._latest(self.runs.get((entry_id, stage["id"]), []))
+        if latest is None or latest["status"] == "ok":
+            return
+        start_code, finish_code = self.structure.stage_codes[stage["id"]]
+
+        if latest["start_time"] and not latest["finish_time"]:
+            found = min((p for s in siacs for p in self.by_chip_code.get((s, finish_code), ())
+                         if p.punch_ms > latest["start_ms"]),
+                        key=lambda p: (p.punch_ms, p.id), default=None)
+            if found:
+                elapsed = elapsed_seconds(latest["start_ms"], found.punch_ms)
+                if elapsed >= 0:
+                    latest.update(self._finish(found), elapsed_seconds=elapsed,
+                                  status="ok", run_state="valid")
+                    self._cross_chip_journal(latest, elapsed)
+
+        elif latest["finish_time"] and not latest["start_time"]:
+            found = max((p for s in siacs for p in self.by_chip_code.get((s, start_code), ())
+                         if p.punch_ms < latest["finish_ms"]),
+                        key=lambda p: (p.punch_ms, -p.id), default=None)
+            if found:
+                elapsed = elapsed_seconds(found.punch_ms, latest["finish_ms"])
+                if elapsed >= 0:
+                    latest.update(self._start(found), elapsed_seconds=elapsed,
+                                  status="ok", run_state="valid")
+                    self._cross_chip_journal(latest, elapsed)
+
+    def _cross_chip_journal(self, run: dict, elapsed: float) -> None:
+        self._log("run_created", {
+            "entry_id": run["entry_id"], "stage_id": run["stage_id"],
+            "attempt": run["attempt"], "elapsed": elapsed,
+            "source": "cross_chip_fill",
+        })
+
+
+def replay_partition(structure: EventStructure,
+                     punches: list[Punch]) -> tuple[list[dict], list[tuple]]:
+    """Runs and journal rows of some bibs (ProcessPoolExecutor worker)."""
+    replay = _Replay(structure, punches).run()
+    return replay.rows, replay.journal
+
+
+# ── dual slalom (mirrors group_dual_slalom_starts) ──────────────────────
+
+def _group_dual_slalom(structure: EventStructure, punches: list[Punch],
+                       rows: list[dict], window_seconds: float) -> None:
+    start_codes = {code for code, kind in structure.control_type_by_code.items()
+                   if kind == "start"}
+    group: list[Punch] = []
+    groups: list[list[Punch]] = []
+    group_start = None
+    for p in punches:
+        if p.control_code not in start_codes:
+            continue
+        if group_start is None or elapsed_seconds(group_start, p.punch_ms) > window_seconds:
+            if group:
+                groups.append(group)
+            group, group_start = [p], p.punch_ms
+        else:
+            group.append(p)
+    if group:
+        groups.append(group)
+
+    runs_by_start: dict[int, list[dict]] = {}
+    for run in rows:
+        if run["start_punch_id"] is not None:
+            runs_by_start.setdefault(run["start_punch_id"], []).append(run)
+
+    for group in groups:
+        if len(group) < 2:
+            continue
+        earliest = group[0]
+        for p in group:
+            for run in runs_by_start.get(p.id, ()):
+                if run["finish_time"] and run["status"] == "ok":
+                    run["elapsed_seconds"] = elapsed_seconds(earliest.punch_ms,
+                                                             run["finish_ms"])
+                run["start_time"] = earliest.punch_time
+                run["start_ms"] = earliest.punch_ms
+
+
+# ── overall (mirrors calculate_overall_results) ─────────────────────────
+
+def _timed_stages(conn: sqlite3.Connection, event_id: int, stages: list[dict]) -> dict:
+    """class_id → timed stages in the order _get_entry_timed_stages returns them."""
+    by_id = {s["id"]: s for s in stages}
+    course_stages: dict[int, list[dict]] = {}
+    for r in conn.execute(
+        """SELECT cs.course_id, cs.stage_id FROM course_stages cs
+           JOIN courses c ON cs.course_id = c.id
+           WHERE c.event_id=? ORDER BY cs.course_id, cs.stage_order""",
+        (event_id,)
+    ).fetchall():
+        stage = by_id.get(r["stage_id"])
+        if stage is not None and stage["is_timed"] == 1:
+            course_stages.setdefault(r["course_id"], []).append(stage)
+
+    fallback = sorted((s for s in stages if s["is_timed"] == 1),
+                      key=lambda s: s["stage_number"])
+    return {
+        r["id"]: course_stages.get(r["course_id"]) or fallback
+        for r in conn.execute("SELECT id, course_id FROM classes WHERE event_id=?",
+                              (event_id,)).fetchall()
+    }
+
+
+def _counting_time(runs: list[dict], runs_to_count: int) -> Optional[float]:
+    ok = sorted((r for r in runs if r["status"] == "ok" and r["run_state"] == "valid"),
+                key=lambda r: r["elapsed_seconds"])
+    if not ok:
+        return None
+    if runs_to_count <= 1:
+        return ok[0]["elapsed_seconds"]
+    if len(ok) < runs_to_count:
+        return None
+    return sum(r["elapsed_seconds"] for r in ok[:runs_to_count])
+
+
+def _entry_total(fmt: str, runs: dict, entry_id: int,
+                 timed: list[dict]) -> tuple[Optional[float], str]:
+    if fmt in ("downhill", "dual_slalom"):
+        if not timed:
+            return None, "pending"
+        best = _counting_time(runs.get((entry_id, timed[0]["id"]), []), 1)
+        return (best, "ok") if best is not None else (None, "pending")
+
+    total, all_ok, any_result = 0.0, True, False
+    for stage in timed:
+        stage_runs = runs.get((entry_id, stage["id"]), [])
+        stage_time = _counting_time(stage_runs, stage["runs_to_count"] or 1)
+        if stage_time is None:
+            live = sorted((r for r in stage_runs if r["run_state"] != "superseded"),
+                          key=lambda r: r["attempt"])
+            if live and live[0]["status"] in ("dns", "dnf", "dsq"):
+                return None, live[0]["status"]
+            all_ok = False
+            continue
+        total += stage_time
+        any_result = True
+    if not any_result:
+        return None, "pending"
+    return total, "ok" if all_ok else "pending"
+
+
+def _overall_rows(conn: sqlite3.Connection, event: sqlite3.Row,
+                  structure: EventStructure, runs: dict) -> list[tuple]:
+    event_id = event["id"]
+    timed_by_class = _timed_stages(conn, event_id, structure.stages)
+    entries = conn.execute(
+        "SELECT id, class_id FROM entries WHERE event_id=? ORDER BY id", (event_id,)
+    ).fetchall()
+
+    by_class: dict[int, list[list]] = {}
+    for e in entries:
+        timed = timed_by_class.get(e["class_id"])
+        if timed is None:   # class missing — same fallback as the replay
+            timed = sorted((s for s in structure.stages if s["is_timed"] == 1),
+                           key=lambda s: s["stage_number"])
+        total, status = _entry_total(event["format"], runs, e["id"], timed)
+        by_class.setdefault(e["class_id"], []).append([e["id"], total, status, None, None])
+
+    rows = []
+    for results in by_class.values():
+        # NULL totals sort first, as in SQLite
+        results.sort(key=lambda r: (_STATUS_RANK.get(r[2], 2), r[1] is not None,
+                                    r[1] or 0.0))
+        leader, pos = None, 0
+        for r in results:
+            if r[2] == "ok" and r[1] is not None:
+                pos += 1
+                if leader is None:
+                    leader = r[1]
+                r[3], r[4] = pos, r[1] - leader
+        rows.extend(results)
+    rows.sort(key=lambda r: r[0])
+    return [(event_id, entry_id, total, status, position, behind)
+            for entry_id, total, status, position, behind in rows]
+
+
+# ── parallel replay ─────────────────────────────────────────────────────
+
+def _partition(structure: EventStructure, punches: list[Punch],
+               count: int) -> list[list[Punch]]:
+    """Split punches by bib into count lists (chips without a bib are dropped)."""
+    bibs = sorted({structure.bib_by_siac[p.siac] for p in punches
+                   if p.siac in structure.bib_by_siac})
+    part_of_bib = {bib: i % count for i, bib in enumerate(bibs)}
+    parts: list[list[Punch]] = [[] for _ in range(count)]
+    for p in punches:
+        bib = structure.bib_by_siac.get(p.siac)
+        if bib is not None:
+            parts[part_of_bib[bib]].append(p)
+    return [part for part in parts if part]
+
+
+def _worker_count(punch_count: int, workers: Optional[int]) -> int:
+    if workers is None:
+        if punch_count < PARALLEL_MIN_PUNCHES:
+            return 1
+        workers = min(os.cpu_count() or 1, MAX_WORKERS)
+    return max(1, workers)
+
+
+def _replay_all(structure: EventStructure, punches: list[Punch],
+                workers: Optional[int]) -> tuple[list[dict], list[tuple]]:
+    """Runs and journal rows of the event, in the order the replay creates them."""
+    workers = _worker_count(len(punches), workers)
+    if workers > 1:
+        parts = _partition(structure, punches, workers)
+        try:
+            # spawn: forking the server would copy its threads' locks.
+            # Workers re-import the main module, so server.py does its
+            # startup work in lifespan/__main__, not at import
+            with ProcessPoolExecutor(
+                max_workers=len(parts),
+                mp_context=multiprocessing.get_context("spawn"),
+            ) as pool:
+                results = list(pool.map(replay_partition, repeat(structure), parts))
+        except Exception as e:
+            logger.warning("Parallel recompute failed (%s), replaying serially", e)
+        else:
+            rows = [run for part_rows, _ in results for run in part_rows]
+            journal = [j for _, part_journal in results for j in part_journal]
+            rows.sort(key=lambda r: r["order"])
+            journal.sort(key=lambda j: j[0])
+            return rows, journal
+    return replay_partition(structure, punches)
+
+
+# ── entry points ────────────────────────────────────────────────────────
+
+class StaleRecompute(Exception):
+    """The event's results changed after a shadow recompute read them."""
+
+
+@dataclass
+class Recomputed:
+    """Results of an event computed in memory, not yet written."""
+    event_id: int
+    version: int               # results version the computation read
+    rows: list[dict]           # stage_results in creation order, no ids yet
+    journal: list[tuple]       # (order, data_type, data, superseded run)
+    overall: list[tuple]       # overall_results rows
+
+    def snapshot(self) -> tuple[dict, dict]:
+        """Same shape as timing_engine.results_snapshot(), for diff_results()."""
+        stage = {(r["entry_id"], r["stage_id"], r["attempt"]): {
+                     "elapsed_seconds": r["elapsed_seconds"],
+                     "status": r["status"],
+                     "run_state": r["run_state"]}
+                 for r in self.rows if r["run_state"] == "valid"}
+        overall = {entry_id: {"total_seconds": total, "position": position,
+                              "status": status}
+                   for _, entry_id, total, status, position, _ in self.overall}
+        return stage, overall
+
+
+def compute_event(conn: sqlite3.Connection, event_id: int,
+                  workers: Optional[int] = None) -> Recomputed:
+    """Compute all stage and overall results of an event. Writes nothing.
+
+    workers: processes for the replay (None: automatic, 1: in this process).
+    """
+    version = results_version(db_key(conn), event_id)
+    event = conn.execute("SELECT * FROM events WHERE id=?", (event_id,)).fetchone()
+    structure = get_structure(conn, event_id)
+    punches = [Punch(i, *p) for i, p in enumerate(conn.execute(
+        """SELECT id, siac, control_code, punch_time, punch_ms, source FROM punches
+           WHERE event_id=? AND is_duplicate=0
+           ORDER BY punch_ms ASC, id ASC""",
+        (event_id,)
+    ))]
+    rows, journal = _replay_all(structure, punches, workers)
+    if event and event["format"] == "dual_slalom" and event["dual_slalom_window"]:
+        _group_dual_slalom(structure, punches, rows, event["dual_slalom_window"])
+
+    overall = []
+    if event:
+        runs: dict[tuple[int, int], list[dict]] = {}
+        for r in rows:
+            runs.setdefault((r["entry_id"], r["stage_id"]), []).append(r)
+        overall = _overall_rows(conn, event, structure, runs)
+    return Recomputed(event_id, version, rows, journal, overall)
+
+
+def write_results(conn: sqlite3.Connection, computed: Recomputed) -> int:
+    """Replace the event's stage and overall results. Returns runs written.
+
+    Does not commit — call inside a transaction.
+    """
+    event_id = computed.event_id
+    conn.execute("DELETE FROM stage_results WHERE event_id=?", (event_id,))
+    conn.execute("DELETE FROM overall_results WHERE event_id=?", (event_id,))
+
+    seq = conn.execute(
+        "SELECT seq FROM sqlite_sequence WHERE name='stage_results'"
+    ).fetchone()
+    top = conn.execute("SELECT MAX(id) FROM stage_results").fetchone()
+    first_id = max(seq[0] if seq else 0, top[0] or 0) + 1
+    for run_id, run in enumerate(computed.rows, first_id):
+        run["id"] = run_id
+    for _, data_type, data, superseded in computed.journal:
+        if superseded is not None:
+            data["old_run_id"] = superseded["id"]
+
+    conn.executemany(
+        """INSERT INTO stage_results
+           (id, event_id, entry_id, stage_id, start_punch_id, start_time, start_ms,
+            finish_punch_id, finish_time, finish_ms, elapsed_seconds, attempt,
+            status, run_state)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        [(r["id"], event_id, r["entry_id"], r["stage_id"], r["start_punch_id"],
+          r["start_time"], r["start_ms"], r["finish_punch_id"], r["finish_time"],
+          r["finish_ms"], r["elapsed_seconds"], r["attempt"], r["status"], r["run_state"])
+         for r in computed.rows]
+    )
+    conn.executemany(
+        "INSERT INTO sync_queue (event_id, data_type, data_json) VALUES (?, ?, ?)",
+        [(event_id, data_type, json.dumps(data))
+         for _, data_type, data, _ in computed.journal]
+    )
+    leaderboard.rebuild(conn, event_id)
+    conn.executemany(
+        """INSERT INTO overall_results
+           (event_id, entry_id, total_seconds, status, position, time_behind)
+           VALUES (?, ?, ?, ?, ?, ?)""",
+        computed.overall
+    )
+    invalidate(conn, event_id, leaderboard.STANDINGS_SLOT)
+    return len(computed.rows)
+
+
+def recompute_event(conn: sqlite3.Connection, event_id: int,
+                    workers: Optional[int] = None) -> int:
+    """Compute and write all results of an event. Returns runs written.
+
+    Does not commit — recalculate_all() calls it inside its transaction.
+    """
+    return write_results(conn, compute_event(conn, event_id, workers))
+
+
+def shadow_recompute(conn: sqlite3.Connection, event_id: int,
+                     workers: Optional[int] = None) -> tuple[Recomputed, list[str]]:
+    """Recompute from one read snapshot and diff against the live results.
+
+    Writes nothing; run it on a reader connection (run_read). Returns the
+    computed results (for apply_recompute) and the diff messages.
+    """
+    own = not conn.in_transaction
+    if own:
+        conn.execute("BEGIN")   # every read below sees the same snapshot
+    try:
+        computed = compute_event(conn, event_id, workers)
+        diffs = diff_results(results_snapshot(conn, event_id), computed.snapshot())
+    finally:
+        if own:
+            conn.rollback()
+    return computed, diffs
+
+
+def apply_recompute(conn: sqlite3.Connection, computed: Recomputed) -> int:
+    """Swap shadow results in, in one transaction. Returns runs written.
+
+    Raises StaleRecompute if punches or results of the event changed since
+    the shadow recompute read them.
+    """
+    with transaction(conn):
+        if results_version(db_key(conn), computed.event_id) != computed.version:
+            raise StaleRecompute(f"results of event {computed.event_id} changed")
+        results_changed(conn, computed.event_id)
+        return write_results(conn, computed)
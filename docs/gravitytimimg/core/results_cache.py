@@ -0,0 +1,75 @@
+"""
+results_cache.py — Serialized result lists for the public results endpoints.
+
+Spectator pages poll /overall and /stages/{id}/results far more often than
+results change. Each list is cached as ready-to-send JSON, keyed by
+(database, event, key) — key is e.g. ("overall", class) or
+("stage", stage_id, class) — and tagged with the event's results version
+(event_cache.results_version()). A hit while the version is unchanged costs
+no query and no serialization.
+
+The ETag is built from the version, so a client that sends If-None-Match
+gets a 304 until the timing engine commits new results for the event.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from core.event_cache import db_key, results_version
+
+MAX_ENTRIES = 512
+
+# Versions restart at 0 with the process — keep old ETags from matching
+_EPOCH = int(time.time())
+
+_lock = threading.Lock()
+_entries: OrderedDict[tuple, tuple[int, str, bytes]] = OrderedDict()
+
+
+def make_etag(event_id: int, version: int) -> str:
+    return f'W/"r{_EPOCH}-{event_id}-{version}"'
+
+
+def lookup(dbk: str, event_id: int, key: tuple) -> Optional[tuple[str, bytes]]:
+    """(etag, body) if the cached list is still current, else None."""
+    version = results_version(dbk, event_id)
+    with _lock:
+        hit = _entries.get((dbk, event_id, key))
+        if hit is None or hit[0] != version:
+            return None
+        _entries.move_to_end((dbk, event_id, key))
+        return hit[1], hit[2]
+
+
+def load(conn: sqlite3.Connection, event_id: int, key: tuple,
+         loader: Callable[[sqlite3.Connection], Any]) -> tuple[str, bytes]:
+    """Return (etag, body), running loader(conn) on a miss.
+
+    The version is read before the query: if results change while it runs,
+    the stored entry is already stale and the next request reloads.
+    """
+    dbk = db_key(conn)
+    cached = lookup(dbk, event_id, key)
+    if cached is not None:
+        return cached
+    version = results_version(dbk, event_id)
+    body = json.dumps(loader(conn), ensure_ascii=False,
+                      separators=(",", ":")).encode("utf-8")
+    etag = make_etag(event_id, version)
+    with _lock:
+        _entries[(dbk, event_id, key)] = (version, etag, body)
+        _entries.move_to_end((dbk, event_id, key))
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+    return etag, body
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
@@ -5,12 +5,23 @@ Polls https://roc.olresultat.se/getpunches.asp for new punches.
 Uses pagination via lastId. Runs as asyncio task within FastAPI.
 
 Replaces the old threading+urllib version with httpx+asyncio.
+
+The delay before the next poll adapts (_next_delay):
+- a full page → poll again at once (drain a backlog). ROC caps the size of
+  a page server-side and getpunches.asp takes no limit, so a full page is
+  one of page_size punches when that is given, else one as large as the
+  largest page seen so far (at least MIN_FULL_PAGE)
+- punches → the base interval
+- empty pages → the interval grows by IDLE_FACTOR up to MAX_IDLE_INTERVAL
+- errors (fetching or applying a page) → exponential backoff up to
+  MAX_BACKOFF, with jitter so several timing stations don't retry in lockstep
 """
 
 from __future__ import annotations
 
 import asyncio
 import logging
+import random
 from datetime import datetime
 from typing import Optional, Callable, Awaitable
 
@@ -19,18 +30,43 @@ import httpx
 logger = logging.getLogger("gravitytiming.roc")
 
 ROC_BASE_URL = "https://roc.olresultat.se/getpunches.asp"
-DEFAULT_INTERVAL = 1.0  # seconds between polls
+DEFAULT_INTERVAL = 1.0  # seconds between polls while punches arrive
+MAX_IDLE_INTERVAL = 5.0  # seconds between polls when the competition is quiet
+IDLE_FACTOR = 1.5
+MIN_FULL_PAGE = 10  # smaller pages never count as full while learning the cap
+MAX_BACKOFF = 60.0  # seconds
 
 
 class RocPoller:
-    """Async background task that polls ROC API and calls a handler for each punch."""
+    """Async background task that polls ROC API and hands punches to a handler.
+
+    on_batch (preferred) receives each fetched page as one list, so a backlog
+    after a connectivity gap is applied in a single pass. on_punch is called
+    once per punch and is used only when no batch handler is given.
+
+    last_id moves past a page only once its handler has returned. A handler
+    that returns False (e.g. ingest paused) leaves the page to be fetched
+    again; one that raises makes the poller go back to load_cursor(), the
+    persisted cursor, if given.
+
+    page_size is ROC's page cap, if known; without it the cap is learned
+    from the largest page fetched.
+    """
 
     def __init__(self, competition_id: str,
-                 on_punch: Callable[[dict], Awaitable[None]],
-                 interval: float = DEFAULT_INTERVAL):
+                 on_punch: Optional[Callable[[dict], Awaitable[None]]] = None,
+                 interval: float = DEFAULT_INTERVAL,
+                 on_batch: Optional[Callable[[list[dict]], Awaitable[Optional[bool]]]] = None,
+                 load_cursor: Optional[Callable[[], Awaitable[int]]] = None,
+                 page_size: Optional[int] = None):
+        if on_punch is None and on_batch is None:
+            raise ValueError("RocPoller needs on_punch or on_batch")
         self.competition_id = competition_id
         self.on_punch = on_punch
+        self.on_batch = on_batch
+        self.load_cursor = load_cursor
         self.interval = interval
+        self.page_size = page_size
         self.last_id = 0
         self._running = False
         self._task: Optional[asyncio.Task] = None
@@ -38,6 +74,9 @@ class RocPoller:
         self._error_count = 0
         self._punch_count = 0
         self._last_poll: Optional[str] = None
+        self._poll_lag: Optional[float] = None
+        self._delay = interval
+        self._max_page = 0
         self._client: Optional[httpx.AsyncClient] = None
 
     @property
@@ -60,6 +99,9 @@ class RocPoller:
             "error_count": self._error_count,
             "last_poll": self._last_poll,
             "last_id": self.last_id,
+            "poll_lag": self._poll_lag,
+            "poll_interval": round(self._delay, 2),
+            "full_page": self._full_page(),
             "competition_id": self.competition_id,
         }
 
@@ -90,6 +132,63 @@ class RocPoller:
         """Resume polling from a known position."""
         self.last_id = last_id
 
+    def _full_page(self) -> int:
+        """Page size that means more punches are waiting."""
+        if self.page_size:
+            return self.page_size
+        return max(self._max_page, MIN_FULL_PAGE)
+
+    def _next_delay(self, punches: Optional[list[dict]]) -> float:
+        """Seconds until the next poll. punches is None after a failed poll."""
+        if punches is None:
+            backoff = min(self.interval * 2 ** (self._error_count - 1), MAX_BACKOFF)
+            return random.uniform(backoff / 2, backoff)
+        self._max_page = max(self._max_page, len(punches))
+        if len(punches) >= self._full_page():
+            self._delay = self.interval
+            return 0.0
+        if punches:
+            self._delay = self.interval
+        else:
+            self._delay = min(self._delay * IDLE_FACTOR, max(MAX_IDLE_INTERVAL, self.interval))
+        return self._delay
+
+    def _update_lag(self, punches: list[dict]) -> None:
+        """Poll lag: seconds from the newest punch's time until now."""
+        newest = max(p["punch_time"] for p in punches)
+        try:
+            lag = (datetime.now() - datetime.fromisoformat(newest)).total_seconds()
+        except ValueError:
+            return
+        self._poll_lag = round(lag, 1)
+
+    async def _deliver(self, punches: list[dict]) -> bool:
+        """Hand a page to the handler and move last_id past what it applied.
+
+        Returns False if the handler did not apply the page. Exceptions from
+        the handler propagate; last_id then stays before the failed punches.
+        """
+        if self.on_batch:
+            if await self.on_batch(punches) is False:
+                return False
+            self._punch_count += len(punches)
+            self.last_id = max(self.last_id, max(p["roc_punch_id"] for p in punches))
+            return True
+        for punch in punches:
+            await self.on_punch(punch)
+            self._punch_count += 1
+            self.last_id = max(self.last_id, punch["roc_punch_id"])
+        return True
+
+    async def _reload_cursor(self) -> None:
+        """After a failed page: continue from the persisted cursor, if any."""
+        if self.load_cursor is None:
+            return
+        try:
+            self.last_id = await self.load_cursor()
+        except Exception as e:
+            logger.warning("Could not reload ROC cursor: %s", e)
+
     async def _poll_loop(self) -> None:
         while self._running:
             try:
@@ -97,12 +196,15 @@ class RocPoller:
                 self._last_poll = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
                 if punches:
-                    for punch in punches:
-                        try:
-                            await self.on_punch(punch)
-                            self._punch_count += 1
-                        except Exception as e:
-                            logger.error("Error processing ROC punch: %s", e)
+                    self._update_lag(punches)
+                    try:
+                        applied = await self._deliver(punches)
+                    except Exception:
+                        # Counts as a failed poll below: back off, don't spin on the page
+                        await self._reload_cursor()
+                        raise
+                    if not applied:
+                        punches = []  # same page again, at idle pace
 
                 self._status = "Online"
                 self._error_count = 0
@@ -113,17 +215,14 @@ class RocPoller:
                 self._error_count += 1
                 self._status = f"Fel ({self._error_count})"
                 logger.warning("ROC poll error: %s", e)
+                punches = None
 
-                # Back off on repeated errors
-                if self._error_count >= 10:
-                    await asyncio.sleep(min(self.interval * self._error_count, 30))
-
-            await asyncio.sleep(self.interval)
+            await asyncio.sleep(self._next_delay(punches))
 
         self._status = "Stoppad"
 
     async def _fetch(self) -> list[dict]:
-        """Fetch new punches from ROC API. Returns list of punch dicts."""
+        """Fetch the punches after last_id from ROC API (last_id is not moved)."""
         url = f"{ROC_BASE_URL}?unitId={self.competition_id}&lastId={self.last_id}"
         resp = await self._client.get(url)
         resp.raise_for_status()
@@ -148,8 +247,6 @@ class RocPoller:
                     "punch_time": parts[3].strip(),
                 }
                 punches.append(punch)
-                if punch["roc_punch_id"] > self.last_id:
-                    self.last_id = punch["roc_punch_id"]
             except (ValueError, IndexError):
                 continue
 
@@ -13,9 +13,16 @@ from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Optional, Tuple, List
 
-from core.database import get_connection, get_db_path, journal_event
+from core.database import (
+    commit_and_invalidate, get_connection, get_db_path, journal_event,
+    results_changed, transaction,
+)
+from core.event_cache import get_structure, invalidate
+from core import leaderboard
+from core.dedup import dedup_key, get_dedup_index
 
 DEDUP_WINDOW_SECONDS = 2
+DEDUP_WINDOW_MS = DEDUP_WINDOW_SECONDS * 1000
 
 # Source priority: lower number = higher priority.
 # USB chip memory is ground truth; manual entry is lowest.
@@ -52,8 +59,27 @@ def format_time_behind(seconds: float | None, precision: str = "seconds") -> str
 
 
 def parse_timestamp(ts: str) -> datetime:
-    """Parse 'YYYY-MM-DD HH:MM:SS' to datetime."""
-    return datetime.strptime(ts, "%Y-%m-%d %H:%M:%S")
+    """Parse 'YYYY-MM-DD HH:MM:SS[.fff]' to datetime."""
+    return datetime.fromisoformat(ts)
+
+
+_EPOCH = datetime(1970, 1, 1)
+_MS = timedelta(milliseconds=1)
+
+
+def timestamp_ms(ts: str) -> int:
+    """'YYYY-MM-DD HH:MM:SS[.fff]' → integer milliseconds since 1970-01-01.
+
+    Punch times are local wall-clock times; they are counted as if UTC, so
+    differences are exact and never shift with time zones. The engine
+    compares and subtracts these (punch_ms, start_ms, finish_ms) instead
+    of parsing the text columns, which are kept for display and export.
+    """
+    return (datetime.fromisoformat(ts).replace(tzinfo=None) - _EPOCH) // _MS
+
+
+def elapsed_seconds(start_ms: int, finish_ms: int) -> float:
+    return (finish_ms - start_ms) / 1000
 
 
 # ---------------------------------------------------------------------------
@@ -62,26 +88,114 @@ def parse_timestamp(ts: str) -> datetime:
 
 def ingest_punch(conn: sqlite3.Connection, event_id: int, siac: int,
                  control_code: int, punch_time: str, source: str = "roc",
-                 roc_punch_id: int | None = None) -> int | None:
-    """Insert a punch, marking duplicates. Returns punch id or None if skipped."""
-    is_dup = _check_duplicate(conn, event_id, siac, control_code, punch_time, source)
-
-    cur = conn.execute(
-        """INSERT INTO punches (event_id, siac, control_code, punch_time, source, roc_punch_id, is_duplicate)
-           VALUES (?, ?, ?, ?, ?, ?, ?)""",
-        (event_id, siac, control_code, punch_time, source, roc_punch_id, int(is_dup))
-    )
-    conn.commit()
-    punch_id = cur.lastrowid
+                 roc_punch_id: int | None = None,
+                 update_overall: bool = False) -> int | None:
+    """Insert a punch, marking duplicates. Returns punch id or None if skipped.
+
+    The punch row, stage result, journal rows and (with update_overall=True)
+    the rider's overall result are written in one transaction — a failure
+    anywhere rolls back the whole punch. A punch whose roc_punch_id is
+    already stored for the event is skipped without touching anything.
+    """
+    punch_ms = timestamp_ms(punch_time)
+    with transaction(conn):
+        is_dup = _check_duplicate(conn, event_id, siac, control_code, punch_ms, source)
 
-    if not is_dup:
-        _process_punch(conn, event_id, punch_id, siac, control_code, punch_time)
+        # Unique (event_id, roc_punch_id): a ROC punch seen before is not stored again
+        cur = conn.execute(
+            """INSERT INTO punches (event_id, siac, control_code, punch_time, punch_ms, source, roc_punch_id, is_duplicate)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT DO NOTHING""",
+            (event_id, siac, control_code, punch_time, punch_ms, source, roc_punch_id,
+             int(is_dup))
+        )
+        if cur.rowcount == 0:
+            return None
+        punch_id = cur.lastrowid
+        results_changed(conn, event_id)
+
+        if not is_dup:
+            get_dedup_index(conn, event_id).add(
+                dedup_key(get_structure(conn, event_id), siac, control_code),
+                punch_ms, SOURCE_PRIORITY.get(source, 99))
+            _process_punch(conn, event_id, punch_id, siac, control_code, punch_time,
+                           source, punch_ms)
+
+        if update_overall:
+            entry = get_structure(conn, event_id).entry_for_siac(siac)
+            calculate_overall_results(conn, event_id, [entry["id"]] if entry else [])
 
     return punch_id
 
 
+def ingest_punches_batch(conn: sqlite3.Connection, event_id: int,
+                         punches: list[dict], source: str = "roc",
+                         update_overall: bool = True) -> list[int]:
+    """Ingest a page of punches in one transaction. Returns new punch ids.
+
+    Each punch dict has siac, control_code, punch_time and optionally
+    roc_punch_id / source. Punches whose roc_punch_id is already stored (or
+    repeated within the page) are skipped; the rest go through the normal
+    per-punch dedup and stage logic in arrival order. Overall results are
+    recomputed once for all affected entries at the end. A page that was
+    stored before (a resumed ROC poller) writes nothing and leaves the
+    results version alone.
+    """
+    if not punches:
+        return []
+
+    structure = get_structure(conn, event_id)
+    punch_ids: list[int] = []
+    entry_ids: set[int] = set()
+
+    with transaction(conn):
+        seen_roc_ids = _existing_roc_ids(
+            conn, event_id,
+            [p["roc_punch_id"] for p in punches if p.get("roc_punch_id") is not None]
+        )
+
+        for p in punches:
+            roc_id = p.get("roc_punch_id")
+            if roc_id is not None:
+                if roc_id in seen_roc_ids:
+                    continue
+                seen_roc_ids.add(roc_id)
+
+            punch_id = ingest_punch(conn, event_id, p["siac"], p["control_code"],
+                                    p["punch_time"], p.get("source", source),
+                                    roc_punch_id=roc_id)
+            if punch_id is None:
+                continue
+            punch_ids.append(punch_id)
+
+            entry = structure.entry_for_siac(p["siac"])
+            if entry is not None:
+                entry_ids.add(entry["id"])
+
+        if update_overall:
+            calculate_overall_results(conn, event_id, sorted(entry_ids))
+
+    return punch_ids
+
+
+def _existing_roc_ids(conn: sqlite3.Connection, event_id: int,
+                      roc_ids: list[int]) -> set[int]:
+    """Subset of roc_ids already stored for this event."""
+    found: set[int] = set()
+    # Chunked to stay well below SQLite's host-parameter limit
+    for i in range(0, len(roc_ids), 500):
+        chunk = roc_ids[i:i + 500]
+        placeholders = ",".join("?" for _ in chunk)
+        found.update(r[0] for r in conn.execute(
+            f"SELECT roc_punch_id FROM punches WHERE event_id=? "
+            f"AND roc_punch_id IN ({placeholders})",
+            (event_id, *chunk)
+        ).fetchall())
+    return found
+
+
 def _check_duplicate(conn: sqlite3.Connection, event_id: int, siac: int,
-                     control_code: int, punch_time: str,
+                     control_code: int, punch_ms: int,
                      source: str = "roc") -> bool:
     """BIB-level dedup: same BIB + same control + within 2s = duplicate.
 
@@ -91,90 +205,59 @@ def _check_duplicate(conn: sqlite3.Connection, event_id: int, siac: int,
     Source priority override: if the new punch has higher priority (lower number)
     than all existing punches in the window, it is NOT a duplicate — the source
     override logic in _update_stage_result will handle superseding.
-    """
-    ts = parse_timestamp(punch_time)
-    window_start = (ts - timedelta(seconds=DEDUP_WINDOW_SECONDS)).strftime("%Y-%m-%d %H:%M:%S")
-    window_end = (ts + timedelta(seconds=DEDUP_WINDOW_SECONDS)).strftime("%Y-%m-%d %H:%M:%S")
-
-    # Try BIB-level dedup first
-    bib_row = conn.execute(
-        "SELECT bib FROM chip_mapping WHERE event_id=? AND siac=?",
-        (event_id, siac)
-    ).fetchone()
 
-    if bib_row:
-        # Get all SIACs for this BIB
-        all_siacs = conn.execute(
-            "SELECT siac FROM chip_mapping WHERE event_id=? AND bib=?",
-            (event_id, bib_row["bib"])
-        ).fetchall()
-        siac_list = [r["siac"] for r in all_siacs]
-
-        placeholders = ",".join("?" for _ in siac_list)
-        existing = conn.execute(
-            f"""SELECT id, source FROM punches
-               WHERE event_id=? AND siac IN ({placeholders}) AND control_code=?
-               AND punch_time BETWEEN ? AND ?
-               AND is_duplicate=0
-               LIMIT 1""",
-            (event_id, *siac_list, control_code, window_start, window_end)
-        ).fetchone()
-    else:
-        # Fallback: SIAC-level dedup (no chip mapping yet)
-        existing = conn.execute(
-            """SELECT id, source FROM punches
-               WHERE event_id=? AND siac=? AND control_code=?
-               AND punch_time BETWEEN ? AND ?
-               AND is_duplicate=0
-               LIMIT 1""",
-            (event_id, siac, control_code, window_start, window_end)
-        ).fetchone()
+    Answered from the in-memory dedup index (core/dedup.py) — no query.
+    """
+    key = dedup_key(get_structure(conn, event_id), siac, control_code)
+    existing_prio = get_dedup_index(conn, event_id).best_priority(
+        key, punch_ms - DEDUP_WINDOW_MS, punch_ms + DEDUP_WINDOW_MS)
 
-    if existing is None:
+    if existing_prio is None:
         return False  # No duplicate found
 
     # Check source priority: if new source is higher priority, allow through
-    new_prio = SOURCE_PRIORITY.get(source, 99)
-    existing_prio = SOURCE_PRIORITY.get(existing["source"], 99)
-    if new_prio < existing_prio:
+    if SOURCE_PRIORITY.get(source, 99) < existing_prio:
         return False  # Higher priority source — let it through for override processing
 
     return True  # Same or lower priority — it's a duplicate
 
 
 def _process_punch(conn: sqlite3.Connection, event_id: int, punch_id: int,
-                   siac: int, control_code: int, punch_time: str) -> None:
+                   siac: int, control_code: int, punch_time: str,
+                   source: str | None = None, punch_ms: int | None = None) -> None:
     """After a non-duplicate punch: resolve BIB, match to stage, calc result.
 
     Includes cross-chip resolution: if primary chip has start and secondary
     chip has finish (or vice versa), both are used for the same stage result.
+    All lookups go through the cached event structure.
     """
-    bib = resolve_bib(conn, event_id, siac)
+    structure = get_structure(conn, event_id)
+    bib = structure.bib_by_siac.get(siac)
     if bib is None:
         return
 
-    entry = conn.execute(
-        "SELECT id FROM entries WHERE event_id=? AND bib=?",
-        (event_id, bib)
-    ).fetchone()
+    entry = structure.entry_by_bib.get(bib)
     if entry is None:
         return
     entry_id = entry["id"]
 
-    stage = _find_stage_for_control(conn, event_id, control_code)
+    stage = structure.stage_by_code.get(control_code)
     if stage is None:
         return
 
     _update_stage_result(conn, event_id, entry_id, stage, punch_id,
-                         control_code, punch_time)
+                         control_code, punch_time, source, punch_ms)
 
     # Cross-chip resolution: check if we can fill missing start/finish
     # from other SIAC belonging to same BIB
     _try_cross_chip_fill(conn, event_id, entry_id, stage, bib)
 
+    leaderboard.refresh_entry(conn, event_id, entry_id, stage["id"],
+                              entry["class_id"])
+
 
 def _try_cross_chip_fill(conn: sqlite3.Connection, event_id: int,
-                         entry_id: int, stage: sqlite3.Row, bib: int) -> None:
+                         entry_id: int, stage: dict, bib: int) -> None:
     """Cross-chip resolution: fill missing start or finish from other SIAC.
 
     Rule from MEMORY.md §10:
@@ -183,12 +266,10 @@ def _try_cross_chip_fill(conn: sqlite3.Connection, event_id: int,
     3. Only secondary exists → already handled by normal flow
     """
     # Get all SIACs for this BIB
-    chips = conn.execute(
-        "SELECT siac, is_primary FROM chip_mapping WHERE event_id=? AND bib=? ORDER BY is_primary DESC",
-        (event_id, bib)
-    ).fetchall()
+    structure = get_structure(conn, event_id)
+    all_siac_ids = structure.siacs_for_bib(bib)
 
-    if len(chips) < 2:
+    if len(all_siac_ids) < 2:
         return  # No dual-chip, nothing to fill
 
     # Get latest pending result (missing start or finish), skip superseded
@@ -202,93 +283,77 @@ def _try_cross_chip_fill(conn: sqlite3.Connection, event_id: int,
     if latest is None or latest["status"] == "ok":
         return  # Already complete
 
-    # Get start and finish control codes
-    start_code = conn.execute(
-        "SELECT code FROM controls WHERE id=?", (stage["start_control_id"],)
-    ).fetchone()["code"]
-    finish_code = conn.execute(
-        "SELECT code FROM controls WHERE id=?", (stage["finish_control_id"],)
-    ).fetchone()["code"]
-
-    all_siac_ids = [c["siac"] for c in chips]
+    start_code, finish_code = structure.stage_codes[stage["id"]]
 
     if latest["start_time"] and not latest["finish_time"]:
         # Missing finish — look for finish punch from any SIAC of this BIB
         placeholders = ",".join("?" for _ in all_siac_ids)
         finish_punch = conn.execute(
-            f"""SELECT id, punch_time FROM punches
+            f"""SELECT id, punch_time, punch_ms FROM punches
                WHERE event_id=? AND siac IN ({placeholders}) AND control_code=?
-               AND is_duplicate=0 AND punch_time > ?
-               ORDER BY punch_time ASC LIMIT 1""",
-            (event_id, *all_siac_ids, finish_code, latest["start_time"])
+               AND is_duplicate=0 AND punch_ms > ?
+               ORDER BY punch_ms ASC, id ASC LIMIT 1""",
+            (event_id, *all_siac_ids, finish_code, latest["start_ms"])
         ).fetchone()
 
         if finish_punch:
-            start_dt = parse_timestamp(latest["start_time"])
-            finish_dt = parse_timestamp(finish_punch["punch_time"])
-            elapsed = (finish_dt - start_dt).total_seconds()
+            elapsed = elapsed_seconds(latest["start_ms"], finish_punch["punch_ms"])
             if elapsed >= 0:
                 conn.execute(
-                    """UPDATE stage_results SET finish_punch_id=?, finish_time=?,
+                    """UPDATE stage_results SET finish_punch_id=?, finish_time=?, finish_ms=?,
                        elapsed_seconds=?, status='ok', run_state='valid' WHERE id=?""",
-                    (finish_punch["id"], finish_punch["punch_time"], elapsed, latest["id"])
+                    (finish_punch["id"], finish_punch["punch_time"], finish_punch["punch_ms"],
+                     elapsed, latest["id"])
                 )
-                conn.commit()
                 journal_event(conn, event_id, "run_created", {
                     "entry_id": entry_id, "stage_id": stage["id"],
                     "attempt": latest["attempt"], "elapsed": elapsed,
                     "source": "cross_chip_fill",
-                })
+                }, commit=False)
 
     elif latest["finish_time"] and not latest["start_time"]:
         # Missing start — look for start punch from any SIAC of this BIB
         placeholders = ",".join("?" for _ in all_siac_ids)
         start_punch = conn.execute(
-            f"""SELECT id, punch_time FROM punches
+            f"""SELECT id, punch_time, punch_ms FROM punches
                WHERE event_id=? AND siac IN ({placeholders}) AND control_code=?
-               AND is_duplicate=0 AND punch_time < ?
-               ORDER BY punch_time DESC LIMIT 1""",
-            (event_id, *all_siac_ids, start_code, latest["finish_time"])
+               AND is_duplicate=0 AND punch_ms < ?
+               ORDER BY punch_ms DESC, id ASC LIMIT 1""",
+            (event_id, *all_siac_ids, start_code, latest["finish_ms"])
         ).fetchone()
 
         if start_punch:
-            start_dt = parse_timestamp(start_punch["punch_time"])
-            finish_dt = parse_timestamp(latest["finish_time"])
-            elapsed = (finish_dt - start_dt).total_seconds()
+            elapsed = elapsed_seconds(start_punch["punch_ms"], latest["finish_ms"])
             if elapsed >= 0:
                 conn.execute(
-                    """UPDATE stage_results SET start_punch_id=?, start_time=?,
+                    """UPDATE stage_results SET start_punch_id=?, start_time=?, start_ms=?,
                        elapsed_seconds=?, status='ok', run_state='valid' WHERE id=?""",
-                    (start_punch["id"], start_punch["punch_time"], elapsed, latest["id"])
+                    (start_punch["id"], start_punch["punch_time"], start_punch["punch_ms"],
+                     elapsed, latest["id"])
                 )
-                conn.commit()
                 journal_event(conn, event_id, "run_created", {
                     "entry_id": entry_id, "stage_id": stage["id"],
                     "attempt": latest["attempt"], "elapsed": elapsed,
                     "source": "cross_chip_fill",
-                })
+                }, commit=False)
 
 
 def resolve_bib(conn: sqlite3.Connection, event_id: int, siac: int) -> int | None:
-    """Lookup SIAC → BIB via chip_mapping table."""
-    row = conn.execute(
-        "SELECT bib FROM chip_mapping WHERE event_id=? AND siac=?",
-        (event_id, siac)
-    ).fetchone()
-    return row["bib"] if row else None
+    """Lookup SIAC → BIB via the cached chip_mapping."""
+    return get_structure(conn, event_id).bib_by_siac.get(siac)
+
+
+def resolve_entry_id(conn: sqlite3.Connection, event_id: int,
+                     siac: int) -> int | None:
+    """Lookup SIAC → BIB → entry id. Returns None if the chip or BIB is unknown."""
+    entry = get_structure(conn, event_id).entry_for_siac(siac)
+    return entry["id"] if entry else None
 
 
 def _find_stage_for_control(conn: sqlite3.Connection, event_id: int,
-                            control_code: int) -> sqlite3.Row | None:
+                            control_code: int) -> dict | None:
     """Find a stage where this control code is used as start or finish."""
-    row = conn.execute(
-        """SELECT s.* FROM stages s
-           JOIN controls c ON (c.id = s.start_control_id OR c.id = s.finish_control_id)
-           WHERE s.event_id=? AND c.code=?
-           LIMIT 1""",
-        (event_id, control_code)
-    ).fetchone()
-    return row
+    return get_structure(conn, event_id).stage_by_code.get(control_code)
 
 
 def _get_next_attempt(conn: sqlite3.Connection, event_id: int, entry_id: int,
@@ -305,9 +370,11 @@ def _get_next_attempt(conn: sqlite3.Connection, event_id: int, entry_id: int,
 
 
 def _check_source_override(conn: sqlite3.Connection, event_id: int,
-                            entry_id: int, stage: sqlite3.Row,
+                            entry_id: int, stage: dict,
                             punch_id: int, control_code: int,
-                            punch_time: str) -> bool:
+                            punch_time: str,
+                            new_source: str | None = None,
+                            punch_ms: int | None = None) -> bool:
     """Check if a new punch should override an existing completed result via source priority.
 
     If the new punch's source has higher priority (lower number) than the existing
@@ -316,21 +383,17 @@ def _check_source_override(conn: sqlite3.Connection, event_id: int,
     - Create a new stage_result with the higher-priority punch
     - Returns True if override happened (caller should skip normal processing)
     """
-    # Get new punch source
-    new_punch = conn.execute(
-        "SELECT source FROM punches WHERE id=?", (punch_id,)
-    ).fetchone()
-    if not new_punch:
-        return False
-    new_source = new_punch["source"]
+    # Get new punch source (callers that already know it pass it in)
+    if new_source is None:
+        new_punch = conn.execute(
+            "SELECT source FROM punches WHERE id=?", (punch_id,)
+        ).fetchone()
+        if not new_punch:
+            return False
+        new_source = new_punch["source"]
     new_prio = SOURCE_PRIORITY.get(new_source, 99)
 
-    start_code = conn.execute(
-        "SELECT code FROM controls WHERE id=?", (stage["start_control_id"],)
-    ).fetchone()["code"]
-    finish_code = conn.execute(
-        "SELECT code FROM controls WHERE id=?", (stage["finish_control_id"],)
-    ).fetchone()["code"]
+    start_code, finish_code = get_structure(conn, event_id).stage_codes[stage["id"]]
 
     is_start = (control_code == start_code)
     is_finish = (control_code == finish_code)
@@ -382,43 +445,47 @@ def _check_source_override(conn: sqlite3.Connection, event_id: int,
         "entry_id": entry_id,
         "stage_id": stage["id"],
         "reason": f"{new_source}_override",
-    })
+    }, commit=False)
 
     # Create new result, keeping the other punch from the old result
     new_attempt = existing["attempt"]  # Reuse same attempt number
     # Actually, we need a new unique attempt number since UNIQUE(event_id, entry_id, stage_id, attempt)
     next_attempt = _get_next_attempt(conn, event_id, entry_id, stage["id"])
 
+    if punch_ms is None:
+        punch_ms = timestamp_ms(punch_time)
     if is_start:
         # New start punch, keep old finish
         conn.execute(
             """INSERT INTO stage_results
-               (event_id, entry_id, stage_id, start_punch_id, start_time,
-                finish_punch_id, finish_time, attempt, status, run_state)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'pending', 'pending')""",
-            (event_id, entry_id, stage["id"], punch_id, punch_time,
-             existing["finish_punch_id"], existing["finish_time"], next_attempt)
+               (event_id, entry_id, stage_id, start_punch_id, start_time, start_ms,
+                finish_punch_id, finish_time, finish_ms, attempt, status, run_state)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'pending', 'pending')""",
+            (event_id, entry_id, stage["id"], punch_id, punch_time, punch_ms,
+             existing["finish_punch_id"], existing["finish_time"], existing["finish_ms"],
+             next_attempt)
         )
     else:
         # New finish punch, keep old start
         conn.execute(
             """INSERT INTO stage_results
-               (event_id, entry_id, stage_id, start_punch_id, start_time,
-                finish_punch_id, finish_time, attempt, status, run_state)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'pending', 'pending')""",
+               (event_id, entry_id, stage_id, start_punch_id, start_time, start_ms,
+                finish_punch_id, finish_time, finish_ms, attempt, status, run_state)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'pending', 'pending')""",
             (event_id, entry_id, stage["id"],
-             existing["start_punch_id"], existing["start_time"],
-             punch_id, punch_time, next_attempt)
+             existing["start_punch_id"], existing["start_time"], existing["start_ms"],
+             punch_id, punch_time, punch_ms, next_attempt)
         )
 
-    conn.commit()
     _finalize_result(conn, event_id, entry_id, stage["id"], next_attempt)
     return True
 
 
 def _update_stage_result(conn: sqlite3.Connection, event_id: int, entry_id: int,
-                         stage: sqlite3.Row, punch_id: int,
-                         control_code: int, punch_time: str) -> None:
+                         stage: dict, punch_id: int,
+                         control_code: int, punch_time: str,
+                         source: str | None = None,
+                         punch_ms: int | None = None) -> None:
     """Create or update stage_result when start/finish punch arrives.
 
     Multi-attempt logic:
@@ -440,17 +507,15 @@ def _update_stage_result(conn: sqlite3.Connection, event_id: int, entry_id: int,
       Discard the stale one and keep the newer punch.
     - If a result is already 'ok', a new finish is ignored (go to next attempt via start).
     """
+    if punch_ms is None:
+        punch_ms = timestamp_ms(punch_time)
+
     # Check source priority override first
     if _check_source_override(conn, event_id, entry_id, stage, punch_id,
-                               control_code, punch_time):
+                               control_code, punch_time, source, punch_ms):
         return  # Override handled, skip normal processing
 
-    start_code = conn.execute(
-        "SELECT code FROM controls WHERE id=?", (stage["start_control_id"],)
-    ).fetchone()["code"]
-    finish_code = conn.execute(
-        "SELECT code FROM controls WHERE id=?", (stage["finish_control_id"],)
-    ).fetchone()["code"]
+    start_code, finish_code = get_structure(conn, event_id).stage_codes[stage["id"]]
 
     is_start = (control_code == start_code)
     is_finish = (control_code == finish_code)
@@ -473,18 +538,17 @@ def _update_stage_result(conn: sqlite3.Connection, event_id: int, entry_id: int,
         if is_start:
             conn.execute(
                 """INSERT INTO stage_results
-                   (event_id, entry_id, stage_id, start_punch_id, start_time, attempt, status, run_state)
-                   VALUES (?, ?, ?, ?, ?, 1, 'pending', 'pending')""",
-                (event_id, entry_id, stage["id"], punch_id, punch_time)
+                   (event_id, entry_id, stage_id, start_punch_id, start_time, start_ms, attempt, status, run_state)
+                   VALUES (?, ?, ?, ?, ?, ?, 1, 'pending', 'pending')""",
+                (event_id, entry_id, stage["id"], punch_id, punch_time, punch_ms)
             )
         else:
             conn.execute(
                 """INSERT INTO stage_results
-                   (event_id, entry_id, stage_id, finish_punch_id, finish_time, attempt, status, run_state)
-                   VALUES (?, ?, ?, ?, ?, 1, 'pending', 'pending')""",
-                (event_id, entry_id, stage["id"], punch_id, punch_time)
+                   (event_id, entry_id, stage_id, finish_punch_id, finish_time, finish_ms, attempt, status, run_state)
+                   VALUES (?, ?, ?, ?, ?, ?, 1, 'pending', 'pending')""",
+                (event_id, entry_id, stage["id"], punch_id, punch_time, punch_ms)
             )
-        conn.commit()
         _finalize_result(conn, event_id, entry_id, stage["id"], 1)
         return
 
@@ -500,27 +564,23 @@ def _update_stage_result(conn: sqlite3.Connection, event_id: int, entry_id: int,
             new_attempt = current_attempt + 1
             conn.execute(
                 """INSERT INTO stage_results
-                   (event_id, entry_id, stage_id, start_punch_id, start_time, attempt, status, run_state)
-                   VALUES (?, ?, ?, ?, ?, ?, 'pending', 'pending')""",
-                (event_id, entry_id, stage["id"], punch_id, punch_time, new_attempt)
+                   (event_id, entry_id, stage_id, start_punch_id, start_time, start_ms, attempt, status, run_state)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', 'pending')""",
+                (event_id, entry_id, stage["id"], punch_id, punch_time, punch_ms, new_attempt)
             )
-            conn.commit()
             _finalize_result(conn, event_id, entry_id, stage["id"], new_attempt)
             return
 
         # Current attempt not completed — update start time
         if latest["start_time"]:
             # Already have a start. Keep the LATER start (more likely correct).
-            old_dt = parse_timestamp(latest["start_time"])
-            new_dt = parse_timestamp(punch_time)
-            if new_dt <= old_dt:
+            if punch_ms <= latest["start_ms"]:
                 return  # Older start, skip
         conn.execute(
-            """UPDATE stage_results SET start_punch_id=?, start_time=?,
+            """UPDATE stage_results SET start_punch_id=?, start_time=?, start_ms=?,
                elapsed_seconds=NULL, status='pending', run_state='pending' WHERE id=?""",
-            (punch_id, punch_time, latest["id"])
+            (punch_id, punch_time, punch_ms, latest["id"])
         )
-        conn.commit()
         _finalize_result(conn, event_id, entry_id, stage["id"], current_attempt)
 
     else:
@@ -530,9 +590,7 @@ def _update_stage_result(conn: sqlite3.Connection, event_id: int, entry_id: int,
             return
 
         if latest["start_time"]:
-            start_dt = parse_timestamp(latest["start_time"])
-            new_finish_dt = parse_timestamp(punch_time)
-            new_elapsed = (new_finish_dt - start_dt).total_seconds()
+            new_elapsed = elapsed_seconds(latest["start_ms"], punch_ms)
 
             if new_elapsed < 0:
                 # Negative = this finish is stale (before start). Skip it.
@@ -540,27 +598,23 @@ def _update_stage_result(conn: sqlite3.Connection, event_id: int, entry_id: int,
 
             # Valid positive time — update; set status='ok' and run_state='valid'
             conn.execute(
-                """UPDATE stage_results SET finish_punch_id=?, finish_time=?,
+                """UPDATE stage_results SET finish_punch_id=?, finish_time=?, finish_ms=?,
                    elapsed_seconds=?, status='ok', run_state='valid' WHERE id=?""",
-                (punch_id, punch_time, new_elapsed, latest["id"])
+                (punch_id, punch_time, punch_ms, new_elapsed, latest["id"])
             )
-            conn.commit()
             journal_event(conn, event_id, "run_created", {
                 "entry_id": entry_id, "stage_id": stage["id"],
                 "attempt": current_attempt, "elapsed": new_elapsed,
-            })
+            }, commit=False)
         else:
             # No start yet. Keep the latest finish.
             if latest["finish_time"]:
-                old_dt = parse_timestamp(latest["finish_time"])
-                new_dt = parse_timestamp(punch_time)
-                if new_dt <= old_dt:
+                if punch_ms <= latest["finish_ms"]:
                     return
             conn.execute(
-                "UPDATE stage_results SET finish_punch_id=?, finish_time=? WHERE id=?",
-                (punch_id, punch_time, latest["id"])
+                "UPDATE stage_results SET finish_punch_id=?, finish_time=?, finish_ms=? WHERE id=?",
+                (punch_id, punch_time, punch_ms, latest["id"])
             )
-            conn.commit()
             _finalize_result(conn, event_id, entry_id, stage["id"], current_attempt)
 
 
@@ -577,22 +631,19 @@ def _finalize_result(conn: sqlite3.Connection, event_id: int, entry_id: int,
     ).fetchone()
 
     if result and result["start_time"] and result["finish_time"] and result["status"] != "ok":
-        start_dt = parse_timestamp(result["start_time"])
-        finish_dt = parse_timestamp(result["finish_time"])
-        elapsed = (finish_dt - start_dt).total_seconds()
+        elapsed = elapsed_seconds(result["start_ms"], result["finish_ms"])
         if elapsed >= 0:
             conn.execute(
                 "UPDATE stage_results SET elapsed_seconds=?, status='ok', run_state='valid' WHERE id=?",
                 (elapsed, result["id"])
             )
-            conn.commit()
             # Journal: run created
             journal_event(conn, event_id, "run_created", {
                 "entry_id": entry_id,
                 "stage_id": stage_id,
                 "attempt": attempt,
                 "elapsed": elapsed,
-            })
+            }, commit=False)
 
 
 # ---------------------------------------------------------------------------
@@ -622,11 +673,11 @@ def group_dual_slalom_starts(conn: sqlite3.Connection, event_id: int,
     # Get all non-duplicate start punches in chronological order
     placeholders = ",".join("?" for _ in start_codes)
     punches = conn.execute(
-        f"""SELECT p.id, p.siac, p.control_code, p.punch_time
+        f"""SELECT p.id, p.siac, p.control_code, p.punch_time, p.punch_ms
             FROM punches p
             WHERE p.event_id=? AND p.is_duplicate=0
               AND p.control_code IN ({placeholders})
-            ORDER BY p.punch_time ASC, p.id ASC""",
+            ORDER BY p.punch_ms ASC, p.id ASC""",
         (event_id, *start_codes)
     ).fetchall()
 
@@ -636,56 +687,59 @@ def group_dual_slalom_starts(conn: sqlite3.Connection, event_id: int,
     # Group punches within window
     groups: list[list[dict]] = []
     current_group: list[dict] = []
-    group_start_time: datetime | None = None
+    group_start_ms: int | None = None
 
     for p in punches:
-        pt = parse_timestamp(p["punch_time"])
-        if group_start_time is None or (pt - group_start_time).total_seconds() > window_seconds:
+        pt = p["punch_ms"]
+        if group_start_ms is None or elapsed_seconds(group_start_ms, pt) > window_seconds:
             if current_group:
                 groups.append(current_group)
             current_group = [dict(p)]
-            group_start_time = pt
+            group_start_ms = pt
         else:
             current_group.append(dict(p))
 
     if current_group:
         groups.append(current_group)
 
-    # For each group with 2+ riders, set all start times to earliest
-    group_count = 0
-    for group in groups:
-        if len(group) < 2:
-            continue
+    with transaction(conn):
+        results_changed(conn, event_id)
+        # For each group with 2+ riders, set all start times to earliest
+        group_count = 0
+        for group in groups:
+            if len(group) < 2:
+                continue
 
-        earliest_time = group[0]["punch_time"]  # Already sorted by time
-        group_count += 1
-
-        for p in group:
-            # Update start_time for all stage_results referencing this punch
-            affected = conn.execute(
-                """SELECT id, finish_time, status FROM stage_results
-                   WHERE start_punch_id=?""",
-                (p["id"],)
-            ).fetchall()
-
-            for sr in affected:
-                if sr["finish_time"] and sr["status"] == "ok":
-                    # Recalculate elapsed with grouped start time
-                    start_dt = parse_timestamp(earliest_time)
-                    finish_dt = parse_timestamp(sr["finish_time"])
-                    new_elapsed = (finish_dt - start_dt).total_seconds()
-                    conn.execute(
-                        """UPDATE stage_results SET start_time=?, elapsed_seconds=?
-                           WHERE id=?""",
-                        (earliest_time, new_elapsed, sr["id"])
-                    )
-                else:
-                    conn.execute(
-                        "UPDATE stage_results SET start_time=? WHERE id=?",
-                        (earliest_time, sr["id"])
-                    )
+            earliest_time = group[0]["punch_time"]  # Already sorted by time
+            earliest_ms = group[0]["punch_ms"]
+            group_count += 1
+
+            for p in group:
+                # Update start_time for all stage_results referencing this punch
+                affected = conn.execute(
+                    """SELECT id, finish_time, finish_ms, status FROM stage_results
+                       WHERE start_punch_id=?""",
+                    (p["id"],)
+                ).fetchall()
+
+                for sr in affected:
+                    if sr["finish_time"] and sr["status"] == "ok":
+                        # Recalculate elapsed with grouped start time
+                        new_elapsed = elapsed_seconds(earliest_ms, sr["finish_ms"])
+                        conn.execute(
+                            """UPDATE stage_results SET start_time=?, start_ms=?, elapsed_seconds=?
+                               WHERE id=?""",
+                            (earliest_time, earliest_ms, new_elapsed, sr["id"])
+                        )
+                    else:
+                        conn.execute(
+                            "UPDATE stage_results SET start_time=?, start_ms=? WHERE id=?",
+                            (earliest_time, earliest_ms, sr["id"])
+                        )
+
+        if group_count:
+            leaderboard.rebuild(conn, event_id)
 
-    conn.commit()
     return group_count
 
 
@@ -693,44 +747,91 @@ def group_dual_slalom_starts(conn: sqlite3.Connection, event_id: int,
 # Overall results
 # ---------------------------------------------------------------------------
 
-def calculate_overall_results(conn: sqlite3.Connection, event_id: int) -> None:
-    """Recalculate overall results for all entries in an event."""
+def calculate_overall_results(conn: sqlite3.Connection, event_id: int,
+                              entry_ids: Optional[list[int]] = None,
+                              previous_class_ids: Optional[set[int]] = None) -> None:
+    """Recalculate overall results for an event.
+
+    entry_ids: None = full recalculation of every entry in the event.
+    A list switches to incremental mode: only those entries are recomputed and
+    only the places that moved are re-ranked (from the in-memory class
+    standings, see leaderboard.ClassStandings), so the cost of one punch
+    stays flat as the field grows.
+    previous_class_ids: classes these entries were just moved out of; they are
+    re-ranked in full too so no gap is left in their positions.
+    """
     event = conn.execute("SELECT * FROM events WHERE id=?", (event_id,)).fetchone()
     if not event:
         return
 
-    entries = conn.execute(
-        "SELECT * FROM entries WHERE event_id=?", (event_id,)
-    ).fetchall()
+    if entry_ids is None:
+        entries = conn.execute(
+            "SELECT * FROM entries WHERE event_id=?", (event_id,)
+        ).fetchall()
+    else:
+        if not entry_ids:
+            return
+        placeholders = ",".join("?" for _ in entry_ids)
+        entries = conn.execute(
+            f"SELECT * FROM entries WHERE event_id=? AND id IN ({placeholders})",
+            (event_id, *entry_ids)
+        ).fetchall()
 
-    # Get stages relevant to each entry via their class→course→course_stages
-    for entry in entries:
-        timed_stages = _get_entry_timed_stages(conn, event_id, entry)
-        total, status = _calc_entry_total(conn, event, entry, timed_stages)
+    # Incremental mode ranks from the in-memory class standings, loaded before
+    # any total changes. Class moves re-rank with SQL, like a full recalculation.
+    incremental = entry_ids is not None and not previous_class_ids
+    standings = leaderboard.get_standings(conn, event_id) if incremental else None
+
+    with transaction(conn):
+        results_changed(conn, event_id)
+        # Get stages relevant to each entry via their class→course→course_stages
+        changes = []
+        for entry in entries:
+            total, status = _update_entry_overall(conn, event, entry)
+            changes.append((entry["id"], entry["class_id"],
+                            total if status == "ok" else None))
+
+        # Now calculate rankings per class (only the touched places in incremental mode)
+        if incremental:
+            _rank_entries(conn, event_id, standings, changes)
+        else:
+            invalidate(conn, event_id, leaderboard.STANDINGS_SLOT)
+            if entry_ids is None:
+                _calculate_rankings(conn, event_id)
+            else:
+                _calculate_rankings(conn, event_id, {e["class_id"] for e in entries}
+                                    | previous_class_ids)
 
-        existing = conn.execute(
-            "SELECT id FROM overall_results WHERE event_id=? AND entry_id=?",
-            (event_id, entry["id"])
-        ).fetchone()
 
-        if existing:
-            conn.execute(
-                """UPDATE overall_results
-                   SET total_seconds=?, status=?, updated_at=datetime('now')
-                   WHERE id=?""",
-                (total, status, existing["id"])
-            )
-        else:
-            conn.execute(
-                """INSERT INTO overall_results (event_id, entry_id, total_seconds, status)
-                   VALUES (?, ?, ?, ?)""",
-                (event_id, entry["id"], total, status)
-            )
+def _update_entry_overall(conn: sqlite3.Connection, event: sqlite3.Row,
+                          entry: sqlite3.Row) -> tuple[float | None, str]:
+    """Recompute and upsert the overall_results row for one entry.
 
-    conn.commit()
+    Returns the entry's (total_seconds, status).
+    """
+    event_id = event["id"]
+    timed_stages = _get_entry_timed_stages(conn, event_id, entry)
+    total, status = _calc_entry_total(conn, event, entry, timed_stages)
+
+    existing = conn.execute(
+        "SELECT id FROM overall_results WHERE event_id=? AND entry_id=?",
+        (event_id, entry["id"])
+    ).fetchone()
 
-    # Now calculate rankings per class
-    _calculate_rankings(conn, event_id)
+    if existing:
+        conn.execute(
+            """UPDATE overall_results
+               SET total_seconds=?, status=?, updated_at=datetime('now')
+               WHERE id=?""",
+            (total, status, existing["id"])
+        )
+    else:
+        conn.execute(
+            """INSERT INTO overall_results (event_id, entry_id, total_seconds, status)
+               VALUES (?, ?, ?, ?)""",
+            (event_id, entry["id"], total, status)
+        )
+    return total, status
 
 
 def _get_entry_timed_stages(conn: sqlite3.Connection, event_id: int,
@@ -897,17 +998,23 @@ def _calc_xc(conn: sqlite3.Connection, event_id: int, entry_id: int,
     return _calc_enduro(conn, event_id, entry_id, timed_stages)
 
 
-def _calculate_rankings(conn: sqlite3.Connection, event_id: int) -> None:
-    """Assign position and time_behind per class."""
-    classes = conn.execute(
-        "SELECT DISTINCT cl.id, cl.name FROM classes cl "
-        "JOIN entries e ON e.class_id = cl.id WHERE e.event_id=?",
-        (event_id,)
-    ).fetchall()
+def _calculate_rankings(conn: sqlite3.Connection, event_id: int,
+                        class_ids: Optional[set[int]] = None) -> None:
+    """Assign position and time_behind per class.
+
+    class_ids: restrict re-ranking to these classes (None = all classes).
+    Only rows whose position or time_behind actually changed are written.
+    """
+    if class_ids is None:
+        class_ids = {r["id"] for r in conn.execute(
+            "SELECT DISTINCT cl.id FROM classes cl "
+            "JOIN entries e ON e.class_id = cl.id WHERE e.event_id=?",
+            (event_id,)
+        ).fetchall()}
 
-    for cls in classes:
+    for class_id in class_ids:
         results = conn.execute(
-            """SELECT o.id, o.total_seconds, o.status
+            """SELECT o.id, o.total_seconds, o.status, o.position, o.time_behind
                FROM overall_results o
                JOIN entries e ON o.entry_id = e.id
                WHERE o.event_id=? AND e.class_id=?
@@ -915,8 +1022,8 @@ def _calculate_rankings(conn: sqlite3.Connection, event_id: int) -> None:
                  CASE WHEN o.status='ok' THEN 0
                       WHEN o.status='pending' THEN 1
                       ELSE 2 END,
-                 o.total_seconds ASC""",
-            (event_id, cls["id"])
+                 o.total_seconds ASC, o.entry_id""",
+            (event_id, class_id)
         ).fetchall()
 
         leader_time = None
@@ -927,17 +1034,41 @@ def _calculate_rankings(conn: sqlite3.Connection, event_id: int) -> None:
                 if leader_time is None:
                     leader_time = r["total_seconds"]
                 behind = r["total_seconds"] - leader_time
+                if r["position"] == pos and r["time_behind"] == behind:
+                    continue
                 conn.execute(
                     "UPDATE overall_results SET position=?, time_behind=? WHERE id=?",
                     (pos, behind, r["id"])
                 )
-            else:
+            elif r["position"] is not None or r["time_behind"] is not None:
                 conn.execute(
                     "UPDATE overall_results SET position=NULL, time_behind=NULL WHERE id=?",
                     (r["id"],)
                 )
 
-    conn.commit()
+
+def _rank_entries(conn: sqlite3.Connection, event_id: int,
+                  standings: leaderboard.ClassStandings,
+                  changes: list[tuple[int, int, float | None]]) -> None:
+    """Incremental _calculate_rankings for a few entries.
+
+    changes: (entry_id, class_id, total) with total None unless the status is
+    ok. Only the places ClassStandings.update() reports as moved are written.
+    """
+    ranked, cleared = standings.update(changes)
+    if ranked:
+        conn.executemany(
+            "UPDATE overall_results SET position=?, time_behind=? "
+            "WHERE event_id=? AND entry_id=?",
+            [(pos, behind, event_id, entry_id) for entry_id, pos, behind in ranked]
+        )
+    if cleared:
+        conn.executemany(
+            "UPDATE overall_results SET position=NULL, time_behind=NULL "
+            "WHERE event_id=? AND entry_id=?",
+            [(event_id, entry_id) for entry_id in cleared]
+        )
+
 
 
 # ---------------------------------------------------------------------------
@@ -954,6 +1085,7 @@ def import_startlist_csv(conn: sqlite3.Connection, event_id: int,
     warnings = []
     count = 0
     class_cache = {}
+    moved: dict[int, int] = {}   # entry_id → class it left
 
     # Ensure a default course exists
     default_course = conn.execute(
@@ -1022,7 +1154,7 @@ def import_startlist_csv(conn: sqlite3.Connection, event_id: int,
             class_id = class_cache[class_name]
 
             existing = conn.execute(
-                "SELECT id FROM entries WHERE event_id=? AND bib=?",
+                "SELECT id, class_id FROM entries WHERE event_id=? AND bib=?",
                 (event_id, bib)
             ).fetchone()
             if existing:
@@ -1031,6 +1163,8 @@ def import_startlist_csv(conn: sqlite3.Connection, event_id: int,
                        WHERE id=?""",
                     (first_name, last_name, club, class_id, existing["id"])
                 )
+                if existing["class_id"] != class_id:
+                    moved[existing["id"]] = existing["class_id"]
             else:
                 conn.execute(
                     """INSERT INTO entries (event_id, bib, first_name, last_name, club, class_id)
@@ -1039,7 +1173,11 @@ def import_startlist_csv(conn: sqlite3.Connection, event_id: int,
                 )
             count += 1
 
-    conn.commit()
+    if moved:
+        leaderboard.move_entries(conn, event_id, list(moved))
+    commit_and_invalidate(conn, event_id)
+    if moved:
+        calculate_overall_results(conn, event_id, list(moved), set(moved.values()))
     return count, warnings
 
 
@@ -1113,7 +1251,7 @@ def import_chipmapping_csv(conn: sqlite3.Connection, event_id: int,
                     except ValueError:
                         warnings.append(f"Rad {i+1}: Ogiltigt SIAC2 '{siac2}'")
 
-    conn.commit()
+    commit_and_invalidate(conn, event_id)
     return count, warnings
 
 
@@ -1126,7 +1264,7 @@ def import_roc_punches(conn: sqlite3.Connection, event_id: int,
     """
     warnings = []
     total = 0
-    new = 0
+    punches: list[dict] = []
 
     with open(filepath, "r", encoding="utf-8-sig") as f:
         for line in f:
@@ -1149,19 +1287,14 @@ def import_roc_punches(conn: sqlite3.Connection, event_id: int,
                 continue
 
             total += 1
+            punches.append({
+                "roc_punch_id": roc_id, "control_code": control_code,
+                "siac": siac, "punch_time": punch_time,
+            })
 
-            existing = conn.execute(
-                "SELECT id FROM punches WHERE event_id=? AND roc_punch_id=?",
-                (event_id, roc_id)
-            ).fetchone()
-            if existing:
-                continue
-
-            punch_id = ingest_punch(conn, event_id, siac, control_code,
-                                    punch_time, source="roc",
-                                    roc_punch_id=roc_id)
-            if punch_id:
-                new += 1
+    # Whole file in one transaction; already imported ROC ids are skipped
+    new = len(ingest_punches_batch(conn, event_id, punches, source="roc",
+                                   update_overall=False))
 
     return total, new, warnings
 
@@ -1324,52 +1457,22 @@ def export_overall_results_csv(conn: sqlite3.Connection, event_id: int,
 # Recalculate all
 # ---------------------------------------------------------------------------
 
-def recalculate_all(conn: sqlite3.Connection, event_id: int) -> list[str]:
-    """Full recalc: clear stage_results + overall_results, replay all non-dup punches.
-
-    Returns list of diff messages (empty = idempotent, everything matches).
-    """
-    import logging
-    logger = logging.getLogger("gravitytiming.recompute")
-
-    # 1. Snapshot current results
-    old_stage = {
-        (r["entry_id"], r["stage_id"], r["attempt"]): {
-            "elapsed_seconds": r["elapsed_seconds"],
-            "status": r["status"],
-            "run_state": r["run_state"] if "run_state" in r.keys() else "valid",
-        }
-        for r in conn.execute(
-            "SELECT * FROM stage_results WHERE event_id=? AND run_state='valid'",
-            (event_id,)
-        ).fetchall()
-    }
-    old_overall = {
-        r["entry_id"]: {
-            "total_seconds": r["total_seconds"],
-            "position": r["position"],
-            "status": r["status"],
-        }
-        for r in conn.execute(
-            "SELECT * FROM overall_results WHERE event_id=?", (event_id,)
-        ).fetchall()
-    }
-
-    # 2. Delete and replay
+def _replay_punches(conn: sqlite3.Connection, event_id: int) -> None:
+    """Rebuild results by replaying every non-dup punch (inside a transaction)."""
     conn.execute("DELETE FROM stage_results WHERE event_id=?", (event_id,))
     conn.execute("DELETE FROM overall_results WHERE event_id=?", (event_id,))
-    conn.commit()
+    leaderboard.rebuild(conn, event_id)  # empty — refilled by the replay
 
     punches = conn.execute(
         """SELECT * FROM punches
            WHERE event_id=? AND is_duplicate=0
-           ORDER BY punch_time ASC, id ASC""",
+           ORDER BY punch_ms ASC, id ASC""",
         (event_id,)
     ).fetchall()
 
     for p in punches:
         _process_punch(conn, event_id, p["id"], p["siac"],
-                       p["control_code"], p["punch_time"])
+                       p["control_code"], p["punch_time"], p["source"], p["punch_ms"])
 
     # Apply dual slalom grouping if applicable
     event = conn.execute("SELECT * FROM events WHERE id=?", (event_id,)).fetchone()
@@ -1378,10 +1481,10 @@ def recalculate_all(conn: sqlite3.Connection, event_id: int) -> list[str]:
 
     calculate_overall_results(conn, event_id)
 
-    # 3. Compare with snapshot
-    diffs = []
 
-    new_stage = {
+def results_snapshot(conn: sqlite3.Connection, event_id: int) -> tuple[dict, dict]:
+    """Valid stage results and overall results of an event, as compared by diff_results."""
+    stage = {
         (r["entry_id"], r["stage_id"], r["attempt"]): {
             "elapsed_seconds": r["elapsed_seconds"],
             "status": r["status"],
@@ -1392,7 +1495,7 @@ def recalculate_all(conn: sqlite3.Connection, event_id: int) -> list[str]:
             (event_id,)
         ).fetchall()
     }
-    new_overall = {
+    overall = {
         r["entry_id"]: {
             "total_seconds": r["total_seconds"],
             "position": r["position"],
@@ -1402,6 +1505,14 @@ def recalculate_all(conn: sqlite3.Connection, event_id: int) -> list[str]:
             "SELECT * FROM overall_results WHERE event_id=?", (event_id,)
         ).fetchall()
     }
+    return stage, overall
+
+
+def diff_results(old: tuple[dict, dict], new: tuple[dict, dict]) -> list[str]:
+    """Diff messages between two results_snapshot()s (empty = everything matches)."""
+    old_stage, old_overall = old
+    new_stage, new_overall = new
+    diffs = []
 
     # Stage result diffs
     all_keys = set(old_stage.keys()) | set(new_stage.keys())
@@ -1443,6 +1554,38 @@ def recalculate_all(conn: sqlite3.Connection, event_id: int) -> list[str]:
             if old_val["position"] != new_val["position"]:
                 diffs.append(f"overall POS: entry={eid} pos {old_val['position']} → {new_val['position']}")
 
+    return diffs
+
+
+def recalculate_all(conn: sqlite3.Connection, event_id: int,
+                    bulk: bool = True, workers: Optional[int] = None) -> list[str]:
+    """Full recalc: clear stage_results + overall_results, replay all non-dup punches.
+
+    bulk=True computes everything in memory in one pass (core/recompute.py),
+    split over `workers` processes (None: automatic for large events);
+    bulk=False replays each punch through _process_punch (reference path).
+    To check results without replacing them, see recompute.shadow_recompute().
+
+    Returns list of diff messages (empty = idempotent, everything matches).
+    """
+    import logging
+    from core.recompute import recompute_event
+    logger = logging.getLogger("gravitytiming.recompute")
+
+    # 1. Snapshot current results
+    old = results_snapshot(conn, event_id)
+
+    # 2. Delete and replay — one transaction, so a failed replay leaves the
+    #    previous results untouched
+    with transaction(conn):
+        results_changed(conn, event_id)
+        if bulk:
+            recompute_event(conn, event_id, workers)
+        else:
+            _replay_punches(conn, event_id)
+
+    # 3. Compare with snapshot
+    diffs = diff_results(old, results_snapshot(conn, event_id))
     if diffs:
         for d in diffs:
             logger.warning("Recompute diff: %s", d)
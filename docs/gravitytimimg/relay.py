@@ -0,0 +1,118 @@
+"""
+GravityTiming — Broadcast relay.
+
+Serves spectator traffic (/ws, the public /standings page and the standings
+JSON it reads) from a separate process, fed by the timing server's
+broadcast stream. Run one or more next to the timing server to spread
+spectator sockets over more cores; the timing server keeps only its own
+screens and a single upstream socket per relay.
+
+Usage:
+    python relay.py                                  # :8090, upstream :8080
+    python relay.py --port 8091 --upstream http://127.0.0.1:8080
+"""
+
+import argparse
+import logging
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse
+from fastapi.templating import Jinja2Templates
+
+from api import assets
+from api.relay import RelayClient
+from api.static_files import PrecompressedStaticFiles
+from api.websocket import router as ws_router, manager as ws_manager
+
+logger = logging.getLogger("gravitytiming.relay")
+
+BASE_DIR = Path(__file__).parent
+
+PORT = 8090
+UPSTREAM = "http://127.0.0.1:8080"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup: follow the timing server. Shutdown: stop following."""
+    ws_manager.relay_mode = True
+    app.state.relay = RelayClient(app.state.upstream, ws_manager)
+    app.state.relay.start()
+    yield
+    await app.state.relay.stop()
+
+
+app = FastAPI(title="GravityTiming relay", lifespan=lifespan)
+app.state.upstream = UPSTREAM
+
+asset_manifest = assets.AssetManifest(BASE_DIR / "web" / "static",
+                                      BASE_DIR / "data" / "assets").build()
+app.mount("/assets", PrecompressedStaticFiles(directory=str(asset_manifest.out_dir),
+                                              cache_control=assets.CACHE_CONTROL),
+          name="assets")
+app.mount("/static", PrecompressedStaticFiles(directory=str(BASE_DIR / "web" / "static"),
+                                              cache_control="no-cache"),
+          name="static")
+templates = Jinja2Templates(directory=str(BASE_DIR / "web" / "templates"))
+templates.env.globals["asset_url"] = asset_manifest.url
+
+app.include_router(ws_router)
+
+
+@app.get("/standings", response_class=HTMLResponse)
+async def standings_page(request: Request):
+    return templates.TemplateResponse(request, "standings.html")
+
+
+# ─── Read-only API from the standings mirror ────────────────────────
+
+@app.get("/api/status")
+async def relay_status(request: Request):
+    relay = request.app.state.relay
+    upstream = await relay.current_status() or {}
+    return {
+        "server": "GravityTiming relay",
+        "active_event": upstream.get("active_event"),
+        "ws_connections": ws_manager.connection_count,
+        "relay": relay.get_status(),
+    }
+
+
+@app.get("/api/events/{event_id}/classes")
+async def relay_classes(event_id: int):
+    names = sorted({r["class_name"] for r in ws_manager.mirrored_standings(event_id)})
+    return [{"name": name} for name in names]
+
+
+@app.get("/api/events/{event_id}/overall")
+async def relay_overall(request: Request, event_id: int,
+                        class_name: Optional[str] = Query(None, alias="class")):
+    if not request.app.state.relay.synced:
+        raise HTTPException(503, "Relay not synced with the timing server yet")
+    return ws_manager.mirrored_standings(event_id, class_name)
+
+
+@app.get("/api/ws/status")
+async def relay_ws_status():
+    return ws_manager.stats()
+
+
+# ─── Main ────────────────────────────────────────────────────────────
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="GravityTiming broadcast relay")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--upstream", default=UPSTREAM,
+                        help="timing server base URL (default: %(default)s)")
+    args = parser.parse_args()
+
+    app.state.upstream = args.upstream
+    print(f"GravityTiming relay — http://localhost:{args.port}/standings "
+          f"(upstream {args.upstream})")
+    uvicorn.run(app, host="0.0.0.0", port=args.port, log_level="warning",
+                ws_per_message_deflate=True)
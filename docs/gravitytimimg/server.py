@@ -12,18 +12,19 @@ from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI, Request
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse, JSONResponse
+from starlette.exceptions import HTTPException
 
-import time as _time
-
-from core.database import get_connection, init_db, migrate_db, create_backup
+from core import database
+from core.database import get_connection, init_db, migrate_db, create_backup, close_pools
+from core.dedup import get_dedup_index
 from api.routes import router as api_router
-from api.websocket import router as ws_router, manager as ws_manager
-
-# Cache-bust value: set once at server start so all pages get fresh JS/CSS
-_CACHE_BUST = str(int(_time.time()))
+from api.websocket import router as ws_router
+from api.snapshots import publisher as snapshot_publisher
+from api.static_files import PrecompressedStaticFiles
+from api import assets
+from core.ingest_queue import ingest_queue
 
 logger = logging.getLogger("gravitytiming")
 
@@ -115,11 +116,26 @@ async def lifespan(app: FastAPI):
     conn = get_connection()
     init_db(conn)
     migrate_db(conn)
+    # Dedup index of active events, so the first punch doesn't pay for the rebuild
+    for event in conn.execute("SELECT id FROM events WHERE status='active'").fetchall():
+        get_dedup_index(conn, event["id"])
     conn.close()
 
+    # Hashed static copies and the snapshot directory; done here rather than
+    # at import so spawned recompute workers (which import this module as
+    # __mp_main__) don't rebuild or prune them
+    asset_manifest.build()
+    snapshot_publisher.directory.mkdir(parents=True, exist_ok=True)
+
     # Start auto-backup task
     backup_task = asyncio.create_task(_auto_backup_loop())
 
+    # Single writer for all punch sources and admin writes
+    ingest_queue.start()
+
+    # Pre-rendered standings for spectators (served from /snapshots)
+    snapshot_publisher.start(templates)
+
     # Initialize connection state slots
     app.state.roc_poller = None
     app.state.usb_reader = None
@@ -128,8 +144,11 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     backup_task.cancel()
+    await snapshot_publisher.stop()
     if app.state.roc_poller:
         await app.state.roc_poller.stop()
+    await ingest_queue.stop()
+    close_pools()
 
 
 app = FastAPI(title="GravityTiming", lifespan=lifespan)
@@ -137,20 +156,26 @@ app = FastAPI(title="GravityTiming", lifespan=lifespan)
 # Add admin token middleware
 app.add_middleware(AdminTokenMiddleware)
 
-# Static files — wrapped with no-cache headers so browser always gets fresh files
-class NoCacheStaticFiles(StaticFiles):
-    """StaticFiles with Cache-Control: no-cache on every response."""
-    async def __call__(self, scope, receive, send):
-        async def send_no_cache(message):
-            if message["type"] == "http.response.start":
-                headers = list(message.get("headers", []))
-                headers.append((b"cache-control", b"no-cache, must-revalidate"))
-                message = {**message, "headers": headers}
-            await send(message)
-        await super().__call__(scope, receive, send_no_cache)
-
-app.mount("/static", NoCacheStaticFiles(directory=str(BASE_DIR / "web" / "static")), name="static")
+# Static files — templates link content-hashed copies (cached for a year);
+# the plain /static paths are revalidated on every use
+# (the manifest is built and the directories created at startup, in lifespan)
+asset_manifest = assets.AssetManifest(BASE_DIR / "web" / "static",
+                                      database.DB_DIR / "assets")
+app.mount("/assets", PrecompressedStaticFiles(directory=str(asset_manifest.out_dir),
+                                              cache_control=assets.CACHE_CONTROL,
+                                              check_dir=False),
+          name="assets")
+app.mount("/static", PrecompressedStaticFiles(directory=str(BASE_DIR / "web" / "static"),
+                                              cache_control="no-cache"),
+          name="static")
 templates = Jinja2Templates(directory=str(BASE_DIR / "web" / "templates"))
+templates.env.globals["asset_url"] = asset_manifest.url
+
+# Standings snapshots — short public caching, ETag/Last-Modified revalidation
+snapshot_files = PrecompressedStaticFiles(directory=str(snapshot_publisher.directory),
+                                          cache_control="public, max-age=5",
+                                          check_dir=False)
+app.mount("/snapshots", snapshot_files, name="snapshots")
 
 # API + WebSocket routers
 app.include_router(api_router, prefix="/api")
@@ -162,34 +187,39 @@ app.include_router(ws_router)
 @app.get("/", response_class=HTMLResponse)
 @app.get("/admin", response_class=HTMLResponse)
 async def admin_page(request: Request):
-    return templates.TemplateResponse("admin.html", {
-        "request": request, "cache_bust": _CACHE_BUST,
-    })
+    return templates.TemplateResponse(request, "admin.html")
 
 
 @app.get("/finish", response_class=HTMLResponse)
 async def finish_page(request: Request):
-    return templates.TemplateResponse("finish.html", {"request": request})
+    return templates.TemplateResponse(request, "finish.html")
 
 
 @app.get("/speaker", response_class=HTMLResponse)
 async def speaker_page(request: Request):
-    return templates.TemplateResponse("speaker.html", {"request": request})
+    return templates.TemplateResponse(request, "speaker.html")
 
 
 @app.get("/overlay", response_class=HTMLResponse)
 async def overlay_page(request: Request):
-    return templates.TemplateResponse("overlay.html", {"request": request})
+    return templates.TemplateResponse(request, "overlay.html")
 
 
 @app.get("/start", response_class=HTMLResponse)
 async def start_page(request: Request):
-    return templates.TemplateResponse("start.html", {"request": request})
+    return templates.TemplateResponse(request, "start.html")
 
 
 @app.get("/standings", response_class=HTMLResponse)
 async def standings_page(request: Request):
-    return templates.TemplateResponse("standings.html", {"request": request})
+    # Pre-rendered snapshot of the active event when there is one
+    page = snapshot_publisher.page_path()
+    if page:
+        try:
+            return await snapshot_files.get_response(page, request.scope)
+        except HTTPException:
+            pass
+    return templates.TemplateResponse(request, "standings.html")
 
 
 # ─── Main ────────────────────────────────────────────────────────────
@@ -269,6 +299,7 @@ def _run_server(host: str = "0.0.0.0", port: int = PORT):
     config = uvicorn.Config(
         "server:app", host=host, port=port,
         log_level="warning",
+        ws_per_message_deflate=True,  # compress /ws frames on venue Wi-Fi
     )
     _uvicorn_server = uvicorn.Server(config)
     _uvicorn_server.run()
@@ -289,8 +320,13 @@ def _open_browser(port: int = PORT):
 
 
 if __name__ == "__main__":
+    import multiprocessing
     import sys, threading, os, signal
 
+    # Frozen app: lets spawned recompute workers run their task instead of
+    # starting another server
+    multiprocessing.freeze_support()
+
     dev_mode = "--dev" in sys.argv
     headless = "--headless" in sys.argv or "--no-browser" in sys.argv
 
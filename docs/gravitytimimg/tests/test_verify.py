@@ -254,6 +254,22 @@ def test_multirun_downhill():
     check(overall is not None and abs(overall["total_seconds"] - 42.0) < 0.01,
           f"Total (bästa): {overall['total_seconds'] if overall else 'N/A'}s = 42s")
 
+    # Broadcast of the slower 3rd run: position, gap and neighbour diffs all
+    # refer to the best run (42s), not the latest one (50s)
+    from api.routes import _build_punch_broadcast
+    database.create_entry(conn, event_id, 2, "Andra", "Rider", "Club", class_id)
+    database.create_chip_mapping(conn, event_id, 2, 9999002)
+    timing_engine.ingest_punch(conn, event_id, 9999002, 111, "2026-06-15 10:20:00")
+    timing_engine.ingest_punch(conn, event_id, 9999002, 112, "2026-06-15 10:20:44")
+    third = conn.execute(
+        "SELECT id FROM punches WHERE siac=9999001 AND punch_time='2026-06-15 10:10:50'"
+    ).fetchone()["id"]
+    sr = _build_punch_broadcast(conn, event_id, third)["stage_result"]
+    behind = [n["diff"] for n in sr["neighbours"]["behind"]]
+    check(sr["position"] == 1 and sr["behind"] == "" and behind == [2.0],
+          f"Broadcast utgår från bästa åket (pos {sr['position']}, "
+          f"'{sr['behind']}', grannar {behind})")
+
     conn.close()
 
 
@@ -715,6 +731,12 @@ def test_server_imports():
     try:
         from api.routes import router
         check(len(router.routes) > 30, f"API router: {len(router.routes)} routes")
+        # sqlite runs in run_read/run_write, never on the event loop
+        import inspect
+        on_loop = [r.path for r in router.routes
+                   if "conn" in inspect.signature(r.endpoint).parameters]
+        check(not on_loop, "Inga routes tar en databasanslutning som parameter",
+              str(on_loop))
     except Exception as e:
         check(False, f"API router import: {e}")
 
@@ -731,6 +753,17 @@ def test_server_imports():
     except Exception as e:
         check(False, f"RocPoller import: {e}")
 
+    # HTML pages render (no lifespan: /standings falls back to the template)
+    try:
+        from fastapi.testclient import TestClient
+        import server
+        client = TestClient(server.app)
+        pages = ("/admin", "/finish", "/speaker", "/overlay", "/start", "/standings")
+        codes = {page: client.get(page).status_code for page in pages}
+        check(all(code == 200 for code in codes.values()), f"HTML-sidor: {codes}")
+    except Exception as e:
+        check(False, f"HTML-sidor: {e!r}")
+
 
 # ======================================================================
 # TEST 13: run_state pending → valid flow
@@ -1051,6 +1084,2396 @@ def test_sync_journal():
     conn.close()
 
 
+# ======================================================================
+# TEST 18: Incremental overall results (per-entry + per-class re-rank)
+# ======================================================================
+
+def test_incremental_overall():
+    print("\n" + "=" * 70)
+    print("TEST 18: Incremental overall results")
+    print("=" * 70)
+
+    conn = make_db()
+
+    event_id = database.create_event(
+        conn, "Incremental Test", "2026-06-15", fmt="enduro",
+        time_precision="seconds"
+    )
+
+    start_id = database.create_control(conn, event_id, 11, "Start SS1", "start")
+    finish_id = database.create_control(conn, event_id, 12, "Mål SS1", "finish")
+    stage_id = database.create_stage(conn, event_id, 1, "SS1", start_id, finish_id)
+
+    course_id = database.create_course(conn, event_id, "Bana")
+    database.link_course_stage(conn, course_id, stage_id, 1)
+    herr = database.create_class(conn, event_id, course_id, "Herr")
+    dam = database.create_class(conn, event_id, course_id, "Dam")
+
+    riders = [(1, herr, 40), (2, herr, 35), (3, dam, 50), (4, dam, 45)]
+    for bib, class_id, _ in riders:
+        database.create_entry(conn, event_id, bib, f"R{bib}", "Rider", "Club", class_id)
+        database.create_chip_mapping(conn, event_id, bib, 8100000 + bib)
+
+    # Ingest with incremental update after every punch (like the API does)
+    for bib, _, secs in riders:
+        siac = 8100000 + bib
+        for code, ts in ((11, "2026-06-15 10:00:00"),
+                         (12, f"2026-06-15 10:00:{secs:02d}")):
+            timing_engine.ingest_punch(conn, event_id, siac, code, ts)
+            entry_id = timing_engine.resolve_entry_id(conn, event_id, siac)
+            timing_engine.calculate_overall_results(conn, event_id, [entry_id])
+
+    def snapshot():
+        return {
+            r["entry_id"]: (r["total_seconds"], r["position"], r["time_behind"], r["status"])
+            for r in conn.execute(
+                "SELECT * FROM overall_results WHERE event_id=?", (event_id,)
+            ).fetchall()
+        }
+
+    incremental = snapshot()
+    timing_engine.calculate_overall_results(conn, event_id)
+    full = snapshot()
+    check(incremental == full, "Inkrementell = full omräkning",
+          f"{incremental} != {full}")
+    check(len(full) == 4, f"Overall-rader: {len(full)}")
+
+    # Incremental update must leave other classes untouched
+    dam_entry = timing_engine.resolve_entry_id(conn, event_id, 8100003)
+    herr_entry = timing_engine.resolve_entry_id(conn, event_id, 8100001)
+    conn.execute(
+        "UPDATE overall_results SET position=99 WHERE event_id=? AND entry_id=?",
+        (event_id, dam_entry)
+    )
+    conn.commit()
+    timing_engine.calculate_overall_results(conn, event_id, [herr_entry])
+    pos = conn.execute(
+        "SELECT position FROM overall_results WHERE event_id=? AND entry_id=?",
+        (event_id, dam_entry)
+    ).fetchone()["position"]
+    check(pos == 99, f"Annan klass orörd vid inkrementell omräkning (pos={pos})")
+
+    # Empty list = nothing to do
+    timing_engine.calculate_overall_results(conn, event_id, [])
+    check(snapshot()[herr_entry] == full[herr_entry], "Tom lista → ingen ändring")
+
+    # Class change by startlist import: the class the rider left is re-ranked too
+    conn.execute("UPDATE overall_results SET position=NULL WHERE event_id=? AND entry_id=?",
+                 (event_id, dam_entry))
+    conn.commit()
+    timing_engine.calculate_overall_results(conn, event_id)
+    csv_path = os.path.join(tempfile.mkdtemp(), "startlist.csv")
+    with open(csv_path, "w", encoding="utf-8") as f:
+        f.write("BIB;Förnamn;Efternamn;Klubb;Klass\n2;R2;Rider;Club;Dam\n")
+    timing_engine.import_startlist_csv(conn, event_id, csv_path)
+    moved = snapshot()
+    timing_engine.calculate_overall_results(conn, event_id)
+    check(moved == snapshot() and moved[herr_entry][1] == 1,
+          f"Klassbyte: gamla klassen omrankad (Herr-position {moved[herr_entry][1]})")
+
+    # Larger class, finishers out of order and with ties: ranking from the
+    # in-memory standings matches the full ranking
+    junior = database.create_class(conn, event_id, course_id, "Junior")
+    times = [52, 47, 47, 59, 41, 55, 47, 39, 58, 44, 50, 36]
+    for i, secs in enumerate(times):
+        bib = 100 + i
+        database.create_entry(conn, event_id, bib, f"J{bib}", "Rider", "Club", junior)
+        database.create_chip_mapping(conn, event_id, bib, 8110000 + bib)
+        timing_engine.ingest_punch(conn, event_id, 8110000 + bib, 11,
+                                   f"2026-06-15 11:{i:02d}:00", update_overall=True)
+        timing_engine.ingest_punch(conn, event_id, 8110000 + bib, 12,
+                                   f"2026-06-15 11:{i:02d}:{secs:02d}", update_overall=True)
+    incremental = snapshot()
+    timing_engine.calculate_overall_results(conn, event_id)
+    check(incremental == snapshot(), "Inkrementell ranking (stor klass) = full omräkning")
+
+    # The slowest finisher only writes its own place
+    bib = 100 + len(times)
+    database.create_entry(conn, event_id, bib, f"J{bib}", "Rider", "Club", junior)
+    database.create_chip_mapping(conn, event_id, bib, 8110000 + bib)
+    timing_engine.ingest_punch(conn, event_id, 8110000 + bib, 11,
+                               "2026-06-15 11:40:00", update_overall=True)
+    statements = []
+    conn.set_trace_callback(statements.append)
+    timing_engine.ingest_punch(conn, event_id, 8110000 + bib, 12,
+                               "2026-06-15 11:41:05", update_overall=True)
+    conn.set_trace_callback(None)
+    ranks = [st for st in statements if st.startswith("UPDATE overall_results SET position")]
+    check(len(ranks) == 1 and not any("FROM overall_results o" in st for st in statements),
+          f"Sist i mål: en placering skrivs, ingen klass-SELECT ({len(ranks)})",
+          "\n".join(statements))
+    incremental = snapshot()
+    timing_engine.calculate_overall_results(conn, event_id)
+    check(incremental == snapshot(), "Inkrementell ranking efter sist i mål = full omräkning")
+
+    conn.close()
+
+
+# ======================================================================
+# TEST 19: Event structure cache (few statements per punch + invalidation)
+# ======================================================================
+
+def test_event_cache():
+    print("\n" + "=" * 70)
+    print("TEST 19: Event structure cache")
+    print("=" * 70)
+
+    conn = make_db()
+
+    event_id = database.create_event(
+        conn, "Cache Test", "2026-06-15", fmt="enduro",
+        time_precision="seconds"
+    )
+
+    start_id = database.create_control(conn, event_id, 11, "Start SS1", "start")
+    finish_id = database.create_control(conn, event_id, 12, "Mål SS1", "finish")
+    alt_finish_id = database.create_control(conn, event_id, 13, "Mål SS1 (ny)", "finish")
+    stage_id = database.create_stage(conn, event_id, 1, "SS1", start_id, finish_id)
+
+    course_id = database.create_course(conn, event_id, "Bana")
+    database.link_course_stage(conn, course_id, stage_id, 1)
+    class_id = database.create_class(conn, event_id, course_id, "Herr")
+    entry_id = database.create_entry(conn, event_id, 1, "Test", "Rider", "Club", class_id)
+    database.create_chip_mapping(conn, event_id, 1, 8200001)
+
+    timing_engine.ingest_punch(conn, event_id, 8200001, 11, "2026-06-15 10:00:00")
+
+    # Count SQL statements for the finish punch (cache is warm)
+    statements = []
+    conn.set_trace_callback(statements.append)
+    timing_engine.ingest_punch(conn, event_id, 8200001, 12, "2026-06-15 10:00:30")
+    conn.set_trace_callback(None)
+    sql = [st for st in statements if st.split()[0] not in ("BEGIN", "COMMIT")]
+    check(len(sql) <= 7, f"SQL-satser per punch: {len(sql)} (max 7)",
+          "\n".join(sql))
+
+    # New chip mapping is picked up (create_chip_mapping invalidates)
+    check(timing_engine.resolve_bib(conn, event_id, 8200002) is None,
+          "Okänt chip → ingen BIB")
+    database.create_chip_mapping(conn, event_id, 1, 8200002, is_primary=0)
+    check(timing_engine.resolve_bib(conn, event_id, 8200002) == 1,
+          "Nytt chip syns direkt efter create_chip_mapping")
+
+    # A reader that rebuilds the structure just before the commit (from the
+    # old snapshot) must not leave it cached: invalidation follows the commit
+    reader = database.get_connection(conn.db_key)
+    real_commit = conn.commit
+
+    def commit_with_reader():
+        timing_engine.resolve_bib(reader, event_id, 8200003)
+        real_commit()
+
+    conn.commit = commit_with_reader
+    database.create_chip_mapping(conn, event_id, 1, 8200003, is_primary=0)
+    del conn.commit
+    check(timing_engine.resolve_bib(conn, event_id, 8200003) == 1,
+          "Cache byggd före commit kastas (invalidering efter commit)")
+    reader.close()
+
+    # A slow build never replaces a value stored meanwhile (it may have been
+    # updated in place), and one overtaken by invalidate() is not stored
+    from core import event_cache
+    stored = []
+
+    def slow_build(c, eid):
+        stored.append(event_cache.cached(c, eid, "test", lambda c2, e2: ["först"]))
+        return ["sen"]
+
+    first = event_cache.cached(conn, event_id, "test", slow_build)
+    check(first is stored[0] and
+          event_cache.cached(conn, event_id, "test", slow_build) is stored[0],
+          "Cache: första lagrade värdet vinner över ett långsamt bygge")
+
+    def invalidated_build(c, eid):
+        event_cache.invalidate(c, eid)
+        return ["före invalidering"]
+
+    event_cache.cached(conn, event_id, "test2", invalidated_build)
+    check(event_cache.cached(conn, event_id, "test2", lambda c, e: ["ny"]) == ["ny"],
+          "Cache: bygge som startade före invalidate() sparas inte")
+
+    # Changing a stage's finish control is picked up (update_stage invalidates)
+    database.update_stage(conn, stage_id, finish_control_id=alt_finish_id)
+    timing_engine.ingest_punch(conn, event_id, 8200001, 11, "2026-06-15 11:00:00")
+    timing_engine.ingest_punch(conn, event_id, 8200001, 13, "2026-06-15 11:00:40")
+    sr = conn.execute(
+        "SELECT elapsed_seconds FROM stage_results WHERE event_id=? AND entry_id=? "
+        "AND attempt=2",
+        (event_id, entry_id)
+    ).fetchone()
+    check(sr is not None and sr["elapsed_seconds"] == 40.0,
+          f"Ny målkontroll används efter update_stage: {sr['elapsed_seconds'] if sr else 'N/A'}s")
+
+    # Separate databases with the same event id never share cache entries
+    other = make_db()
+    other_event = database.create_event(other, "Other", "2026-06-15")
+    check(other_event == event_id and
+          timing_engine.resolve_bib(other, other_event, 8200001) is None,
+          "Cache separerad per databasfil")
+    other.close()
+
+    conn.close()
+
+
+# ======================================================================
+# TEST 20: One commit per punch, full rollback on error
+# ======================================================================
+
+def test_punch_transaction():
+    print("\n" + "=" * 70)
+    print("TEST 20: Punch in one transaction")
+    print("=" * 70)
+
+    conn = make_db()
+
+    event_id = database.create_event(
+        conn, "Txn Test", "2026-06-15", fmt="enduro",
+        time_precision="seconds"
+    )
+
+    start_id = database.create_control(conn, event_id, 11, "Start SS1", "start")
+    finish_id = database.create_control(conn, event_id, 12, "Mål SS1", "finish")
+    stage_id = database.create_stage(conn, event_id, 1, "SS1", start_id, finish_id)
+
+    course_id = database.create_course(conn, event_id, "Bana")
+    database.link_course_stage(conn, course_id, stage_id, 1)
+    class_id = database.create_class(conn, event_id, course_id, "Herr")
+    entry_id = database.create_entry(conn, event_id, 1, "Test", "Rider", "Club", class_id)
+    database.create_chip_mapping(conn, event_id, 1, 8300001)
+
+    timing_engine.ingest_punch(conn, event_id, 8300001, 11, "2026-06-15 10:00:00",
+                               update_overall=True)
+
+    # Finish punch: punch + stage result + journal + overall → exactly one commit
+    statements = []
+    conn.set_trace_callback(statements.append)
+    timing_engine.ingest_punch(conn, event_id, 8300001, 12, "2026-06-15 10:00:30",
+                               update_overall=True)
+    conn.set_trace_callback(None)
+    commits = [st for st in statements if st.split()[0] == "COMMIT"]
+    check(len(commits) == 1, f"Commits per punch: {len(commits)} (förväntat 1)")
+    overall = conn.execute(
+        "SELECT total_seconds, position FROM overall_results WHERE entry_id=?",
+        (entry_id,)
+    ).fetchone()
+    check(overall is not None and overall["total_seconds"] == 30.0
+          and overall["position"] == 1,
+          "Overall uppdaterad i samma transaktion")
+
+    def counts():
+        return tuple(
+            conn.execute(f"SELECT COUNT(*) FROM {t} WHERE event_id=?",
+                         (event_id,)).fetchone()[0]
+            for t in ("punches", "stage_results", "sync_queue")
+        )
+
+    # Failure late in the punch (ranking step) must roll back everything
+    before = counts()
+    original = timing_engine._rank_entries
+
+    def failing_rankings(*args, **kwargs):
+        raise RuntimeError("simulated failure")
+
+    timing_engine._rank_entries = failing_rankings
+    try:
+        timing_engine.ingest_punch(conn, event_id, 8300001, 11, "2026-06-15 10:05:00",
+                                   update_overall=True)
+        timing_engine.ingest_punch(conn, event_id, 8300001, 12, "2026-06-15 10:05:40",
+                                   update_overall=True)
+        check(False, "Fel i ranking ska avbryta punchen")
+    except RuntimeError:
+        pass
+    finally:
+        timing_engine._rank_entries = original
+
+    check(not conn.in_transaction, "Ingen öppen transaktion efter fel")
+    check(counts() == before,
+          f"Rollback: punches/stage_results/journal oförändrade {counts()} == {before}")
+
+    # Connection is still usable and the engine picks up where it left off
+    timing_engine.ingest_punch(conn, event_id, 8300001, 11, "2026-06-15 10:10:00",
+                               update_overall=True)
+    timing_engine.ingest_punch(conn, event_id, 8300001, 12, "2026-06-15 10:10:25",
+                               update_overall=True)
+    best = conn.execute(
+        "SELECT total_seconds FROM overall_results WHERE entry_id=?", (entry_id,)
+    ).fetchone()
+    check(best["total_seconds"] == 25.0,
+          f"Punch efter rollback fungerar: {best['total_seconds']}s")
+
+    # Results version moves only after a commit, never inside sqlite3's
+    # implicit transaction (a reader could cache old rows under it)
+    from core import event_cache
+    dbk = event_cache.db_key(conn)
+    version = event_cache.results_version(dbk, event_id)
+    conn.execute("UPDATE stage_results SET elapsed_seconds=24 WHERE event_id=?",
+                 (event_id,))
+    try:
+        with database.transaction(conn):
+            database.results_changed(conn, event_id)
+        refused = False
+    except RuntimeError:
+        refused = True
+    conn.rollback()
+    check(refused and event_cache.results_version(dbk, event_id) == version,
+          "after_commit vägrar i implicit transaktion (version oförändrad)")
+    with database.transaction(conn):
+        database.results_changed(conn, event_id)
+        during = event_cache.results_version(dbk, event_id)
+    check(during == version and event_cache.results_version(dbk, event_id) != version,
+          "Resultatversionen flyttas efter commit")
+
+    conn.close()
+
+
+# ======================================================================
+# TEST 21: A page of punches is applied in one transaction
+# ======================================================================
+
+def test_batch_ingest():
+    print("\n" + "=" * 70)
+    print("TEST 21: Batch ingest of punches")
+    print("=" * 70)
+
+    conn = make_db()
+
+    event_id = database.create_event(
+        conn, "Batch Test", "2026-06-15", fmt="enduro",
+        time_precision="seconds"
+    )
+
+    start_id = database.create_control(conn, event_id, 11, "Start SS1", "start")
+    finish_id = database.create_control(conn, event_id, 12, "Mål SS1", "finish")
+    stage_id = database.create_stage(conn, event_id, 1, "SS1", start_id, finish_id)
+
+    course_id = database.create_course(conn, event_id, "Bana")
+    database.link_course_stage(conn, course_id, stage_id, 1)
+    class_id = database.create_class(conn, event_id, course_id, "Herr")
+    for bib in range(1, 6):
+        database.create_entry(conn, event_id, bib, f"Rider{bib}", "Test", "Club", class_id)
+        database.create_chip_mapping(conn, event_id, bib, 8400000 + bib)
+
+    # ROC backlog: start + finish for 5 riders, one punch repeated in the page
+    page = []
+    roc_id = 1
+    for bib in range(1, 6):
+        for code, ts in ((11, f"2026-06-15 10:0{bib}:00"),
+                         (12, f"2026-06-15 10:0{bib}:{30 + bib}")):
+            page.append({"roc_punch_id": roc_id, "control_code": code,
+                         "siac": 8400000 + bib, "punch_time": ts})
+            roc_id += 1
+    page.append(dict(page[0]))
+
+    statements = []
+    conn.set_trace_callback(statements.append)
+    ids = timing_engine.ingest_punches_batch(conn, event_id, page)
+    conn.set_trace_callback(None)
+
+    commits = [st for st in statements if st.split()[0] == "COMMIT"]
+    check(len(commits) == 1, f"Commits per sida: {len(commits)} (förväntat 1)")
+    check(len(ids) == 10, f"10 nya punchar (upprepat ROC-id hoppas över): {len(ids)}")
+
+    rows = conn.execute(
+        """SELECT e.bib, o.total_seconds, o.position FROM overall_results o
+           JOIN entries e ON o.entry_id = e.id
+           WHERE o.event_id=? ORDER BY o.position""",
+        (event_id,)
+    ).fetchall()
+    check([r["bib"] for r in rows] == [1, 2, 3, 4, 5],
+          f"Overall-ordning: {[r['bib'] for r in rows]}")
+    check(rows[0]["total_seconds"] == 31.0, f"Ledartid: {rows[0]['total_seconds']}s")
+
+    # Re-delivering the same page (ROC retry) adds nothing
+    again = timing_engine.ingest_punches_batch(conn, event_id, page)
+    total = conn.execute("SELECT COUNT(*) FROM punches WHERE event_id=?",
+                         (event_id,)).fetchone()[0]
+    check(again == [] and total == 10, f"Omleverans ignoreras: {len(again)} nya, {total} totalt")
+
+    # Same result as the one-punch-at-a-time path
+    diffs = timing_engine.recalculate_all(conn, event_id)
+    check(len(diffs) == 0, f"Recompute efter batch ger 0 diffar ({len(diffs)})",
+          "\n".join(diffs))
+
+    conn.close()
+
+
+# ======================================================================
+# TEST 22: Blocking DB work runs off the event loop
+# ======================================================================
+
+def test_db_executor():
+    print("\n" + "=" * 70)
+    print("TEST 22: DB executor (writer thread + read pool)")
+    print("=" * 70)
+
+    import asyncio
+    import threading
+    import time
+    from pathlib import Path
+    from core import db_executor
+
+    old_dir = database.DB_DIR
+    database.DB_DIR = Path(tempfile.mkdtemp())
+    try:
+        conn = database.get_connection()
+        database.init_db(conn)
+        database.migrate_db(conn)
+        event_id = database.create_event(conn, "Executor Test", "2026-06-15")
+        conn.close()
+
+        def slow_write(c):
+            with database.transaction(c):
+                c.execute("UPDATE events SET name='Långsam' WHERE id=?", (event_id,))
+                time.sleep(0.5)
+            return threading.current_thread().name
+
+        def read_name(c):
+            row = c.execute("SELECT name FROM events WHERE id=?", (event_id,)).fetchone()
+            return row["name"], threading.current_thread().name
+
+        async def scenario():
+            loop_thread = threading.current_thread().name
+            writer = asyncio.create_task(db_executor.run_write(slow_write))
+            await asyncio.sleep(0.05)
+
+            # Event loop keeps running and readers are served during the write
+            t0 = time.perf_counter()
+            name, reader_thread = await db_executor.run_read(read_name)
+            read_ms = (time.perf_counter() - t0) * 1000
+
+            writer_thread = await writer
+            after, _ = await db_executor.run_read(read_name)
+            return loop_thread, writer_thread, reader_thread, name, after, read_ms
+
+        loop_thread, writer_thread, reader_thread, name, after, read_ms = asyncio.run(scenario())
+        check(writer_thread.startswith("gt-db-writer") and writer_thread != loop_thread,
+              f"Skrivning på writer-tråden ({writer_thread})")
+        check(reader_thread.startswith("gt-db-reader"),
+              f"Läsning i läspoolen ({reader_thread})")
+        check(name == "Executor Test" and read_ms < 400,
+              f"Läsning under pågående skrivning: {read_ms:.0f} ms, ser committad data")
+        check(after == "Långsam", "Skrivningen committad efteråt")
+    finally:
+        database.DB_DIR = old_dir
+
+
+# ======================================================================
+# TEST 23: Single-writer queue applies jobs in arrival order
+# ======================================================================
+
+def test_ingest_queue():
+    print("\n" + "=" * 70)
+    print("TEST 23: Ingest queue (single writer, order, metrics)")
+    print("=" * 70)
+
+    import asyncio
+    from pathlib import Path
+    from core.ingest_queue import IngestQueue
+
+    old_dir = database.DB_DIR
+    database.DB_DIR = Path(tempfile.mkdtemp())
+    try:
+        conn = database.get_connection()
+        database.init_db(conn)
+        database.migrate_db(conn)
+        event_id = database.create_event(conn, "Queue Test", "2026-06-15")
+        conn.close()
+
+        queue = IngestQueue()
+        connections = set()
+
+        def write_punch(c, siac, code):
+            connections.add(id(c))
+            with database.transaction(c):
+                c.execute(
+                    "INSERT INTO punches (event_id, siac, control_code, punch_time, source) "
+                    "VALUES (?, ?, ?, '2026-06-15 10:00:00', 'manual')",
+                    (event_id, siac, code)
+                )
+
+        def failing(c):
+            raise ValueError("trasig punch")
+
+        async def scenario():
+            jobs = []
+            for i in range(30):
+                source = "roc" if i % 2 else "manual"
+                jobs.append(queue.submit(source, write_punch, 1000 + i, i))
+                if i == 10:
+                    jobs.append(queue.submit("manual", failing))
+            results = await asyncio.gather(*jobs, return_exceptions=True)
+            stats = queue.stats()
+            await queue.stop()
+            return results, stats
+
+        results, stats = asyncio.run(scenario())
+        errors = [r for r in results if isinstance(r, Exception)]
+        check(len(errors) == 1 and isinstance(errors[0], ValueError),
+              "Fel i ett jobb returneras till anroparen, kön fortsätter")
+
+        conn = database.get_connection()
+        codes = [r["control_code"] for r in conn.execute(
+            "SELECT control_code FROM punches WHERE event_id=? ORDER BY id",
+            (event_id,)
+        ).fetchall()]
+        conn.close()
+        check(codes == list(range(30)), f"Ankomstordning bevarad ({len(codes)} punchar)")
+        check(len(connections) == 1, f"En enda skrivanslutning ({len(connections)})")
+        check(stats["processed"] == 31 and stats["failed"] == 1 and stats["depth"] == 0,
+              f"Stats: processed={stats['processed']} failed={stats['failed']} "
+              f"depth={stats['depth']}")
+        check(stats["max_depth"] >= 2 and stats["by_source"] == {"manual": 16, "roc": 15},
+              f"Köns maxdjup {stats['max_depth']}, per källa {stats['by_source']}")
+        check(stats["latency_ms"]["p95"] is not None,
+              f"Latens p95: {stats['latency_ms']['p95']} ms")
+
+        # A job failing inside an implicit transaction: rolled back, caches dropped
+        from core import event_cache
+        queue = IngestQueue()
+        built = []
+
+        def half_written(c):
+            c.execute("INSERT INTO punches (event_id, siac, control_code, punch_time, "
+                      "source) VALUES (?, 1, 1, '2026-06-15 10:00:00', 'manual')",
+                      (event_id,))
+            event_cache.cached(c, event_id, "test", lambda c, e: built.append(1))
+            raise ValueError("halvskriven")
+
+        async def rollback_scenario():
+            await asyncio.gather(queue.submit("manual", half_written),
+                                 return_exceptions=True)
+            await queue.stop()
+
+        asyncio.run(rollback_scenario())
+        conn = database.get_connection()
+        left = conn.execute("SELECT COUNT(*) FROM punches WHERE siac=1").fetchone()[0]
+        event_cache.cached(conn, event_id, "test", lambda c, e: built.append(1))
+        conn.close()
+        check(left == 0 and len(built) == 2,
+              f"Rollback i kön släpper händelsecachen (rader {left}, byggen {len(built)})")
+    finally:
+        database.DB_DIR = old_dir
+
+
+# ======================================================================
+# TEST 24: Pooled connections are reused and handed back clean
+# ======================================================================
+
+def test_connection_pool():
+    print("\n" + "=" * 70)
+    print("TEST 24: Connection pool")
+    print("=" * 70)
+
+    import threading
+    from pathlib import Path
+
+    db_path = Path(tempfile.mkdtemp()) / "pool.db"
+    conn = database.get_connection(db_path)
+    database.init_db(conn)
+    database.migrate_db(conn)
+    conn.close()
+
+    pool = database.ConnectionPool(db_path, size=2)
+
+    with pool.connection() as c1:
+        first = id(c1)
+        fk = c1.execute("PRAGMA foreign_keys").fetchone()[0]
+        mode = c1.execute("PRAGMA journal_mode").fetchone()[0]
+    with pool.connection() as c2:
+        check(id(c2) == first, "Samma anslutning återanvänds")
+    check(fk == 1 and mode == "wal", f"Pragmas satta en gång (fk={fk}, {mode})")
+
+    # Pooled connections only read; writes belong to the ingest queue
+    with pool.connection() as c:
+        try:
+            c.execute("INSERT INTO events (name, date) VALUES ('Stray', '2026-06-15')")
+            refused = False
+        except sqlite3.OperationalError:
+            refused = True
+    check(refused, "Poolad anslutning vägrar skrivningar (query_only)")
+
+    # An abandoned transaction is rolled back before the connection is reused
+    writable = database.ConnectionPool(db_path, size=1, read_only=False)
+    with writable.connection() as c:
+        c.execute("INSERT INTO events (name, date) VALUES ('Halv', '2026-06-15')")
+    with writable.connection() as c:
+        left = c.execute("SELECT COUNT(*) FROM events WHERE name='Halv'").fetchone()[0]
+        check(not c.in_transaction and left == 0,
+              "Öppen transaktion rullas tillbaka vid release")
+    writable.close_all()
+
+    # Busy pool opens extra connections; only `size` are kept idle
+    held = [pool.acquire() for _ in range(4)]
+    check(pool.stats()["open"] == 4, f"Överflöd öppnas vid behov: {pool.stats()}")
+    for c in held:
+        pool.release(c)
+    check(pool.stats()["idle"] == 2 and pool.stats()["open"] == 2,
+          f"Max {pool.size} vilande kvar: {pool.stats()}")
+
+    # Connections can be used from a worker thread
+    result = []
+    def worker():
+        with pool.connection() as c:
+            result.append(c.execute("SELECT 1").fetchone()[0])
+    t = threading.Thread(target=worker)
+    t.start()
+    t.join()
+    check(result == [1], "Anslutning användbar från annan tråd")
+
+    pool.close_all()
+    check(pool.stats()["open"] == 0, "close_all stänger vilande anslutningar")
+
+    # API writes are queued on the single writer, never run on a pooled connection
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from api.routes import router as api_router
+    from core.ingest_queue import ingest_queue
+
+    old_dir = database.DB_DIR
+    database.DB_DIR = db_path.parent
+    database.DB_NAME, old_name = db_path.name, database.DB_NAME
+    try:
+        app = FastAPI()
+        app.include_router(api_router, prefix="/api")
+        before = ingest_queue.stats()["by_source"].get("admin", 0)
+        with TestClient(app) as client:
+            event_id = client.post("/api/events", json={
+                "name": "API", "date": "2026-06-15"}).json()["id"]
+            course_id = client.post(f"/api/events/{event_id}/courses",
+                                    json={"name": "Bana"}).json()["id"]
+            class_id = client.post(f"/api/events/{event_id}/classes", json={
+                "name": "Herr", "course_id": course_id}).json()["id"]
+            client.post(f"/api/events/{event_id}/entries", json={
+                "bib": 1, "first_name": "A", "last_name": "B", "class_id": class_id})
+            client.post("/api/race/pause-ingest")
+            entries = client.get(f"/api/events/{event_id}/entries").json()
+            paused = client.get("/api/race/state").json()["ingest_paused"]
+            client.post("/api/race/resume-ingest")
+        admin = ingest_queue.stats()["by_source"].get("admin", 0) - before
+        check([e["bib"] for e in entries] == [1] and paused,
+              "Skrivande API-anrop fungerar med läsande pool")
+        check(admin == 6, f"Alla API-skrivningar via skrivkön (admin: {admin})")
+    finally:
+        database.DB_DIR, database.DB_NAME = old_dir, old_name
+
+
+# ======================================================================
+# TEST 25: Materialized stage leaderboards (position without full scans)
+# ======================================================================
+
+def test_leaderboards():
+    print("\n" + "=" * 70)
+    print("TEST 25: Stage leaderboards")
+    print("=" * 70)
+
+    from core import leaderboard
+    from core.event_cache import invalidate_all
+
+    # Pure structure: ties share a position, moves keep the order sorted
+    board = leaderboard.Leaderboard()
+    for entry_id, t in [(1, 50.0), (2, 45.0), (3, 45.0), (4, 60.0)]:
+        board.set(entry_id, t)
+    check([board.rank(e) for e in (2, 3, 1, 4)] == [1, 1, 3, 4],
+          f"Delad placering vid lika tid: {[board.rank(e) for e in (2, 3, 1, 4)]}")
+    board.set(4, 40.0)
+    st = board.standing(1)
+    check(board.rank(4) == 1 and st["position"] == 4 and st["gap"] == 10.0,
+          f"Flytt uppdaterar ordningen (pos {st['position']}, gap {st['gap']})")
+    check(st["ahead"] == [(3, 45.0)] and st["behind"] == [],
+          f"Grannar: ahead={st['ahead']} behind={st['behind']}")
+    board.set(4, None)
+    check(board.rank(4) is None and len(board) == 3, "Borttagning")
+
+    # Engine keeps memory + table in step
+    conn = make_db()
+    event_id = database.create_event(conn, "Board Test", "2026-06-15", fmt="enduro")
+    start_id = database.create_control(conn, event_id, 11, "Start SS1", "start")
+    finish_id = database.create_control(conn, event_id, 12, "Mål SS1", "finish")
+    stage_id = database.create_stage(conn, event_id, 1, "SS1", start_id, finish_id)
+    course_id = database.create_course(conn, event_id, "Bana")
+    database.link_course_stage(conn, course_id, stage_id, 1)
+    herr = database.create_class(conn, event_id, course_id, "Herr")
+    dam = database.create_class(conn, event_id, course_id, "Dam")
+    times = {1: 52, 2: 48, 3: 55, 4: 47, 5: 50}
+    entry_ids = {}
+    for bib, secs in times.items():
+        cls = herr if bib <= 3 else dam
+        entry_ids[bib] = database.create_entry(conn, event_id, bib, f"R{bib}", "Test", "", cls)
+        database.create_chip_mapping(conn, event_id, bib, 8500000 + bib)
+        timing_engine.ingest_punch(conn, event_id, 8500000 + bib, 11,
+                                   f"2026-06-15 10:0{bib}:00")
+        timing_engine.ingest_punch(conn, event_id, 8500000 + bib, 12,
+                                   f"2026-06-15 10:0{bib}:{secs}", update_overall=True)
+
+    boards = leaderboard.get_leaderboards(conn, event_id)
+    stage_board = boards.stage(stage_id)
+    check([stage_board.rank(entry_ids[b]) for b in (4, 2, 5, 1, 3)] == [1, 2, 3, 4, 5],
+          "Stage-placeringar")
+    check(boards.for_class(stage_id, herr).rank(entry_ids[1]) == 2
+          and boards.for_class(stage_id, dam).rank(entry_ids[5]) == 2,
+          "Klass-placeringar")
+
+    persisted = {
+        r["entry_id"]: r["best_seconds"] for r in conn.execute(
+            "SELECT entry_id, best_seconds FROM stage_leaderboard WHERE event_id=?",
+            (event_id,)
+        ).fetchall()
+    }
+    check(persisted == {entry_ids[b]: float(t) for b, t in times.items()},
+          "stage_leaderboard-tabellen matchar minnet")
+
+    # Broadcast for a finish punch: no full-stage scan of stage_results
+    from api.routes import _build_punch_broadcast
+    last_punch = conn.execute(
+        "SELECT id FROM punches WHERE siac=8500005 AND control_code=12"
+    ).fetchone()["id"]
+    statements = []
+    conn.set_trace_callback(statements.append)
+    data = _build_punch_broadcast(conn, event_id, last_punch)
+    conn.set_trace_callback(None)
+    scans = [st for st in statements
+             if "stage_results" in st and "entry_id" not in st]
+    sr = data["stage_result"]
+    check(not scans, "Ingen helskanning av stage_results i broadcast", "\n".join(scans))
+    check(sr["position"] == 3 and sr["class_position"] == 2 and sr["behind"] == "+0:03",
+          f"Broadcast: pos {sr['position']}, klass {sr['class_position']}, {sr['behind']}")
+    check([n["bib"] for n in sr["neighbours"]["ahead"]] == [2]
+          and [n["bib"] for n in sr["neighbours"]["behind"]] == [1],
+          f"Grannar i broadcast: {sr['neighbours']}")
+
+    # Cold start: rebuilt from the persisted table
+    invalidate_all()
+    cold = leaderboard.get_leaderboards(conn, event_id).stage(stage_id)
+    check(cold.rank(entry_ids[5]) == 3, "Kallstart läser stage_leaderboard")
+
+    diffs = timing_engine.recalculate_all(conn, event_id)
+    check(not diffs and leaderboard.get_leaderboards(conn, event_id)
+          .stage(stage_id).rank(entry_ids[4]) == 1,
+          "Recalculate återskapar leaderboards")
+
+    # A reader rebuilding the boards mid-replay (from the old committed rows)
+    # must not make the replay skip rows of the persisted table
+    reader = database.get_connection(conn.db_key)
+    real_rebuild = leaderboard.rebuild
+
+    def rebuild_then_read(c, eid):
+        real_rebuild(c, eid)
+        leaderboard.get_leaderboards(reader, eid)
+    leaderboard.rebuild = rebuild_then_read
+    try:
+        timing_engine.recalculate_all(conn, event_id, bulk=False)
+    finally:
+        leaderboard.rebuild = real_rebuild
+    rows = conn.execute("SELECT COUNT(*) FROM stage_leaderboard WHERE event_id=?",
+                        (event_id,)).fetchone()[0]
+    check(rows == len(times), f"Replay skriver alla rader trots läsare ({rows})")
+
+    # Memory changes only once the transaction has committed
+    leaderboard.get_leaderboards(reader, event_id)
+    with database.transaction(conn):
+        conn.execute("UPDATE stage_results SET elapsed_seconds=40 WHERE entry_id=?",
+                     (entry_ids[3],))
+        leaderboard.refresh_entry(conn, event_id, entry_ids[3], stage_id, herr)
+        during = leaderboard.get_leaderboards(reader, event_id).stage(stage_id).rank(
+            entry_ids[3])
+    after = leaderboard.get_leaderboards(reader, event_id).stage(stage_id).rank(
+        entry_ids[3])
+    check(during == 5 and after == 1,
+          f"Okommitterad tid syns inte för läsare (under {during}, efter {after})")
+    timing_engine.recalculate_all(conn, event_id)
+    reader.close()
+
+    # Class change by startlist import: boards and table follow the rider
+    leaderboard.get_leaderboards(conn, event_id)   # warm
+    csv_path = os.path.join(tempfile.mkdtemp(), "startlist.csv")
+    with open(csv_path, "w", encoding="utf-8") as f:
+        f.write("BIB;Förnamn;Efternamn;Klubb;Klass\n2;R2;Test;;Dam\n")
+    timing_engine.import_startlist_csv(conn, event_id, csv_path)
+    boards = leaderboard.get_leaderboards(conn, event_id)
+    check(entry_ids[2] not in boards.for_class(stage_id, herr)
+          and boards.for_class(stage_id, dam).rank(entry_ids[2]) == 2,
+          "Klassbyte flyttar åkaren mellan klasstabellerna")
+    row = conn.execute(
+        "SELECT class_id FROM stage_leaderboard WHERE event_id=? AND entry_id=?",
+        (event_id, entry_ids[2])
+    ).fetchone()
+    invalidate_all()
+    check(row["class_id"] == dam and leaderboard.get_leaderboards(conn, event_id)
+          .for_class(stage_id, dam).rank(entry_ids[2]) == 2,
+          "stage_leaderboard får nya klassen (även efter kallstart)")
+
+    conn.close()
+
+
+# ======================================================================
+# TEST 26: Coalesced standings broadcast with per-class diffs
+# ======================================================================
+
+def test_standings_publisher():
+    print("\n" + "=" * 70)
+    print("TEST 26: Standings diffs (debounce per class)")
+    print("=" * 70)
+
+    import asyncio
+    from pathlib import Path
+    from api.websocket import ConnectionManager, STANDINGS_DEBOUNCE
+
+    old_dir = database.DB_DIR
+    database.DB_DIR = Path(tempfile.mkdtemp())
+    try:
+        conn = database.get_connection()
+        database.init_db(conn)
+        database.migrate_db(conn)
+        event_id = database.create_event(conn, "Diff Test", "2026-06-15", fmt="enduro")
+        start_id = database.create_control(conn, event_id, 11, "Start SS1", "start")
+        finish_id = database.create_control(conn, event_id, 12, "Mål SS1", "finish")
+        stage_id = database.create_stage(conn, event_id, 1, "SS1", start_id, finish_id)
+        course_id = database.create_course(conn, event_id, "Bana")
+        database.link_course_stage(conn, course_id, stage_id, 1)
+        herr = database.create_class(conn, event_id, course_id, "Herr")
+        dam = database.create_class(conn, event_id, course_id, "Dam")
+        entry_ids = {}
+        for bib in range(1, 7):
+            cls = herr if bib <= 3 else dam
+            entry_ids[bib] = database.create_entry(conn, event_id, bib, f"R{bib}",
+                                                   "Test", "", cls)
+            database.create_chip_mapping(conn, event_id, bib, 8600000 + bib)
+
+        def finish(bib, secs):
+            timing_engine.ingest_punch(conn, event_id, 8600000 + bib, 11,
+                                       f"2026-06-15 10:0{bib}:00")
+            timing_engine.ingest_punch(conn, event_id, 8600000 + bib, 12,
+                                       f"2026-06-15 10:0{bib}:{secs}",
+                                       update_overall=True)
+
+        for bib, secs in {1: 50, 2: 55, 4: 58, 5: 52}.items():
+            finish(bib, secs)
+
+        manager = ConnectionManager()
+        sent = []
+
+        async def capture(message):
+            sent.append(message)
+        manager.broadcast = capture
+
+        async def settle():
+            await asyncio.sleep(STANDINGS_DEBOUNCE * 2)
+
+        async def scenario():
+            # Burst of marks → one publish per class
+            for _ in range(5):
+                manager.mark_standings_dirty(event_id, {"Herr"})
+                manager.mark_standings_dirty(event_id, {"Dam"})
+            await settle()
+            first = list(sent)
+            sent.clear()
+
+            # Bib 3 wins Herr: only moved/new rows in the diff, Dam untouched
+            finish(3, 45)
+            manager.mark_standings_dirty(event_id, {"Herr"})
+            await settle()
+            second = list(sent)
+            sent.clear()
+
+            # Frozen: marks kept, published on unfreeze
+            database.set_setting(conn, "standings_frozen", "true")
+            finish(6, 40)
+            manager.mark_standings_dirty(event_id, {"Dam"})
+            await settle()
+            frozen = list(sent)
+            database.set_setting(conn, "standings_frozen", "false")
+            manager.schedule_standings()
+            await settle()
+            return first, second, frozen, list(sent)
+
+        first, second, frozen, unfrozen = asyncio.run(scenario())
+
+        check(sorted(m["class"] for m in first) == ["Dam", "Herr"],
+              f"En publicering per klass efter skur: {[m['class'] for m in first]}")
+        herr_first = next(m for m in first if m["class"] == "Herr")
+        check(herr_first["type"] == "standings_diff"
+              and [r["bib"] for r in herr_first["changed"]] == [1, 2],
+              "Första diffen innehåller hela klassen")
+
+        check(len(second) == 1 and second[0]["class"] == "Herr",
+              f"Bara ändrad klass skickas ({[m['class'] for m in second]})")
+        moved = {r["bib"]: r["position"] for r in second[0]["changed"]}
+        check(moved == {3: 1, 1: 2, 2: 3},
+              f"Diff: nya/flyttade rader {moved}")
+        check(second[0]["removed"] == [], "Inga borttagna rader")
+
+        check(frozen == [], "Inget skickas när standings är frysta")
+        check(len(unfrozen) == 1 and {r["bib"] for r in unfrozen[0]["changed"]} == {4, 5, 6},
+              f"Upptining skickar det som ändrats: {[m['class'] for m in unfrozen]}")
+        conn.close()
+    finally:
+        database.DB_DIR = old_dir
+
+
+# ======================================================================
+# TEST 27: Topic subscriptions filter broadcasts server-side
+# ======================================================================
+
+def test_ws_subscriptions():
+    print("\n" + "=" * 70)
+    print("TEST 27: WebSocket subscriptions (server-side filter)")
+    print("=" * 70)
+
+    import asyncio
+    from api.websocket import ConnectionManager, parse_subscription
+
+    class FakeSocket:
+        def __init__(self, name):
+            self.name = name
+            self.received = []
+
+        async def accept(self):
+            pass
+
+        async def send_text(self, data):
+            self.received.append(json.loads(data))
+
+        async def close(self, code=1000):
+            pass
+
+    manager = ConnectionManager()
+    finish3 = FakeSocket("finish3")
+    herr = FakeSocket("herr")
+    overlay = FakeSocket("overlay")
+    admin = FakeSocket("admin")
+
+    def punch(stage, bib, cls):
+        return {"bib": bib, "class": cls, "stage_number": stage,
+                "stage_result": {"stage_number": stage}}
+
+    async def scenario():
+        for ws in (finish3, herr, overlay, admin):
+            await manager.connect(ws)
+        manager.subscribe(finish3, {"type": "subscribe", "types": ["punch"], "stages": [3]})
+        manager.subscribe(herr, {"type": "subscribe", "classes": ["Herr"],
+                                 "types": ["standings_diff"]})
+        manager.subscribe(overlay, {"type": "subscribe",
+                                    "types": ["punch", "highlight"], "event_id": 1})
+        # admin never subscribes → gets everything
+
+        await manager.broadcast_punch(1, punch(3, 7, "Herr"))
+        await manager.broadcast_punch(1, punch(1, 8, "Dam"))
+        await manager.broadcast_punches(1, [punch(3, 9, "Dam"), punch(5, 10, "Herr"),
+                                            punch(3, 11, "Herr")])
+        await manager.broadcast_highlight(1, "new_leader", "x", 7, stage_number=1)
+        await manager.broadcast({"type": "standings_diff", "event_id": 1,
+                                 "class": "Herr", "changed": [], "removed": []})
+        await manager.broadcast({"type": "standings_diff", "event_id": 1,
+                                 "class": "Dam", "changed": [], "removed": []})
+        await manager.broadcast_punch(2, punch(3, 12, "Herr"))
+        await manager.flush()
+
+    asyncio.run(scenario())
+
+    def summary(ws):
+        out = []
+        for m in ws.received:
+            if m["type"] == "punches":
+                out.append(("punches", [p["bib"] for p in m["punches"]]))
+            else:
+                out.append((m["type"], m.get("bib", m.get("class"))))
+        return out
+
+    check(summary(finish3) == [("punch", 7), ("punches", [9, 11]), ("punch", 12)],
+          f"Mål stage 3 får bara stage 3: {summary(finish3)}")
+    check(summary(herr) == [("standings_diff", "Herr")],
+          f"Klassfilter + typfilter: {summary(herr)}")
+    check(summary(overlay) == [("punch", 7), ("punch", 8), ("punches", [9, 10, 11]),
+                               ("highlight", 7)],
+          f"Eventfilter: {summary(overlay)}")
+    check(len(admin.received) == 7, f"Utan prenumeration: allt ({len(admin.received)})")
+
+    check(parse_subscription({"stages": ["x"], "bibs": [], "types": ["punch"]})
+          == {"type": frozenset({"punch", "punches"})},
+          "Ogiltiga/tomma filter ignoreras")
+
+    manager.disconnect(finish3)
+    check(finish3 not in manager.subscriptions and len(manager.subscriptions) == 3,
+          "Frånkoppling tar bort ur indexet")
+
+
+# ======================================================================
+# TEST 28: A slow client does not delay broadcasts to the others
+# ======================================================================
+
+def test_ws_slow_consumer():
+    print("\n" + "=" * 70)
+    print("TEST 28: Slow WS client isolated (queue per client)")
+    print("=" * 70)
+
+    import asyncio
+    import time
+    from api import websocket as ws_module
+
+    class FakeSocket:
+        def __init__(self, delay=0.0):
+            self.delay = delay
+            self.received = []
+            self.received_at = []
+            self.closed = None
+
+        async def accept(self):
+            pass
+
+        async def send_text(self, data):
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            self.received.append(json.loads(data))
+            self.received_at.append(time.perf_counter())
+
+        async def close(self, code=1000):
+            self.closed = code
+
+    old_size, old_timeout = ws_module.SEND_QUEUE_SIZE, ws_module.SEND_TIMEOUT
+    ws_module.SEND_QUEUE_SIZE = 5
+    ws_module.SEND_TIMEOUT = 0.3
+    try:
+        manager = ws_module.ConnectionManager()
+        overlay = FakeSocket()
+        phone = FakeSocket(delay=0.1)
+        frozen = FakeSocket(delay=5.0)
+
+        async def scenario():
+            for ws in (overlay, phone, frozen):
+                await manager.connect(ws)
+            t0 = time.perf_counter()
+            broadcast_ms = 0.0
+            for i in range(20):
+                b0 = time.perf_counter()
+                await manager.broadcast_punch(1, {"bib": i})
+                broadcast_ms = max(broadcast_ms, (time.perf_counter() - b0) * 1000)
+                await asyncio.sleep(0.002)  # punches arrive one at a time
+            await asyncio.sleep(0.05)
+            stats = manager.stats()
+            await asyncio.sleep(0.5)
+            await manager.flush()
+            return t0, broadcast_ms, stats
+
+        t0, broadcast_ms, stats = asyncio.run(scenario())
+    finally:
+        ws_module.SEND_QUEUE_SIZE, ws_module.SEND_TIMEOUT = old_size, old_timeout
+
+    check(broadcast_ms < 50, f"broadcast väntar inte på klienter (max {broadcast_ms:.1f} ms)")
+    overlay_ms = (overlay.received_at[-1] - t0) * 1000 if overlay.received_at else None
+    check(len(overlay.received) == 20 and overlay_ms is not None and overlay_ms < 100,
+          f"Frisk klient får allt direkt ({len(overlay.received)} st, {overlay_ms:.0f} ms)")
+
+    bibs = [m["bib"] for m in phone.received]
+    check(bibs and bibs[-1] == 19 and len(bibs) < 20,
+          f"Långsam klient tappar äldsta, får senaste: {bibs}")
+    depths = {c["depth"] for c in stats["clients"]}
+    check(stats["connections"] == 3 and max(depths) <= 5 and stats["dropped"] > 0,
+          f"Köstatistik per klient: djup {sorted(depths)}, tappade {stats['dropped']}")
+
+    check(frozen.closed == 1013 and frozen not in manager.active
+          and manager.slow_disconnects == 1,
+          f"Hängande klient kopplas ner (close={frozen.closed})")
+
+
+# ======================================================================
+# TEST 29: Frames encoded once per encoding; compact sends metadata once
+# ======================================================================
+
+def test_ws_encoding():
+    print("\n" + "=" * 70)
+    print("TEST 29: WS encoding (shared frames, compact JSON)")
+    print("=" * 70)
+
+    import asyncio
+    from api import websocket as ws_module
+    from api.ws_codec import encode
+
+    class FakeSocket:
+        def __init__(self):
+            self.frames = []
+
+        async def accept(self):
+            pass
+
+        async def send_text(self, data):
+            self.frames.append(data)
+
+        async def close(self, code=1000):
+            pass
+
+    def punch(entry_id, bib, stage):
+        return {"bib": bib, "name": f"Rider{bib} Test", "first_name": f"Rider{bib}",
+                "last_name": "Test", "class": "Herr", "club": "CK Lera",
+                "entry_id": entry_id, "stage_number": stage,
+                "stage_result": {"stage_number": stage, "elapsed": "0:45"}}
+
+    calls = []
+    real_encode = ws_module.encode
+
+    def counting_encode(message, encoding="json"):
+        calls.append(encoding)
+        return real_encode(message, encoding)
+
+    manager = ws_module.ConnectionManager()
+    plain, compact1, compact2 = FakeSocket(), FakeSocket(), FakeSocket()
+
+    async def scenario():
+        for ws in (plain, compact1, compact2):
+            await manager.connect(ws)
+        for ws in (compact1, compact2):
+            manager.subscribe(ws, {"type": "subscribe", "encoding": "compact"})
+        ws_module.encode = counting_encode
+        try:
+            for stage in (1, 2, 3):
+                await manager.broadcast_punch(1, punch(5, 7, stage))
+            await manager.broadcast_punches(1, [punch(5, 7, 4), punch(6, 8, 4)])
+        finally:
+            ws_module.encode = real_encode
+        await manager.flush()
+
+    asyncio.run(scenario())
+
+    check(sorted(calls) == ["compact"] * 4 + ["json"] * 4,
+          f"En kodning per format och meddelande ({len(calls)} st)")
+    check(compact1.frames == compact2.frames,
+          "Kompakta klienter får identiska ramar")
+
+    msgs = [json.loads(f) for f in compact1.frames]
+    entries_msgs = [m for m in msgs if m["type"] == "entries"]
+    check([sorted(m["entries"]) for m in entries_msgs] == [["5"], ["6"]],
+          f"Metadata en gång per åkare och session: {[sorted(m['entries']) for m in entries_msgs]}")
+    check(all("name" not in m and "club" not in m for m in msgs if m["type"] == "punch"),
+          "Kompakta punchar saknar namn/klubb/klass")
+
+    plain_bytes = sum(len(f.encode()) for f in plain.frames)
+    compact_bytes = sum(len(f.encode()) for f in compact1.frames)
+    check(compact_bytes < plain_bytes,
+          f"Färre bytes: kompakt {compact_bytes} B mot json {plain_bytes} B")
+
+    # Client-side rehydration gives back the plain message
+    meta = {}
+    for m in entries_msgs:
+        meta.update({int(k): v for k, v in m["entries"].items()})
+    first = next(m for m in msgs if m["type"] == "punch")
+    e = meta[first["entry_id"]]
+    restored = {**first, "first_name": e["first_name"], "last_name": e["last_name"],
+                "name": f"{e['first_name']} {e['last_name']}",
+                "class": e["class_name"], "club": e["club"]}
+    check(restored == json.loads(plain.frames[0]),
+          "Metadata + kompakt ram = fullständigt meddelande")
+
+    row = {"entry_id": 3, "bib": 9, "first_name": "A", "last_name": "B", "club": "",
+           "class_name": "Dam", "status": "ok", "position": 1,
+           "total_seconds": 40.0, "time_behind": 0.0}
+    frame = encode({"type": "standings_diff", "event_id": 1, "class": "Dam",
+                    "changed": [row], "removed": []}, "compact")
+    check(frame.entries == {3: {"bib": 9, "first_name": "A", "last_name": "B",
+                                "club": "", "class_name": "Dam"}}
+          and "first_name" not in json.loads(frame.data)["changed"][0],
+          "Standings-rader refererar entry_id")
+
+
+# ======================================================================
+# TEST 30: Reconnecting clients get missed deltas or a snapshot
+# ======================================================================
+
+def test_ws_resume():
+    print("\n" + "=" * 70)
+    print("TEST 30: WS reconnect (seq, replay, snapshot)")
+    print("=" * 70)
+
+    import asyncio
+    from pathlib import Path
+    from api import websocket as ws_module
+
+    class FakeSocket:
+        def __init__(self):
+            self.received = []
+
+        async def accept(self):
+            pass
+
+        async def send_text(self, data):
+            self.received.append(json.loads(data))
+
+        async def close(self, code=1000):
+            pass
+
+    old_dir, old_buffer = database.DB_DIR, ws_module.REPLAY_BUFFER
+    database.DB_DIR = Path(tempfile.mkdtemp())
+    ws_module.REPLAY_BUFFER = 10
+    try:
+        conn = database.get_connection()
+        database.init_db(conn)
+        database.migrate_db(conn)
+        event_id = database.create_event(conn, "Resume Test", "2026-06-15", fmt="enduro")
+        start_id = database.create_control(conn, event_id, 11, "Start SS1", "start")
+        finish_id = database.create_control(conn, event_id, 12, "Mål SS1", "finish")
+        stage_id = database.create_stage(conn, event_id, 1, "SS1", start_id, finish_id)
+        course_id = database.create_course(conn, event_id, "Bana")
+        database.link_course_stage(conn, course_id, stage_id, 1)
+        herr = database.create_class(conn, event_id, course_id, "Herr")
+        dam = database.create_class(conn, event_id, course_id, "Dam")
+        for bib, cls, secs in ((1, herr, 50), (2, herr, 45), (3, dam, 55)):
+            database.create_entry(conn, event_id, bib, f"R{bib}", "Test", "", cls)
+            database.create_chip_mapping(conn, event_id, bib, 8700000 + bib)
+            timing_engine.ingest_punch(conn, event_id, 8700000 + bib, 11,
+                                       f"2026-06-15 10:0{bib}:00")
+            timing_engine.ingest_punch(conn, event_id, 8700000 + bib, 12,
+                                       f"2026-06-15 10:0{bib}:{secs}",
+                                       update_overall=True)
+        conn.close()
+
+        manager = ws_module.ConnectionManager()
+
+        def punch(stage, bib):
+            return {"bib": bib, "stage_number": stage,
+                    "stage_result": {"stage_number": stage}}
+
+        async def scenario():
+            first = FakeSocket()
+            await manager.connect(first)
+            manager.subscribe(first, {"type": "subscribe", "stages": [3]})
+            await manager.broadcast_punch(event_id, punch(3, 1))
+            await manager.flush()
+            last_seen = first.received[-1]["seq"]
+            manager.disconnect(first)
+
+            # Missed while offline (nobody connected)
+            await manager.broadcast_punch(event_id, punch(1, 2))
+            await manager.broadcast_punch(event_id, punch(3, 3))
+            await manager.broadcast_punches(event_id, [punch(3, 4), punch(2, 5)])
+
+            back = FakeSocket()
+            await manager.connect(back)
+            manager.subscribe(back, {"type": "subscribe", "stages": [3]})
+            await manager.resume(back, last_seen)
+            await manager.flush()
+
+            # Far behind: ring buffer no longer reaches back
+            for i in range(15):
+                await manager.broadcast_punch(event_id, punch(1, 10 + i))
+            stale = [FakeSocket() for _ in range(3)]
+            reads = []
+            real_read = ws_module.run_read
+
+            async def counting_read(fn, *args):
+                reads.append(fn.__name__)
+                return await real_read(fn, *args)
+            ws_module.run_read = counting_read
+            try:
+                for ws in stale:
+                    await manager.connect(ws)
+                    manager.subscribe(ws, {"type": "subscribe", "event_id": event_id,
+                                           "classes": ["Herr"]})
+                await asyncio.gather(*(manager.resume(ws, last_seen) for ws in stale))
+            finally:
+                ws_module.run_read = real_read
+            await manager.flush()
+            return last_seen, back, stale, reads
+
+        last_seen, back, stale, reads = asyncio.run(scenario())
+
+        seqs = [m["seq"] for m in back.received if m["type"] != "resumed"]
+        check(seqs[0] > last_seen and all(b > a for a, b in zip(seqs, seqs[1:])),
+              f"Seq stiger monotont: {seqs}")
+        replay = [(m["type"], m.get("bib", [p["bib"] for p in m.get("punches", [])]))
+                  for m in back.received]
+        check(replay == [("punch", 3), ("punches", [4]), ("resumed", [])],
+              f"Bara missade stage 3-meddelanden spelas upp: {replay}")
+        check(back.received[-1]["count"] == 2 and back.received[-1]["seq"] == seqs[-1],
+              "resumed anger antal och aktuell seq")
+
+        snapshot = stale[0].received[-1]
+        rows = snapshot.get("standings", {}).get(str(event_id), {})
+        check(snapshot["type"] == "snapshot" and list(rows) == ["Herr"]
+              and [r["bib"] for r in rows["Herr"]] == [2, 1],
+              f"För gammal seq → snapshot för prenumererad klass: {list(rows)}")
+        check(reads.count("standings_by_class") == 1,
+              f"En läsning för alla samtidiga återanslutningar ({reads})")
+    finally:
+        database.DB_DIR, ws_module.REPLAY_BUFFER = old_dir, old_buffer
+
+
+# ======================================================================
+# TEST 31: A relay process mirrors the broadcast stream
+# ======================================================================
+
+def test_ws_relay():
+    print("\n" + "=" * 70)
+    print("TEST 31: Broadcast relay")
+    print("=" * 70)
+
+    import asyncio
+    from api import websocket as ws_module
+
+    class FakeSocket:
+        def __init__(self):
+            self.received = []
+
+        async def accept(self):
+            pass
+
+        async def send_text(self, data):
+            self.received.append(json.loads(data))
+
+        async def close(self, code=1000):
+            pass
+
+    class UpstreamPipe(FakeSocket):
+        """The relay's upstream /ws connection, delivered in-process."""
+        def __init__(self, relay):
+            super().__init__()
+            self.relay = relay
+
+        async def send_text(self, data):
+            await self.relay.relay_message(json.loads(data))
+
+    upstream = ws_module.ConnectionManager()
+    relay = ws_module.ConnectionManager()
+    relay.relay_mode = True
+
+    def row(entry_id, bib, secs, pos):
+        return {"entry_id": entry_id, "bib": bib, "first_name": f"R{bib}",
+                "last_name": "Test", "club": "", "class_name": "Herr", "status": "ok",
+                "position": pos, "total_seconds": secs, "time_behind": secs - 45.0}
+
+    async def scenario():
+        await upstream.broadcast_punch(1, {"bib": 1, "stage_number": 1})
+
+        # Relay starts: subscribes upstream, gets a snapshot (resume=0)
+        pipe = UpstreamPipe(relay)
+        await upstream.connect(pipe)
+        await relay.relay_message({"type": "snapshot", "seq": upstream.seq,
+                                   "standings": {"1": {"Herr": [row(1, 1, 45.0, 1)]}}})
+
+        spectator = FakeSocket()
+        await relay.connect(spectator)
+        relay.subscribe(spectator, {"type": "subscribe", "classes": ["Herr"]})
+
+        await upstream.broadcast_punch(1, {"bib": 2, "class": "Herr", "stage_number": 1})
+        await upstream.broadcast({"type": "standings_diff", "event_id": 1, "class": "Herr",
+                                  "changed": [row(2, 2, 40.0, 1), row(1, 1, 45.0, 2)],
+                                  "removed": []})
+        await upstream.flush()
+        await relay.flush()
+
+        late = FakeSocket()
+        await relay.connect(late)
+        await relay.resume(late, spectator.received[0]["seq"])
+        await relay.flush()
+        return spectator, late
+
+    spectator, late = asyncio.run(scenario())
+
+    check(relay.seq == upstream.seq, f"Relä följer timing-serverns seq ({relay.seq})")
+    check([m["type"] for m in spectator.received] == ["punch", "standings_diff"],
+          f"Åskådare på reläet får strömmen: {[m['type'] for m in spectator.received]}")
+    check([m["seq"] for m in spectator.received]
+          == [m["seq"] for m in list(upstream._history)[-2:]],
+          "Samma seq som timing-servern (resume fungerar mot valfritt relä)")
+    mirrored = relay.mirrored_standings(1, "Herr")
+    check([(r["bib"], r["position"]) for r in mirrored] == [(2, 1), (1, 2)],
+          f"Standings-spegel uppdaterad från diffar: {[(r['bib'], r['position']) for r in mirrored]}")
+    check([m["type"] for m in late.received] == ["standings_diff", "resumed"],
+          f"Resume mot reläet: {[m['type'] for m in late.received]}")
+
+    # The relay app itself (no upstream reachable here)
+    from fastapi.testclient import TestClient
+    import relay as relay_app
+    relay_app.app.state.upstream = "http://127.0.0.1:9"
+    with TestClient(relay_app.app) as client:
+        r = client.get("/api/events/1/overall")
+        check(r.status_code == 503, f"Osynkat relä svarar 503 ({r.status_code})")
+        check(client.get("/standings").status_code == 200, "Reläet serverar /standings")
+    ws_module.manager.relay_mode = False
+
+
+# ======================================================================
+# TEST 32: Result lists served from memory with ETag / 304
+# ======================================================================
+
+def test_results_cache():
+    print("\n" + "=" * 70)
+    print("TEST 32: Results cache (ETag, 304, class filter in SQL)")
+    print("=" * 70)
+
+    from pathlib import Path
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from api.routes import router as api_router
+    from core import event_cache, results_cache
+
+    old_dir = database.DB_DIR
+    database.DB_DIR = Path(tempfile.mkdtemp())
+    try:
+        conn = database.get_connection()
+        database.init_db(conn)
+        database.migrate_db(conn)
+        event_id = database.create_event(conn, "Cache Test", "2026-06-15", fmt="enduro")
+        start_id = database.create_control(conn, event_id, 11, "Start SS1", "start")
+        finish_id = database.create_control(conn, event_id, 12, "Mål SS1", "finish")
+        stage_id = database.create_stage(conn, event_id, 1, "SS1", start_id, finish_id)
+        course_id = database.create_course(conn, event_id, "Bana")
+        database.link_course_stage(conn, course_id, stage_id, 1)
+        herr = database.create_class(conn, event_id, course_id, "Herr")
+        dam = database.create_class(conn, event_id, course_id, "Dam")
+        for bib in range(1, 5):
+            database.create_entry(conn, event_id, bib, f"R{bib}", "Test", "",
+                                  herr if bib <= 2 else dam)
+            database.create_chip_mapping(conn, event_id, bib, 8700000 + bib)
+
+        def finish(bib, secs):
+            timing_engine.ingest_punch(conn, event_id, 8700000 + bib, 11,
+                                       f"2026-06-15 10:0{bib}:00")
+            timing_engine.ingest_punch(conn, event_id, 8700000 + bib, 12,
+                                       f"2026-06-15 10:0{bib}:{secs}",
+                                       update_overall=True)
+
+        for bib, secs in {1: 50, 2: 55, 3: 58}.items():
+            finish(bib, secs)
+
+        # Version moves only once the engine's transaction has committed
+        dbk = event_cache.db_key(conn)
+        before = event_cache.results_version(dbk, event_id)
+        with database.transaction(conn):
+            database.results_changed(conn, event_id)
+            check(event_cache.results_version(dbk, event_id) == before,
+                  "Resultatversion oförändrad före commit")
+        check(event_cache.results_version(dbk, event_id) > before,
+              "Resultatversion ökar efter commit")
+
+        dam_rows = [dict(r) for r in database.get_overall_results(conn, event_id, "Dam")]
+        check([r["bib"] for r in dam_rows] == [3],
+              f"Klassfilter i SQL (overall): {[r['bib'] for r in dam_rows]}")
+        herr_rows = database.get_stage_results(conn, event_id, stage_id, "Herr")
+        check(sorted(r["bib"] for r in herr_rows) == [1, 2],
+              "Klassfilter i SQL (sträckresultat)")
+
+        loads = []
+        real_load = results_cache.load
+
+        def counting_load(conn, *args):
+            loads.append(args[1])
+            return real_load(conn, *args)
+        results_cache.load = counting_load
+
+        app = FastAPI()
+        app.include_router(api_router, prefix="/api")
+        url = f"/api/events/{event_id}/overall?class=Herr"
+        with TestClient(app) as client:
+            r1 = client.get(url)
+            etag = r1.headers.get("etag")
+            check(r1.status_code == 200 and [r["bib"] for r in r1.json()] == [1, 2],
+                  f"Overall per klass: {r1.status_code}")
+            check(bool(etag) and r1.headers.get("cache-control") == "no-cache",
+                  f"ETag och Cache-Control satta ({etag})")
+
+            r2 = client.get(url)
+            check(len(loads) == 1 and r2.content == r1.content,
+                  f"Andra anropet från minnet (laddningar: {len(loads)})")
+
+            r3 = client.get(url, headers={"If-None-Match": etag})
+            check(r3.status_code == 304 and not r3.content,
+                  f"If-None-Match ger 304 ({r3.status_code})")
+
+            stage_url = f"/api/events/{event_id}/stages/{stage_id}/results?class=Dam"
+            r4 = client.get(stage_url)
+            check([r["bib"] for r in r4.json()] == [3],
+                  f"Sträckresultat per klass: {[r['bib'] for r in r4.json()]}")
+
+            finish(4, 51)
+            r5 = client.get(url, headers={"If-None-Match": etag})
+            check(r5.status_code == 200 and r5.headers.get("etag") != etag,
+                  f"Ny version efter stämpling → 200 med ny ETag ({r5.status_code})")
+            r6 = client.get(stage_url)
+            check([r["bib"] for r in r6.json()] == [4, 3],
+                  f"Sträckresultat uppdaterade: {[r['bib'] for r in r6.json()]}")
+            check(len(loads) == 4, f"Laddat om en gång per lista och version ({len(loads)})")
+
+        results_cache.load = real_load
+        conn.close()
+    finally:
+        database.DB_DIR = old_dir
+
+
+# ======================================================================
+# TEST 33: Pre-rendered, precompressed standings snapshots
+# ======================================================================
+
+def test_standings_snapshots():
+    print("\n" + "=" * 70)
+    print("TEST 33: Pre-rendered standings pages (snapshots)")
+    print("=" * 70)
+
+    import asyncio
+    import gzip
+    import json
+    from pathlib import Path
+    from fastapi import FastAPI
+    from fastapi.templating import Jinja2Templates
+    from fastapi.testclient import TestClient
+    from api.snapshots import SnapshotPublisher
+    from api.static_files import PrecompressedStaticFiles
+
+    old_dir = database.DB_DIR
+    database.DB_DIR = Path(tempfile.mkdtemp())
+    try:
+        conn = database.get_connection()
+        database.init_db(conn)
+        database.migrate_db(conn)
+        event_id = database.create_event(conn, "Snapshot Test", "2026-06-15", fmt="enduro")
+        database.update_event(conn, event_id, status="active")
+        start_id = database.create_control(conn, event_id, 11, "Start SS1", "start")
+        finish_id = database.create_control(conn, event_id, 12, "Mål SS1", "finish")
+        stage_id = database.create_stage(conn, event_id, 1, "SS1", start_id, finish_id)
+        course_id = database.create_course(conn, event_id, "Bana")
+        database.link_course_stage(conn, course_id, stage_id, 1)
+        herr = database.create_class(conn, event_id, course_id, "Herr")
+        dam = database.create_class(conn, event_id, course_id, "Dam")
+        for bib in range(1, 6):
+            database.create_entry(conn, event_id, bib, f"R{bib}", "Åkare", "",
+                                  herr if bib in (1, 2, 5) else dam)
+            database.create_chip_mapping(conn, event_id, bib, 8800000 + bib)
+
+        def finish(bib, secs):
+            timing_engine.ingest_punch(conn, event_id, 8800000 + bib, 11,
+                                       f"2026-06-15 10:0{bib}:00")
+            timing_engine.ingest_punch(conn, event_id, 8800000 + bib, 12,
+                                       f"2026-06-15 10:0{bib}:{secs}",
+                                       update_overall=True)
+
+        for bib, secs in {1: 50, 2: 55, 3: 58}.items():
+            finish(bib, secs)
+
+        templates = Jinja2Templates(directory=str(Path(__file__).parent.parent / "web" / "templates"))
+        templates.env.globals["asset_url"] = lambda path: f"/static/{path}"
+        publisher = SnapshotPublisher()
+        publisher.templates = templates
+
+        async def scenario():
+            first = await publisher.publish()
+            again = await publisher.publish()
+            finish(4, 51)
+            after_punch = await publisher.publish()
+            database.set_setting(conn, "standings_frozen", "true")
+            finish(5, 45)
+            frozen = await publisher.publish()
+            database.set_setting(conn, "standings_frozen", "false")
+            unfrozen = await publisher.publish()
+            return first, again, after_punch, frozen, unfrozen
+
+        first, again, after_punch, frozen, unfrozen = asyncio.run(scenario())
+        check(first == 3, f"Första publicering: alla + 2 klasser ({first})")
+        check(again == 0, f"Inget nytt → inget skrivs ({again})")
+        check(after_punch == 2, f"Stämpling i Dam → alla + Dam skrivs om ({after_punch})")
+        check(frozen == 0 and unfrozen == 2,
+              f"Fryst ställning publiceras efter upptining ({frozen}, {unfrozen})")
+
+        out = publisher.directory / str(event_id)
+        dam_file = out / f"class-{dam}.json"
+        dam_json = json.loads(dam_file.read_text())
+        check([r["bib"] for r in dam_json["rows"]] == [4, 3],
+              f"Klassfil Dam: {[r['bib'] for r in dam_json['rows']]}")
+        check(gzip.decompress((out / f"class-{dam}.json.gz").read_bytes())
+              == dam_file.read_bytes(), "gzip-variant identisk med JSON")
+        html = (out / "standings.html").read_text()
+        check("Snapshot Test" in html and "0:45" in html and "const SNAPSHOT = {" in html,
+              "HTML förrenderad med namn, tider och snapshot-data")
+
+        app = FastAPI()
+        app.mount("/snapshots", PrecompressedStaticFiles(
+            directory=str(publisher.directory), cache_control="public, max-age=5"))
+        with TestClient(app) as client:
+            r = client.get(f"/snapshots/{event_id}/standings.html",
+                           headers={"Accept-Encoding": "gzip"})
+            check(r.status_code == 200 and r.headers.get("content-encoding") == "gzip",
+                  f"gzip-variant serveras ({r.headers.get('content-encoding')})")
+            check(r.headers.get("content-type", "").startswith("text/html")
+                  and r.text == html, "Rätt content-type och innehåll")
+            check(r.headers.get("cache-control") == "public, max-age=5",
+                  f"Cache-Control: {r.headers.get('cache-control')}")
+            plain = client.get(f"/snapshots/{event_id}/standings.json",
+                               headers={"Accept-Encoding": "identity"})
+            check("content-encoding" not in plain.headers
+                  and plain.headers.get("vary") == "Accept-Encoding",
+                  "Okomprimerad fil utan Accept-Encoding")
+            r304 = client.get(f"/snapshots/{event_id}/standings.json",
+                              headers={"Accept-Encoding": "identity",
+                                       "If-None-Match": plain.headers["etag"]})
+            check(r304.status_code == 304, f"ETag-revalidering ger 304 ({r304.status_code})")
+
+        conn.close()
+    finally:
+        database.DB_DIR = old_dir
+
+
+# ======================================================================
+# TEST 34: Content-hashed static assets with immutable caching
+# ======================================================================
+
+def test_asset_manifest():
+    print("\n" + "=" * 70)
+    print("TEST 34: Hashed static assets (asset manifest)")
+    print("=" * 70)
+
+    import gzip
+    from pathlib import Path
+    from fastapi import FastAPI
+    from fastapi.templating import Jinja2Templates
+    from fastapi.testclient import TestClient
+    from api import assets
+    from api.static_files import PrecompressedStaticFiles
+
+    root = Path(tempfile.mkdtemp())
+    static_dir, out_dir = root / "static", root / "assets"
+    (static_dir / "js").mkdir(parents=True)
+    (static_dir / "js" / "app.js").write_text("console.log('v1');\n" * 50)
+
+    manifest = assets.AssetManifest(static_dir, out_dir).build()
+    url_v1 = manifest.url("js/app.js")
+    check(url_v1.startswith("/assets/js/app.") and url_v1.endswith(".js"),
+          f"Hashad URL: {url_v1}")
+    check(assets.AssetManifest(static_dir, out_dir).build().url("js/app.js") == url_v1,
+          "Samma innehåll → samma URL")
+    check(manifest.url("js/saknas.js") == "/static/js/saknas.js",
+          "Okänd fil faller tillbaka på /static")
+    hashed = out_dir / manifest.files["js/app.js"]
+    check(gzip.decompress(hashed.with_name(hashed.name + ".gz").read_bytes())
+          == hashed.read_bytes(), "gzip-variant skriven")
+
+    (static_dir / "js" / "app.js").write_text("console.log('v2');\n" * 50)
+    url_v2 = assets.AssetManifest(static_dir, out_dir).build().url("js/app.js")
+    check(url_v2 != url_v1, f"Ändrat innehåll → ny URL ({url_v2})")
+    check(not hashed.exists() and not hashed.with_name(hashed.name + ".gz").exists(),
+          "Gamla hashade kopior (och .gz) tas bort")
+
+    app = FastAPI()
+    app.mount("/assets", PrecompressedStaticFiles(directory=str(out_dir),
+                                                  cache_control=assets.CACHE_CONTROL))
+    with TestClient(app) as client:
+        r = client.get(url_v2, headers={"Accept-Encoding": "gzip"})
+        check(r.status_code == 200 and "immutable" in r.headers.get("cache-control", "")
+              and "max-age=31536000" in r.headers.get("cache-control", ""),
+              f"Långtidscache: {r.headers.get('cache-control')}")
+        check(r.headers.get("content-encoding") == "gzip"
+              and "javascript" in r.headers.get("content-type", ""),
+              f"Förkomprimerad JS ({r.headers.get('content-type')})")
+
+    # The real templates only link hashed assets
+    base = Path(__file__).parent.parent
+    real = assets.AssetManifest(base / "web" / "static", out_dir).build()
+    templates = Jinja2Templates(directory=str(base / "web" / "templates"))
+    templates.env.globals["asset_url"] = real.url
+    for name in ("admin.html", "finish.html", "standings.html"):
+        html = templates.get_template(name).render()
+        check("/static/" not in html and real.url("js/ws-client.js") in html,
+              f"{name} länkar hashade filer")
+
+
+# ======================================================================
+# TEST 35: Bulk recompute (serial and parallel) matches the per-punch replay
+# ======================================================================
+
+def test_bulk_recompute():
+    print("\n" + "=" * 70)
+    print("TEST 35: Bulk recompute (same results as replay, also in parallel)")
+    print("=" * 70)
+
+    import random
+    from core import recompute
+    from core.event_cache import get_structure
+
+    conn = make_db()
+    rng = random.Random(35)
+
+    # Enduro: two stages (SS2 counts best 2 of max 3 runs), dual chips, mixed sources
+    enduro = database.create_event(conn, "Bulk Enduro", "2026-06-15", fmt="enduro")
+    controls = {code: database.create_control(conn, enduro, code, f"K{code}",
+                                              "start" if code % 2 else "finish")
+                for code in (21, 22, 23, 24)}
+    ss1 = database.create_stage(conn, enduro, 1, "SS1", controls[21], controls[22])
+    ss2 = database.create_stage(conn, enduro, 2, "SS2", controls[23], controls[24],
+                                runs_to_count=2, max_runs=3)
+    course = database.create_course(conn, enduro, "Bana")
+    database.link_course_stage(conn, course, ss1, 1)
+    database.link_course_stage(conn, course, ss2, 2)
+    classes = [database.create_class(conn, enduro, course, name) for name in ("Herr", "Dam")]
+    for bib in range(1, 21):
+        database.create_entry(conn, enduro, bib, f"R{bib}", "Bulk", "", classes[bib % 2])
+        database.create_chip_mapping(conn, enduro, bib, 8900000 + bib)
+        if bib % 4 == 0:  # second chip
+            database.create_chip_mapping(conn, enduro, bib, 8950000 + bib, is_primary=0)
+
+    def ts(minute, second):
+        return f"2026-06-15 {10 + minute // 60:02d}:{minute % 60:02d}:{second:02d}"
+
+    punches = []
+    for bib in range(1, 21):
+        chips = [8900000 + bib] + ([8950000 + bib] if bib % 4 == 0 else [])
+        minute = bib
+        for start, finish, runs in ((21, 22, 1), (23, 24, rng.choice([1, 2, 3, 4]))):
+            for _ in range(runs):
+                if rng.random() > 0.1:
+                    punches.append((rng.choice(chips), start, ts(minute, rng.randrange(60)),
+                                    rng.choice(["roc", "roc", "usb", "manual"])))
+                if rng.random() > 0.15:
+                    punches.append((rng.choice(chips), finish,
+                                    ts(minute + rng.choice([-1, 2, 3]), rng.randrange(60)),
+                                    rng.choice(["roc", "roc", "usb", "sirap"])))
+                minute += 5
+    punches.append((8999999, 21, ts(1, 0), "roc"))  # unknown chip
+    rng.shuffle(punches)
+    for siac, code, punch_time, source in punches:
+        timing_engine.ingest_punch(conn, enduro, siac, code, punch_time, source)
+
+    # Dual slalom with grouped starts
+    dual = database.create_event(conn, "Bulk Dual", "2026-06-15", fmt="dual_slalom",
+                                 time_precision="hundredths", dual_slalom_window=5.0)
+    d_start = database.create_control(conn, dual, 31, "Start", "start")
+    d_finish = database.create_control(conn, dual, 32, "Mål", "finish")
+    d_stage = database.create_stage(conn, dual, 1, "Slalom", d_start, d_finish)
+    d_course = database.create_course(conn, dual, "Dual", allow_repeat=1)
+    database.link_course_stage(conn, d_course, d_stage, 1)
+    d_class = database.create_class(conn, dual, d_course, "Herr")
+    for bib in range(1, 7):
+        database.create_entry(conn, dual, bib, f"D{bib}", "Bulk", "", d_class)
+        database.create_chip_mapping(conn, dual, bib, 8970000 + bib)
+        heat = (bib - 1) // 2
+        timing_engine.ingest_punch(conn, dual, 8970000 + bib, 31, ts(heat, bib % 2 * 3))
+        timing_engine.ingest_punch(conn, dual, 8970000 + bib, 32, ts(heat, 30 + bib))
+    timing_engine.calculate_overall_results(conn, enduro)
+    timing_engine.calculate_overall_results(conn, dual)
+
+    copy_path = os.path.join(tempfile.mkdtemp(), "copy.db")
+    copy = database.get_connection(copy_path)
+    conn.backup(copy)
+    par_path = os.path.join(tempfile.mkdtemp(), "parallel.db")
+    par = database.get_connection(par_path)
+    conn.backup(par)
+
+    def dump(c, event_id):
+        return {
+            "stage": [tuple(r) for r in c.execute(
+                "SELECT * FROM stage_results WHERE event_id=? ORDER BY id", (event_id,))],
+            "overall": [tuple(r) for r in c.execute(
+                """SELECT entry_id, total_seconds, position, time_behind, status
+                   FROM overall_results WHERE event_id=? ORDER BY entry_id""", (event_id,))],
+            "journal": [tuple(r) for r in c.execute(
+                "SELECT id, data_type, data_json FROM sync_queue WHERE event_id=? ORDER BY id",
+                (event_id,))],
+            "leaderboard": sorted(tuple(r) for r in c.execute(
+                "SELECT * FROM stage_leaderboard WHERE event_id=?", (event_id,))),
+        }
+
+    for name, event_id in (("enduro", enduro), ("dual slalom", dual)):
+        replay_diffs = timing_engine.recalculate_all(conn, event_id, bulk=False)
+        bulk_diffs = timing_engine.recalculate_all(copy, event_id)
+        check(bulk_diffs == replay_diffs, f"{name}: samma diff-rapport ({len(bulk_diffs)} rader)")
+        expected, got = dump(conn, event_id), dump(copy, event_id)
+        for table in ("stage", "overall", "journal", "leaderboard"):
+            check(got[table] == expected[table],
+                  f"{name}: {table} identisk ({len(got[table])} rader)")
+
+        # Three worker processes, bibs split between them
+        par_diffs = timing_engine.recalculate_all(par, event_id, workers=3)
+        check(par_diffs == replay_diffs, f"{name}: parallell diff-rapport lika")
+        check(dump(par, event_id) == expected,
+              f"{name}: parallell omräkning identisk med replay")
+
+    ok_runs = copy.execute(
+        "SELECT COUNT(*) FROM stage_results WHERE event_id=? AND status='ok'", (enduro,)
+    ).fetchone()[0]
+    superseded = copy.execute(
+        "SELECT COUNT(*) FROM stage_results WHERE event_id=? AND run_state='superseded'",
+        (enduro,)
+    ).fetchone()[0]
+    check(ok_runs > 20 and superseded > 0,
+          f"Testdata täcker flera åk och källöverstyrning ({ok_runs} ok, {superseded} ersatta)")
+    check(timing_engine.recalculate_all(copy, enduro) == [],
+          "Bulk-omräkning är idempotent")
+
+    partitions = recompute._partition(
+        get_structure(copy, enduro),
+        [recompute.Punch(i, *p) for i, p in enumerate(copy.execute(
+            "SELECT id, siac, control_code, punch_time, punch_ms, source FROM punches "
+            "WHERE event_id=? AND is_duplicate=0 ORDER BY punch_ms, id", (enduro,)))],
+        3)
+    bibs = [{get_structure(copy, enduro).bib_by_siac[p.siac] for p in part}
+            for part in partitions]
+    check(len(partitions) == 3 and not (bibs[0] & bibs[1] or bibs[0] & bibs[2]
+                                        or bibs[1] & bibs[2]),
+          "Partitionerna delar inga BIB (okänt chip utelämnat)")
+
+    par.close()
+    copy.close()
+    conn.close()
+
+
+# ======================================================================
+# TEST 36: Shadow recompute reports diffs without touching live results
+# ======================================================================
+
+def test_shadow_recompute():
+    print("\n" + "=" * 70)
+    print("TEST 36: Shadow recompute (diff without touching live results)")
+    print("=" * 70)
+
+    from pathlib import Path
+    from core.recompute import StaleRecompute, apply_recompute, shadow_recompute
+
+    conn = make_db()
+    event_id = database.create_event(conn, "Shadow", "2026-02-20", fmt="enduro")
+    start_ctrl = database.create_control(conn, event_id, 1, "Start S1", "start")
+    finish_ctrl = database.create_control(conn, event_id, 22, "Mål S1", "finish")
+    database.create_stage(conn, event_id, 1, "Stage 1", start_ctrl, finish_ctrl)
+    timing_engine.import_startlist_csv(
+        conn, event_id, os.path.join(TEST_DATA_DIR, "sample_startlist.csv"))
+    timing_engine.import_chipmapping_csv(
+        conn, event_id, os.path.join(TEST_DATA_DIR, "sample_chipmapping.csv"))
+    timing_engine.import_roc_punches(
+        conn, event_id, os.path.join(TEST_DATA_DIR, "real_punches_2026-02-20.csv"))
+    timing_engine.calculate_overall_results(conn, event_id)
+
+    reader = database.get_connection(Path(conn.execute("PRAGMA database_list").fetchone()[2]))
+    computed, diffs = shadow_recompute(reader, event_id)
+    check(diffs == [], "Oförändrade resultat → inga skillnader")
+
+    # Live results drift: one time off by 5 s, one overall row lost
+    entry_id = conn.execute(
+        "SELECT entry_id FROM stage_results WHERE event_id=? AND status='ok' LIMIT 1",
+        (event_id,)
+    ).fetchone()[0]
+    conn.execute("UPDATE stage_results SET elapsed_seconds=elapsed_seconds+5 "
+                 "WHERE event_id=? AND entry_id=?", (event_id, entry_id))
+    conn.execute("DELETE FROM overall_results WHERE event_id=? AND entry_id=?",
+                 (event_id, entry_id))
+    conn.commit()
+
+    def live():
+        return ([tuple(r) for r in conn.execute(
+                    "SELECT * FROM stage_results WHERE event_id=? ORDER BY id", (event_id,))],
+                [tuple(r) for r in conn.execute(
+                    "SELECT * FROM overall_results WHERE event_id=? ORDER BY entry_id",
+                    (event_id,))],
+                conn.execute("SELECT COUNT(*) FROM sync_queue").fetchone()[0])
+
+    before = live()
+    computed, diffs = shadow_recompute(reader, event_id)
+    check(any(d.startswith("stage_result DIFF") for d in diffs)
+          and f"overall_result NEW: entry={entry_id}" in diffs,
+          f"Skillnader rapporteras ({len(diffs)} rader)")
+    check(live() == before, "Live-tabellerna orörda av skuggomräkningen")
+    check(not reader.in_transaction, "Lästransaktionen avslutad")
+
+    # A punch arrives before the swap → refused, live unchanged
+    timing_engine.ingest_punch(conn, event_id, 9999999, 1, "2026-02-20 12:00:00")
+    before = live()
+    try:
+        apply_recompute(conn, computed)
+        check(False, "Inaktuell omräkning ska vägras")
+    except StaleRecompute:
+        check(live() == before, "Inaktuell omräkning vägras, live oförändrat")
+
+    computed, diffs = shadow_recompute(reader, event_id)
+    written = apply_recompute(conn, computed)
+    check(written > 0, f"Omräkning verkställd ({written} åk)")
+    check(shadow_recompute(reader, event_id)[1] == [],
+          "Efter bytet: inga skillnader kvar")
+    check(timing_engine.recalculate_all(conn, event_id) == [],
+          "Samma resultat som recalculate_all")
+
+    reader.close()
+    conn.close()
+
+
+# ======================================================================
+# TEST 37: Hot-path queries use indexes (EXPLAIN QUERY PLAN, no full scans)
+# ======================================================================
+
+def test_query_plans():
+    print("\n" + "=" * 70)
+    print("TEST 37: Query plans (indexes, no table scans)")
+    print("=" * 70)
+
+    import re
+    from core import leaderboard
+    from core.recompute import compute_event
+    from api.websocket import generate_highlights
+
+    # Migration: a database from before the versioned migrations gets them once
+    old = database.get_connection(os.path.join(tempfile.mkdtemp(), "old.db"))
+    database.init_db(old)
+    check(database.schema_version(old) == 0, "Ny databas utan migreringar: user_version 0")
+    database.migrate_db(old)
+    latest = database.MIGRATIONS[-1][0]
+    indexes = {r[0] for r in old.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    check(database.schema_version(old) == latest and "idx_stage_results_rank" in indexes,
+          f"migrate_db → user_version {latest}, index skapade")
+    database.migrate_db(old)
+    check(database.schema_version(old) == latest, "migrate_db igen: ingen ändring")
+    old.close()
+
+    conn = make_db()
+    statements = []
+    conn.set_trace_callback(statements.append)
+
+    # Race-day workload: enduro with classes and a second chip, then dual slalom
+    event_id = database.create_event(conn, "Plan Enduro", "2026-06-15", fmt="enduro")
+    c = {code: database.create_control(conn, event_id, code, f"K{code}",
+                                       "start" if code % 2 else "finish")
+         for code in (41, 42, 43, 44)}
+    ss1 = database.create_stage(conn, event_id, 1, "SS1", c[41], c[42])
+    ss2 = database.create_stage(conn, event_id, 2, "SS2", c[43], c[44])
+    course = database.create_course(conn, event_id, "Bana")
+    database.link_course_stage(conn, course, ss1, 1)
+    database.link_course_stage(conn, course, ss2, 2)
+    herr = database.create_class(conn, event_id, course, "Herr")
+    database.create_class(conn, event_id, course, "Dam")
+    for bib in range(1, 5):
+        database.create_entry(conn, event_id, bib, f"R{bib}", "Plan", "", herr)
+        database.create_chip_mapping(conn, event_id, bib, 8600000 + bib)
+    database.create_chip_mapping(conn, event_id, 1, 8650001, is_primary=0)
+
+    timing_engine.ingest_punch(conn, event_id, 8600001, 41, "2026-06-15 10:00:00")
+    timing_engine.ingest_punch(conn, event_id, 8600001, 41, "2026-06-15 10:00:01", "usb")
+    timing_engine.ingest_punch(conn, event_id, 8650001, 42, "2026-06-15 10:03:00",
+                               update_overall=True)
+    page = [{"siac": 8600000 + bib, "control_code": code, "roc_punch_id": 100 + 2 * bib + i,
+             "punch_time": f"2026-06-15 11:0{bib}:{10 * i:02d}"}
+            for bib in range(2, 5) for i, code in enumerate((43, 44))]
+    timing_engine.ingest_punches_batch(conn, event_id, page)
+    timing_engine.ingest_punches_batch(conn, event_id, page)   # already stored
+    timing_engine.calculate_overall_results(conn, event_id)
+
+    database.get_stage_results(conn, event_id, ss2)
+    database.get_stage_results(conn, event_id, ss2, "Herr")
+    database.get_overall_results(conn, event_id)
+    database.get_overall_results(conn, event_id, "Herr")
+    leaderboard.load_leaderboards(conn, event_id)
+    generate_highlights(conn, event_id, database.get_entries(conn, event_id)[0]["id"], ss2)
+    database.get_journal_events(conn, event_id)
+    compute_event(conn, event_id, workers=1)
+
+    dual = database.create_event(conn, "Plan Dual", "2026-06-15", fmt="dual_slalom",
+                                 dual_slalom_window=5.0)
+    d_start = database.create_control(conn, dual, 31, "Start", "start")
+    d_finish = database.create_control(conn, dual, 32, "Mål", "finish")
+    d_stage = database.create_stage(conn, dual, 1, "Slalom", d_start, d_finish)
+    d_course = database.create_course(conn, dual, "Dual")
+    database.link_course_stage(conn, d_course, d_stage, 1)
+    d_class = database.create_class(conn, dual, d_course, "Herr")
+    for bib in (1, 2):
+        database.create_entry(conn, dual, bib, f"D{bib}", "Plan", "", d_class)
+        database.create_chip_mapping(conn, dual, bib, 8680000 + bib)
+        timing_engine.ingest_punch(conn, dual, 8680000 + bib, 31, f"2026-06-15 12:00:0{bib}")
+        timing_engine.ingest_punch(conn, dual, 8680000 + bib, 32, f"2026-06-15 12:00:3{bib}")
+    timing_engine.recalculate_all(conn, dual, bulk=False)   # grouped starts
+    conn.set_trace_callback(None)
+
+    # sqlite_sequence is SQLite's own bookkeeping table (one row per table)
+    allowed = {"sqlite_sequence"}
+    scans, plans = [], {}
+    for sql in dict.fromkeys(statements):
+        if not re.match(r"\s*(SELECT|UPDATE|DELETE|INSERT|WITH)\b", sql, re.I):
+            continue
+        plan = [r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+        plans[" ".join(sql.split())] = plan
+        for detail in plan:
+            m = re.match(r"SCAN (\w+)", detail)
+            if m and m.group(1) not in allowed and m.group(1) != "CONSTANT":
+                scans.append(f"{detail}: {' '.join(sql.split())[:120]}")
+    check(len(plans) > 40, f"{len(plans)} frågor från arbetsflödet analyserade")
+    for scan in scans:
+        print(f"    {scan}")
+    check(not scans, "Ingen fullständig tabellscanning i hot path")
+
+    def plan_uses(fragment, index):
+        hits = [p for sql, p in plans.items() if fragment in sql]
+        return bool(hits) and all(any(index in d for d in p) for p in hits)
+
+    check(plan_uses("roc_punch_id IN", "idx_punches_roc"),
+          "ROC-id-kontroll använder idx_punches_roc")
+    check(plan_uses("sr.stage_id=", "idx_stage_results_rank"),
+          "Sträckresultat använder idx_stage_results_rank")
+    check(plan_uses("WHERE start_punch_id=", "idx_stage_results_start_punch"),
+          "Dual slalom-gruppering använder idx_stage_results_start_punch")
+
+    conn.close()
+
+
+# ======================================================================
+# TEST 38: Integer epoch-millisecond timestamps, arithmetic and backfill
+# ======================================================================
+
+def test_millisecond_timestamps():
+    print("\n" + "=" * 70)
+    print("TEST 38: Millisecond timestamps (integers, sub-seconds, migration)")
+    print("=" * 70)
+
+    from core.recompute import shadow_recompute
+
+    check(timing_engine.timestamp_ms("1970-01-01 00:00:01.5") == 1500,
+          "timestamp_ms räknar från epoch i millisekunder")
+
+    conn = make_db()
+    event_id = database.create_event(conn, "Ms Enduro", "2026-06-15", fmt="enduro")
+    start = database.create_control(conn, event_id, 51, "Start", "start")
+    finish = database.create_control(conn, event_id, 52, "Mål", "finish")
+    stage = database.create_stage(conn, event_id, 1, "SS1", start, finish)
+    course = database.create_course(conn, event_id, "Bana")
+    database.link_course_stage(conn, course, stage, 1)
+    cls = database.create_class(conn, event_id, course, "Herr")
+    for bib in (1, 2):
+        database.create_entry(conn, event_id, bib, f"R{bib}", "Ms", "", cls)
+        database.create_chip_mapping(conn, event_id, bib, 8700000 + bib)
+
+    timing_engine.ingest_punch(conn, event_id, 8700001, 51, "2026-06-15 10:00:00.25")
+    dup = timing_engine.ingest_punch(conn, event_id, 8700001, 51, "2026-06-15 10:00:00.75")
+    timing_engine.ingest_punch(conn, event_id, 8700001, 52, "2026-06-15 10:01:02.75")
+    timing_engine.ingest_punch(conn, event_id, 8700002, 51, "2026-06-15 10:00:30")
+    timing_engine.ingest_punch(conn, event_id, 8700002, 52, "2026-06-15 10:01:30.01")
+
+    punches = conn.execute("SELECT * FROM punches WHERE event_id=?", (event_id,)).fetchall()
+    check(all(p["punch_ms"] == timing_engine.timestamp_ms(p["punch_time"]) for p in punches),
+          "punch_ms lagras vid inläsning")
+    check(conn.execute("SELECT is_duplicate FROM punches WHERE id=?", (dup,)).fetchone()[0] == 1,
+          "Dubblett inom fönstret (0,5 s senare) markeras")
+
+    runs = conn.execute("SELECT * FROM stage_results WHERE event_id=?", (event_id,)).fetchall()
+    elapsed = sorted(r["elapsed_seconds"] for r in runs)
+    check(elapsed == [60.01, 62.5], f"Delsekunder i sträcktiden ({elapsed})")
+    check(all(r["finish_ms"] - r["start_ms"] == round(r["elapsed_seconds"] * 1000)
+              for r in runs), "start_ms/finish_ms lagras i stage_results")
+
+    timing_engine.calculate_overall_results(conn, event_id)
+    _, diffs = shadow_recompute(conn, event_id, workers=1)
+    check(diffs == [], "Omräkning ger samma millisekundresultat")
+
+    # A database from before the ms columns: backfilled by the migration
+    conn.execute("UPDATE punches SET punch_ms=NULL")
+    conn.execute("UPDATE stage_results SET start_ms=NULL, finish_ms=NULL")
+    conn.execute("PRAGMA user_version=1")
+    conn.commit()
+    database.migrate_db(conn)
+    check(all(p["punch_ms"] == timing_engine.timestamp_ms(p["punch_time"])
+              for p in conn.execute("SELECT * FROM punches")),
+          "Migreringen fyller punch_ms (även delsekunder)")
+    check(all(r["start_ms"] == timing_engine.timestamp_ms(r["start_time"])
+              and r["finish_ms"] == timing_engine.timestamp_ms(r["finish_time"])
+              for r in conn.execute("SELECT * FROM stage_results")),
+          "Migreringen fyller start_ms/finish_ms")
+    conn.close()
+
+
+# ======================================================================
+# TEST 39: In-memory dedup index (bisect, no punches query, rebuild)
+# ======================================================================
+
+def test_dedup_index():
+    print("\n" + "=" * 70)
+    print("TEST 39: In-memory dedup index")
+    print("=" * 70)
+
+    from core import dedup, event_cache
+
+    conn = make_db()
+    event_id = database.create_event(conn, "Dedup", "2026-06-15", fmt="enduro")
+    start = database.create_control(conn, event_id, 61, "Start", "start")
+    finish = database.create_control(conn, event_id, 62, "Mål", "finish")
+    stage = database.create_stage(conn, event_id, 1, "SS1", start, finish)
+    course = database.create_course(conn, event_id, "Bana")
+    database.link_course_stage(conn, course, stage, 1)
+    cls = database.create_class(conn, event_id, course, "Herr")
+    database.create_entry(conn, event_id, 1, "R1", "Dedup", "", cls)
+    database.create_chip_mapping(conn, event_id, 1, 8800001)
+
+    def is_dup(punch_id):
+        return conn.execute("SELECT is_duplicate FROM punches WHERE id=?",
+                            (punch_id,)).fetchone()[0] == 1
+
+    # Earlier punches on other controls: dedup must not depend on them
+    for minute in range(30):
+        timing_engine.ingest_punch(conn, event_id, 8800001, 63,
+                                   f"2026-06-15 09:{minute:02d}:00")
+    first = timing_engine.ingest_punch(conn, event_id, 8800001, 61, "2026-06-15 10:00:00")
+
+    statements = []
+    conn.set_trace_callback(statements.append)
+    dup = timing_engine.ingest_punch(conn, event_id, 8800001, 61, "2026-06-15 10:00:02")
+    conn.set_trace_callback(None)
+    check(not is_dup(first) and is_dup(dup), "Samma kontroll inom 2 s → dubblett")
+    check(not any("FROM punches" in st for st in statements),
+          "Dubblettkontrollen läser inte punches-tabellen")
+    check(not is_dup(timing_engine.ingest_punch(conn, event_id, 8800001, 61,
+                                                "2026-06-15 10:00:02.001")),
+          "Utanför fönstret (2,001 s) → ingen dubblett")
+    check(not is_dup(timing_engine.ingest_punch(conn, event_id, 8800001, 61,
+                                                "2026-06-15 10:00:01", "usb")),
+          "USB inom fönstret släpps igenom (högre prioritet)")
+    check(is_dup(timing_engine.ingest_punch(conn, event_id, 8800001, 61,
+                                            "2026-06-15 10:00:01.5", "sirap")),
+          "SIRAP efter USB i fönstret → dubblett")
+
+    # Second chip of the same BIB shares the key once it is mapped
+    unmapped = timing_engine.ingest_punch(conn, event_id, 8850001, 62, "2026-06-15 10:05:00")
+    database.create_chip_mapping(conn, event_id, 1, 8850001, is_primary=0)
+    check(not is_dup(unmapped) and
+          is_dup(timing_engine.ingest_punch(conn, event_id, 8800001, 62, "2026-06-15 10:05:01")),
+          "Andra chipet på samma BIB delar fönstret efter ny chipmappning")
+
+    # Rebuilt from the punches table: same index as the one kept up to date
+    kept = dedup.get_dedup_index(conn, event_id)._punches
+    event_cache.invalidate_all()
+    rebuilt = dedup.get_dedup_index(conn, event_id)
+    check(rebuilt._punches == kept,
+          f"Återuppbyggt index = löpande index ({len(kept)} nycklar)")
+
+    # A rolled-back punch leaves no trace in the index
+    try:
+        with database.transaction(conn):
+            timing_engine.ingest_punch(conn, event_id, 8800001, 61, "2026-06-15 12:00:00")
+            raise ValueError("avbruten")
+    except ValueError:
+        pass
+    check(not is_dup(timing_engine.ingest_punch(conn, event_id, 8800001, 61,
+                                                "2026-06-15 12:00:01")),
+          "Återrullad punch finns inte kvar i indexet")
+    conn.close()
+
+
+# ======================================================================
+# TEST 40: Persisted ROC cursor, unique roc_punch_id, free re-delivery
+# ======================================================================
+
+def test_roc_cursor():
+    print("\n" + "=" * 70)
+    print("TEST 40: ROC cursor and unique ROC ids")
+    print("=" * 70)
+
+    from core import event_cache
+    from api.routes import _apply_roc_page
+
+    # Migration 3 on a database that stored a re-downloaded ROC punch twice
+    conn = make_db()
+    event_id = database.create_event(conn, "ROC", "2026-06-15", fmt="enduro")
+    conn.execute("DROP INDEX idx_punches_roc")
+    for _ in range(2):
+        conn.execute("INSERT INTO punches (event_id, siac, control_code, punch_time, "
+                     "punch_ms, roc_punch_id) VALUES (?, 8900001, 71, "
+                     "'2026-06-15 10:00:00', 1781517600000, 7)", (event_id,))
+    conn.execute("PRAGMA user_version=2")
+    conn.commit()
+    database.migrate_db(conn)
+    rows = conn.execute("SELECT roc_punch_id FROM punches ORDER BY id").fetchall()
+    check([r[0] for r in rows] == [7, None],
+          "Migrering: dubblerat ROC-id behålls bara på första raden")
+
+    start = database.create_control(conn, event_id, 71, "Start", "start")
+    finish = database.create_control(conn, event_id, 72, "Mål", "finish")
+    stage = database.create_stage(conn, event_id, 1, "SS1", start, finish)
+    course = database.create_course(conn, event_id, "Bana")
+    database.link_course_stage(conn, course, stage, 1)
+    cls = database.create_class(conn, event_id, course, "Herr")
+    for bib in (1, 2):
+        database.create_entry(conn, event_id, bib, f"R{bib}", "ROC", "", cls)
+        database.create_chip_mapping(conn, event_id, bib, 8900000 + bib)
+
+    check(timing_engine.ingest_punch(conn, event_id, 8900001, 71,
+                                     "2026-06-15 10:00:00", roc_punch_id=7) is None,
+          "Redan lagrat ROC-id hoppas över (ON CONFLICT DO NOTHING)")
+
+    page = [{"roc_punch_id": 10 + 2 * bib + i, "siac": 8900000 + bib, "control_code": code,
+             "punch_time": f"2026-06-15 10:0{bib}:{20 * i:02d}"}
+            for bib in (1, 2) for i, code in enumerate((71, 72))]
+    check(database.get_roc_cursor(conn, event_id, "comp") == 0, "Ny markör börjar på 0")
+    ids, _, _ = _apply_roc_page(conn, event_id, "comp", page)
+    check(len(ids) == 4 and database.get_roc_cursor(conn, event_id, "comp") == 15,
+          "Markören sparas med sidan (högsta ROC-id)")
+
+    # A restarted poller that re-downloads the page changes nothing
+    version = event_cache.results_version(event_cache.db_key(conn), event_id)
+    statements = []
+    conn.set_trace_callback(statements.append)
+    ids, batch, _ = _apply_roc_page(conn, event_id, "comp", page[:2])
+    conn.set_trace_callback(None)
+    check(ids == [] and batch == [] and
+          not any(st.lstrip().upper().startswith("INSERT INTO PUNCHES") for st in statements),
+          "Omleverans efter omstart: inga nya punchar")
+    check(event_cache.results_version(event_cache.db_key(conn), event_id) == version,
+          "Omleverans flyttar inte resultatversionen")
+    check(database.get_roc_cursor(conn, event_id, "comp") == 15,
+          "Markören flyttas aldrig bakåt")
+    check(database.get_roc_cursor(conn, event_id, "other") == 0,
+          "Markören är per ROC-tävling")
+    conn.close()
+
+    # The poller moves last_id only past pages its handler applied
+    import asyncio
+    import time
+    from core.roc_poller import RocPoller
+
+    feed = [{"roc_punch_id": i, "siac": 8900001, "control_code": 71,
+             "punch_time": "2026-06-15 10:00:00"} for i in (21, 22, 23)]
+    outcomes = [RuntimeError("database is locked"), False, True]
+    seen = []
+
+    async def handler(punches):
+        seen.append([p["roc_punch_id"] for p in punches])
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome   # False = not applied (ingest paused)
+
+    async def persisted():
+        return 21
+
+    async def scenario():
+        p = RocPoller("x", on_batch=handler, load_cursor=persisted)
+        p.set_last_id(20)
+
+        async def fetch():
+            return [x for x in feed if x["roc_punch_id"] > p.last_id]
+        p._fetch = fetch
+        p._next_delay = lambda punches: 0.0
+        p._running = True
+        task = asyncio.create_task(p._poll_loop())
+        started = time.monotonic()
+        while outcomes and time.monotonic() - started < 5:
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.01)
+        p._running = False
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return p
+
+    p = asyncio.run(scenario())
+    check(seen[:3] == [[21, 22, 23], [22, 23], [22, 23]],
+          f"Misslyckad sida → sparad markör, pausad sida hämtas igen: {seen[:3]}")
+    check(p.last_id == 23 and p.punch_count == 2,
+          f"Markören flyttas först när sidan tillämpats (last_id {p.last_id})")
+
+
+# ======================================================================
+# TEST 41: Adaptive ROC polling (backlog draining, idle, backoff, lag)
+# ======================================================================
+
+def test_roc_scheduler():
+    print("\n" + "=" * 70)
+    print("TEST 41: Adaptive ROC polling")
+    print("=" * 70)
+
+    import asyncio
+    import time
+    from datetime import datetime, timedelta
+    from core import roc_poller
+    from core.roc_poller import RocPoller
+
+    async def ignore(punches):
+        pass
+
+    poller = RocPoller("x", on_batch=ignore)
+    big = [{"roc_punch_id": i, "punch_time": "2026-06-15 10:00:00"}
+           for i in range(50)]
+    check(poller._next_delay(big) == 0.0, "Full sida → pollar direkt igen")
+    check(poller._next_delay(big[:3]) == roc_poller.DEFAULT_INTERVAL,
+          "Några punchar → grundintervall")
+    idle = [poller._next_delay([]) for _ in range(10)]
+    check(idle[0] > roc_poller.DEFAULT_INTERVAL and idle == sorted(idle)
+          and idle[-1] == roc_poller.MAX_IDLE_INTERVAL,
+          f"Tomma sidor → längre intervall upp till {roc_poller.MAX_IDLE_INTERVAL} s")
+    check(poller._next_delay(big[:1]) == roc_poller.DEFAULT_INTERVAL,
+          "Ny punch → tillbaka till grundintervall")
+
+    # Page cap: learned from the largest page, or given
+    learning = RocPoller("x", on_batch=ignore)
+    check(learning._next_delay(big[:roc_poller.MIN_FULL_PAGE - 1]) > 0,
+          "Liten första sida räknas inte som full")
+    check(learning._next_delay(big[:30]) == 0.0 and learning._next_delay(big[:30]) == 0.0
+          and learning._next_delay(big[:29]) > 0,
+          "Sidtak lärs från största sidan (30)")
+    fixed = RocPoller("x", on_batch=ignore, page_size=100)
+    check(fixed._next_delay(big) > 0 and fixed._next_delay(big + big) == 0.0
+          and fixed.get_status()["full_page"] == 100,
+          "Angiven page_size styr vad som är en full sida")
+
+    backoffs = []
+    for errors in range(1, 12):
+        poller._error_count = errors
+        limit = min(roc_poller.DEFAULT_INTERVAL * 2 ** (errors - 1), roc_poller.MAX_BACKOFF)
+        delay = poller._next_delay(None)
+        backoffs.append(limit / 2 <= delay <= limit)
+    check(all(backoffs), "Fel → exponentiell backoff med jitter, max "
+                         f"{roc_poller.MAX_BACKOFF:.0f} s")
+    poller._error_count = 3
+    check(len({poller._next_delay(None) for _ in range(20)}) > 1,
+          "Jitter: olika väntetider vid samma felantal")
+
+    # A backlog drains without waiting between full pages
+    newest = (datetime.now() - timedelta(seconds=30)).strftime("%Y-%m-%d %H:%M:%S")
+    pages = [big, big, big, [{"roc_punch_id": 99, "punch_time": newest}]]
+    received = []
+
+    async def collect(punches):
+        received.extend(punches)
+
+    async def fetch():
+        return pages.pop(0) if pages else []
+
+    async def scenario():
+        p = RocPoller("x", on_batch=collect)
+        p._fetch = fetch
+        p._running = True
+        task = asyncio.create_task(p._poll_loop())
+        started = time.monotonic()
+        while len(received) < 3 * len(big) + 1 and time.monotonic() - started < 5:
+            await asyncio.sleep(0.01)
+        elapsed = time.monotonic() - started
+        p._running = False
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return p, elapsed
+
+    p, elapsed = asyncio.run(scenario())
+    check(elapsed < roc_poller.DEFAULT_INTERVAL,
+          f"Eftersläpande sidor hämtas i följd ({elapsed:.2f} s)")
+    check(p.get_status()["poll_lag"] is not None and 29 <= p.get_status()["poll_lag"] < 35,
+          f"Poll-eftersläpning mäts ({p.get_status()['poll_lag']} s)")
+
+    # A handler that keeps failing backs off instead of re-polling a full page at once
+    async def failing(punches):
+        raise RuntimeError("database is locked")
+
+    async def backlog():
+        return big
+
+    async def failing_scenario():
+        p = RocPoller("x", on_batch=failing)
+        p._fetch = backlog
+        delays = []
+        real_next_delay = p._next_delay
+
+        def record(punches):
+            delays.append(real_next_delay(punches))
+            return 0.0
+        p._next_delay = record
+        p._running = True
+        task = asyncio.create_task(p._poll_loop())
+        started = time.monotonic()
+        while len(delays) < 5 and time.monotonic() - started < 5:
+            await asyncio.sleep(0.001)
+        p._running = False
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return p, delays[:5]
+
+    p, delays = asyncio.run(failing_scenario())
+    check(all(d > 0 for d in delays) and p.get_status()["error_count"] >= 5
+          and p.last_id == 0,
+          f"Fel i on_batch → backoff, markören står still "
+          f"({[round(d, 2) for d in delays]}, {p.get_status()['status']})")
+
+
 # ======================================================================
 # MAIN
 # ======================================================================
@@ -1075,6 +3498,30 @@ def main():
     test_settings()
     test_recompute_idempotent()
     test_sync_journal()
+    test_incremental_overall()
+    test_event_cache()
+    test_punch_transaction()
+    test_batch_ingest()
+    test_db_executor()
+    test_ingest_queue()
+    test_connection_pool()
+    test_leaderboards()
+    test_standings_publisher()
+    test_ws_subscriptions()
+    test_ws_slow_consumer()
+    test_ws_encoding()
+    test_ws_resume()
+    test_ws_relay()
+    test_results_cache()
+    test_standings_snapshots()
+    test_asset_manifest()
+    test_bulk_recompute()
+    test_shadow_recompute()
+    test_query_plans()
+    test_millisecond_timestamps()
+    test_dedup_index()
+    test_roc_cursor()
+    test_roc_scheduler()
 
     print("\n" + "=" * 70)
     if ERRORS == 0:
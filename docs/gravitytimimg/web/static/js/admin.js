@@ -33,11 +33,13 @@ try {
         updatePunchCount();
     });
 
-    ws.on('standings', (msg) => {
+    const reloadOverall = () => {
         if (document.getElementById('tab-overall').classList.contains('active')) {
             loadOverallResults();
         }
-    });
+    };
+    ws.on('standings', reloadOverall);
+    ws.on('standings_diff', reloadOverall);
 
     ws.on('highlight', (msg) => {
         console.log('[Highlight]', msg.text);
@@ -1217,9 +1219,17 @@ async function toggleStandings() {
 
 async function recomputeResults() {
     if (!currentEventId) return;
-    if (!confirm('Räkna om alla resultat från stämplingarna?')) return;
     try {
-        await API.post(`/events/${currentEventId}/recalculate`);
+        // Dry run first — live results stay as they are until confirmed
+        const check = await API.post(`/events/${currentEventId}/recalculate/shadow`);
+        if (check.diffs.length === 0) {
+            alert('Omräkning ger samma resultat — inga ändringar.');
+            return;
+        }
+        const shown = check.diffs.slice(0, 15).join('\n');
+        const more = check.diffs.length > 15 ? `\n… och ${check.diffs.length - 15} till` : '';
+        if (!confirm(`Omräkning ändrar ${check.diffs.length} resultat:\n\n${shown}${more}\n\nVerkställ?`)) return;
+        await API.post(`/events/${currentEventId}/recalculate/shadow?apply=true`);
         alert('Alla resultat omberäknade.');
         loadStageResults();
         loadOverallResults();
@@ -1359,6 +1369,8 @@ async function loadRocStatus() {
         document.getElementById('roc-error-count').textContent = status.error_count || 0;
         document.getElementById('roc-last-poll').textContent = status.last_poll || '\u2014';
         document.getElementById('roc-last-id').textContent = status.last_id || 0;
+        document.getElementById('roc-poll-lag').textContent =
+            status.poll_lag != null ? `${status.poll_lag.toFixed(1)} s` : '\u2014';
         document.getElementById('roc-status-text').textContent =
             status.is_running ? `Pollar ${status.competition_id || '?'}` : 'Inte startad';
 
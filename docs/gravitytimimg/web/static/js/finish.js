@@ -13,7 +13,7 @@ let precision = 'seconds';
 let heroTimeout = null;
 
 // WebSocket
-const ws = new GravityWS(['finish']);
+const ws = new GravityWS(['finish'], { stages: [stageNumber] });
 ws.bindStatus(
     document.getElementById('ws-dot'),
     document.getElementById('ws-status')
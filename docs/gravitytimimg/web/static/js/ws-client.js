@@ -9,12 +9,36 @@
  *   ws.on('punch', (msg) => { ... });
  *   ws.on('standings', (msg) => { ... });
  *   ws.on('highlight', (msg) => { ... });
+ *
+ * A 'punches' batch message is expanded into one 'punch' dispatch per punch,
+ * unless the page registers its own 'punches' handler.
+ *
+ * The server only sends message types the page has handlers for, and can
+ * filter further on event, stage number, class and bib:
+ *   const ws = new GravityWS(['finish'], { stages: [3] });
+ *   ws.subscribe({ classes: ['Herr'] });   // merge + resend
+ *
+ * Frames use the server's compact encoding: rider metadata arrives once
+ * per connection in 'entries' messages and is filled back into punches
+ * and standings rows before handlers see them.
+ *
+ * Reconnects resume from the last seq seen: the server replays what was
+ * missed (then '_resumed' fires) or, if that is too old, sends a
+ * 'snapshot' — handled by the page's 'snapshot' handler if it has one,
+ * otherwise '_connected' fires again for a full reload.
  */
 
+const RESUME_TIMEOUT = 3000;  // ms to wait for 'resumed' / 'snapshot'
+
 class GravityWS {
-    constructor(channels = ['all']) {
+    constructor(channels = ['all'], filters = {}) {
         this.channels = channels;
+        this.filters = { ...filters };
         this.handlers = {};
+        this.entries = {};
+        this.lastSeq = null;
+        this._resumeBuffer = null;
+        this._resumeTimer = null;
         this.ws = null;
         this._reconnectDelay = 2000;
         this._maxDelay = 30000;
@@ -37,12 +61,18 @@ class GravityWS {
                 console.log('[WS] Connected');
                 this._currentDelay = this._reconnectDelay;
                 this._updateStatus('online');
+                this.entries = {};  // new session: server resends metadata
 
-                // Subscribe to channels
-                this.ws.send(JSON.stringify({
-                    type: 'subscribe',
-                    channels: this.channels
-                }));
+                if (this.lastSeq !== null) {
+                    // Hold live messages until the replay has arrived
+                    this._resumeBuffer = [];
+                    this._sendSubscribe(this.lastSeq);
+                    this._resumeTimer = setTimeout(
+                        () => this._finishResume(null), RESUME_TIMEOUT);
+                    return;
+                }
+
+                this._sendSubscribe();
 
                 if (this.handlers['_connected']) {
                     this.handlers['_connected']();
@@ -51,8 +81,7 @@ class GravityWS {
 
             this.ws.onmessage = (event) => {
                 try {
-                    const msg = JSON.parse(event.data);
-                    this._dispatch(msg);
+                    this._receive(JSON.parse(event.data));
                 } catch (e) {
                     console.warn('[WS] Parse error:', e);
                 }
@@ -61,8 +90,12 @@ class GravityWS {
             this.ws.onclose = () => {
                 console.log('[WS] Disconnected, reconnecting in', this._currentDelay, 'ms');
                 this._updateStatus('offline');
+                clearTimeout(this._resumeTimer);
+                this._resumeBuffer = null;
 
-                setTimeout(() => this.connect(), this._currentDelay);
+                // Jitter so a venue full of screens doesn't reconnect in lockstep
+                const delay = this._currentDelay * (0.75 + Math.random() * 0.5);
+                setTimeout(() => this.connect(), delay);
                 this._currentDelay = Math.min(this._currentDelay * 1.5, this._maxDelay);
 
                 if (this.handlers['_disconnected']) {
@@ -84,10 +117,34 @@ class GravityWS {
 
     /**
      * Register a handler for a message type.
-     * Special types: '_connected', '_disconnected'
+     * Special types: '_connected', '_disconnected', '_resumed'
      */
     on(type, handler) {
+        const isNew = !this.handlers[type];
         this.handlers[type] = handler;
+        if (isNew && !type.startsWith('_')) this._sendSubscribe();
+    }
+
+    /**
+     * Change topic filters: { event_id, stages, classes, bibs }.
+     * An empty list or null clears a filter.
+     */
+    subscribe(filters) {
+        Object.assign(this.filters, filters);
+        this._sendSubscribe();
+    }
+
+    _sendSubscribe(resume = null) {
+        if (!this.ws || this.ws.readyState !== WebSocket.OPEN) return;
+        const msg = {
+            type: 'subscribe', channels: this.channels, encoding: 'compact', ...this.filters
+        };
+        if (resume !== null) msg.resume = resume;
+        // Only the message types this page handles ('*' = everything)
+        if (!this.handlers['*']) {
+            msg.types = Object.keys(this.handlers).filter(t => !t.startsWith('_'));
+        }
+        this.ws.send(JSON.stringify(msg));
     }
 
     /**
@@ -98,8 +155,88 @@ class GravityWS {
         this._statusText = textEl;
     }
 
+    _receive(msg) {
+        if (msg.type === 'resumed' || msg.type === 'snapshot') {
+            this._finishResume(msg);
+            return;
+        }
+        if (msg.seq != null && this._resumeBuffer) {
+            this._resumeBuffer.push(msg);
+            return;
+        }
+        this._deliver(msg);
+    }
+
+    // In seq order, each seq once (a replayed punch batch shares its seq)
+    _deliver(msg) {
+        if (msg.seq != null) {
+            if (this.lastSeq !== null && msg.seq <= this.lastSeq) return;
+            this.lastSeq = msg.seq;
+        }
+        this._dispatch(msg);
+    }
+
+    _finishResume(msg) {
+        clearTimeout(this._resumeTimer);
+        const buffered = (this._resumeBuffer || []).sort((a, b) => a.seq - b.seq);
+        this._resumeBuffer = null;
+
+        if (msg && msg.type === 'resumed') {
+            buffered.forEach(m => this._deliver(m));
+            if (this.handlers['_resumed']) this.handlers['_resumed'](msg);
+            return;
+        }
+
+        // Too far behind (or no answer): start over from current state
+        if (msg) this.lastSeq = msg.seq;
+        if (msg && this.handlers['snapshot']) {
+            this.handlers['snapshot'](msg);
+        } else if (this.handlers['_connected']) {
+            this.handlers['_connected']();
+        }
+        buffered.forEach(m => this._deliver(m));
+    }
+
+    _hydratePunch(p) {
+        const e = this.entries[p.entry_id];
+        if (!e || p.name !== undefined) return p;
+        return {
+            ...p,
+            first_name: e.first_name,
+            last_name: e.last_name,
+            name: `${e.first_name} ${e.last_name}`,
+            class: e.class_name,
+            club: e.club || '',
+        };
+    }
+
+    _hydrate(msg) {
+        if (msg.type === 'punch') return this._hydratePunch(msg);
+        if (msg.type === 'punches') {
+            return { ...msg, punches: (msg.punches || []).map(p => this._hydratePunch(p)) };
+        }
+        if (msg.type === 'standings_diff') {
+            return {
+                ...msg,
+                changed: (msg.changed || []).map(r => ({ ...this.entries[r.entry_id], ...r })),
+            };
+        }
+        return msg;
+    }
+
     _dispatch(msg) {
+        if (msg.type === 'entries') {
+            Object.assign(this.entries, msg.entries);
+            return;
+        }
+        msg = this._hydrate(msg);
         const type = msg.type;
+        if (type === 'punches' && !this.handlers['punches']) {
+            for (const p of msg.punches || []) {
+                this._dispatch({ type: 'punch', event_id: msg.event_id, ...p });
+            }
+            return;
+        }
         if (this.handlers[type]) {
             this.handlers[type](msg);
         }